@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW benchmarks                                                            #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This program benchmarks the hot paths of PEBCAW (whitelist lookup, country   #
+# policy evaluation, observation decoding, notification dispatch, startup and  #
+# full loop iterations against a local fake provider) and saves results as     #
+# JSON for comparison between commits.                                         #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+
+usage:
+    program [options]
+
+options:
+    -h, --help          display help message
+    --output=FILE       file to which to save results [default: benchmarks/results/COMMIT.json]
+    --compare=FILE      results file with which to compare
+    --threshold=FLOAT   slowdown ratio reported as a regression [default: 1.2]
+    --filter=TEXT       run only benchmarks of which the name contains this text
+    --quick             fewer repeats and a shorter loop benchmark
+"""
+
+import docopt
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+
+import pebcaw
+from pebcaw import fake_provider
+from pebcaw import load_test
+from pebcaw import whitelist
+
+body_observation = json.dumps(dict(fake_provider.step_default, hostname='example.org'), indent=2)
+
+def random_IPv4(generator):
+    return '.'.join(str(generator.randrange(256)) for _ in range(4))
+
+def random_IPv6(generator):
+    return ':'.join('{:x}'.format(generator.randrange(65536)) for _ in range(8))
+
+def random_IPv6_prefix(generator, length=48):
+    return ':'.join('{:x}'.format(generator.randrange(65536)) for _ in range(length // 16)) + '::/' + str(length)
+
+def cases_whitelist():
+    generator = random.Random(0)
+    for size in (10, 1000, 100000):
+        IPs      = [random_IPv4(generator) for _ in range(size)]
+        prefixes = [random_IPv6_prefix(generator) for _ in range(size)]
+        index    = whitelist.Index(IPs + prefixes)
+        hit      = IPs[size // 2]
+        miss     = random_IPv4(generator)
+        hit_IPv6  = prefixes[size // 2].split('/')[0] + '1'
+        miss_IPv6 = random_IPv6(generator)
+        yield 'whitelist_IPv4_hit_{}'.format(size),  lambda index=index, IP=hit:       IP in index
+        yield 'whitelist_IPv4_miss_{}'.format(size), lambda index=index, IP=miss:      IP in index
+        yield 'whitelist_IPv6_hit_{}'.format(size),  lambda index=index, IP=hit_IPv6:  IP in index
+        yield 'whitelist_IPv6_miss_{}'.format(size), lambda index=index, IP=miss_IPv6: IP in index
+
+def cases_policy():
+    yield 'classify_whitelist_hit',  lambda: pebcaw.classify(IP='109.202.107.10', country='CH')
+    yield 'classify_whitelist_miss', lambda: pebcaw.classify(IP='8.8.8.8', country='US')
+    yield 'classify_SIGINT',         lambda: pebcaw.classify(IP='8.8.8.8', country='US', warn_SIGINT_country=True)
+    yield 'classify_countries',      lambda: pebcaw.classify(IP='8.8.8.8', country='US', countries_whitelist=['CH', 'IS'])
+
+def cases_decode():
+    yield 'decode_observation', lambda: json.loads(body_observation)
+
+def notify_dry_run():
+    """
+    Dispatch a notification through notify() with true in place of
+    notify-send. The argument list is built and executed directly, without a
+    shell, as for a real notification, so the full dispatch cost is paid
+    without a desktop notification being shown.
+    """
+    which          = pebcaw.shutil.which
+    engage_command = pebcaw.engage_command
+    pebcaw.shutil.which   = lambda name: '/usr/bin/' + name
+    pebcaw.engage_command = lambda command: engage_command(['true'] + command[1:])
+    try:
+        pebcaw.notify(text='WARNING: benchmark', subtext='IP: 8.8.8.8')
+    finally:
+        pebcaw.shutil.which   = which
+        pebcaw.engage_command = engage_command
+
+def cases_notify():
+    yield 'notify_dispatch', notify_dry_run
+
+def startup(arguments):
+    time_start = time.perf_counter()
+    subprocess.run([sys.executable] + arguments, stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - time_start
+
+def time_cases(cases, repeat=5):
+    results = {}
+    for name, function in cases:
+        timer     = timeit.Timer(function)
+        number, _ = timer.autorange()
+        times     = [time_ / number for time_ in timer.repeat(repeat=repeat, number=number)]
+        results[name] = {
+            'min':    min(times),
+            'median': statistics.median(times),
+            'number': number * repeat,
+            'unit':   's'
+        }
+    return results
+
+def time_startup(repeat=5):
+    results = {}
+    for name, arguments in (
+        ('startup_import',      ['-c', 'import pebcaw']),
+        ('startup_entry_point', ['-c', 'import sys; sys.argv = ["pebcaw", "--version"]; import pebcaw; pebcaw.main()'])
+    ):
+        times = [startup(arguments) for _ in range(repeat)]
+        results[name] = {
+            'min':    min(times),
+            'median': statistics.median(times),
+            'number': repeat,
+            'unit':   's'
+        }
+    return results
+
+def time_loop(duration=5):
+    results = load_test.run(duration=duration)
+    return {
+        'loop_iteration': {
+            'min':    results['cycle_p50'],
+            'median': results['cycle_p50'],
+            'p99':    results['cycle_p99'],
+            'number': results['observations'],
+            'unit':   's'
+        }
+    }
+
+def commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd    = os.path.dirname(os.path.abspath(__file__)),
+            stderr = subprocess.DEVNULL
+        ).decode('utf-8').strip()
+    except:
+        return 'unknown'
+
+def run(quick=False, filter_=None):
+    repeat  = 3 if quick else 7
+    cases   = [
+        case
+        for cases in (cases_whitelist(), cases_policy(), cases_decode(), cases_notify())
+        for case in cases
+        if not filter_ or filter_ in case[0]
+    ]
+    results = time_cases(cases, repeat=repeat)
+    if not filter_ or 'startup' in filter_:
+        results.update(time_startup(repeat=repeat))
+    if not filter_ or 'loop' in filter_:
+        results.update(time_loop(duration=2 if quick else 10))
+    return results
+
+def compare(results, results_previous, threshold=1.2):
+    """
+    Return report lines comparing results with previous results and whether
+    any benchmark regressed beyond the threshold ratio.
+    """
+    lines     = []
+    regressed = False
+    for name, result in results.items():
+        if name not in results_previous:
+            continue
+        ratio = result['min'] / results_previous[name]['min'] if results_previous[name]['min'] else float('inf')
+        flag  = ''
+        if ratio > threshold:
+            flag      = 'REGRESSION'
+            regressed = True
+        elif ratio < 1 / threshold:
+            flag      = 'improvement'
+        lines.append('{:<32} {:>12.3e} {:>12.3e} {:>8.2f} {}'.format(
+            name, results_previous[name]['min'], result['min'], ratio, flag
+        ))
+    return lines, regressed
+
+def main():
+    options = docopt.docopt(__doc__)
+    _commit = commit()
+    results = run(quick=options['--quick'], filter_=options['--filter'])
+    for name, result in results.items():
+        print('{:<32} {:>12.3e} s (median {:.3e} s, n = {})'.format(
+            name, result['min'], result['median'], result['number']
+        ))
+    filename = options['--output'].replace('COMMIT', _commit)
+    if os.path.dirname(filename):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'w') as file_output:
+        json.dump(
+            {
+                'commit':   _commit,
+                'time':     time.strftime('%Y-%m-%dT%H%M%SZ', time.gmtime()),
+                'python':   platform.python_version(),
+                'platform': platform.platform(),
+                'results':  results
+            },
+            file_output,
+            indent = 4
+        )
+    print('results saved to ' + filename)
+    if options['--compare']:
+        with open(options['--compare']) as file_previous:
+            results_previous = json.load(file_previous)['results']
+        lines, regressed = compare(
+            results,
+            results_previous,
+            threshold = float(options['--threshold'])
+        )
+        print('\n{:<32} {:>12} {:>12} {:>8}'.format('benchmark', 'previous', 'current', 'ratio'))
+        print('\n'.join(lines))
+        if regressed:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -34,133 +34,599 @@
 
 usage:
     program [options]
+    program audit [options] <file>...
+    program replay [options] <file>...
+    program compile_ASN_table [options] <file>...
+    program rollup [options] <file>
 
 options:
     -h, --help                  display help message
     --version                   display version and exit
     --interval=INT              observation interval (s) [default: 300]
+    --provider=URL              IP details provider [default: https://ipinfo.io/json]
+    --provider_IP=URL           current IP probe (plain text, e.g. https://ipinfo.io/ip), details fetched only on IP change
+    --geo_cache=FILE            file in which to persist the cache of IP details across restarts
+    --geo_TTL=INT               time to live of cached IP details (s) [default: 86400]
+    --CA_bundle=FILE            PEM CA bundle to which to pin the certificates of HTTPS providers
+    --resolve=TEXT              comma-separated pinned provider addresses (host:IP, e.g. ipinfo.io:34.117.59.81)
+    --requests                  observe by way of the requests library rather than the built-in HTTP client
+    --dual_stack                observe IPv4 and IPv6 concurrently, warn if either leaks
+    --whitelist=TEXT            comma-separated additional whitelisted IPv4 or IPv6 addresses or prefixes
+    --ASN_table=FILE            binary ASN table (compile from IPtoASN TSV files with compile_ASN_table)
+    --ASNs_whitelist=TEXT       comma-separated whitelisted ASNs (e.g. AS49453), requires ASN table
+    --check_DNS                 warn if nameservers are routed outside the VPN (DNS leak)
+    --check_connections         warn if connected TCP or UDP sockets are routed outside the VPN
+    --VPN_interfaces=TEXT       comma-separated VPN interfaces (default: tun*, tap*, wg*, ppp* etc.)
     --warn_SIGINT_country       warn if IP in SIGINT country
     --display                   display IP details continuously
     --restart_regularly         restart program regularly
+    --low_power                 align wakeups to a grid, lengthen interval on battery, observe on network changes
+    --grid=INT                  low power: wakeup grid (s) [default: 60]
+    --battery_factor=INT        low power: interval multiplier on battery [default: 4]
     --countries_whitelist=TEXT  comma-separated whitelist of two-letter country codes (e.g. CH)
+    --metrics=ADDRESS           serve metrics at host:port or Unix socket path
+    --profile                   profile with cProfile and tracemalloc, dump on SIGUSR1 and exit
+    --profile_file=FILE         file to which to save cProfile statistics
+    --trace_timing              record loop stage timings, dump on SIGUSR1 and exit
+    --socket=PATH               serve state queries on Unix socket
+    --history=INT               number of recent observations to keep in memory for window queries [default: 0]
+    --action_insecure=TEXT      command (or fifo:PATH) to engage on insecure or unobservable state
+    --action_secure=TEXT        command (or fifo:PATH) to engage on return to secure state
+    --targets=TEXT              comma-separated egress paths to monitor concurrently (netns:NAME, interface:NAME, source:IP)
+    --checkpoint=FILE           file to which to checkpoint state on change, from which to resume on start
+    --rollup=FILE               fixed-size file of per-minute, per-hour and per-day statistics (report with rollup)
+    --record=FILE               append observations to trace file (JSON lines) for replay
+    --countries_table=FILE      audit: CSV of IP ranges and countries (start,end,country)
+    --offenders=FILE            audit: file to which to write offending lines (- for stdout)
+    --processes=INT             audit: number of worker processes (0 for all cores) [default: 1]
+    --at=DATE                   audit: classify against the whitelist valid at date (YYYY-MM-DD)
 """
 
+import atexit
 import docopt
 import os
-import requests
 import shutil
 import subprocess
 import sys
-import textwrap
 import time
 
 import shijian
 
+from pebcaw import client
+from pebcaw import dns
+from pebcaw import metrics
+from pebcaw import monitor
+from pebcaw import whitelist
+
+# Optional subsystems are imported where their options are set, so that the
+# monitor imports only what it runs.
+
 name        = 'PEBCAW'
 __version__ = '2020-02-18T0012Z'
 
+# options of the single monitor that the monitors of --targets do not support
+options_single = (
+    '--display',
+    '--record',
+    '--rollup',
+    '--check_DNS',
+    '--check_connections',
+    '--dual_stack',
+    '--provider_IP',
+    '--requests',
+    '--low_power',
+    '--trace_timing',
+    '--restart_regularly'
+)
+
 def main():
     options             = docopt.docopt(__doc__, version=__version__)
+    if options['--whitelist']:
+        extend_whitelist(options['--whitelist'].split(','))
+    if options['audit']:
+        main_audit(options)
+        return
+    if options['replay']:
+        main_replay(options)
+        return
+    if options['rollup']:
+        from pebcaw import rollup
+        try:
+            statistics = rollup.Rollup(filename=options['<file>'][0], read_only=True)
+        except (OSError, ValueError) as e:
+            sys.exit('unable to read the rollup file: {error}'.format(error=e))
+        print(rollup.report(rollup=statistics))
+        statistics.close()
+        return
+    if options['compile_ASN_table']:
+        if not options['--ASN_table']:
+            sys.exit('specify the ASN table to compile with --ASN_table')
+        from pebcaw import asn
+        number_IPv4, number_IPv6, number_ASNs = asn.compile_table(
+            filenames      = options['<file>'],
+            filename_table = options['--ASN_table']
+        )
+        print('compiled {IPv4} IPv4 ranges, {IPv6} IPv6 ranges and {ASNs} ASNs to {filename}'.format(
+            IPv4     = number_IPv4,
+            IPv6     = number_IPv6,
+            ASNs     = number_ASNs,
+            filename = options['--ASN_table']
+        ))
+        return
+    if options['--ASN_table']:
+        load_ASN_table(
+            filename = options['--ASN_table'],
+            ASNs     = (options['--ASNs_whitelist'] or '').split(',')
+        )
     interval            = int(options['--interval'])
+    provider            =     options['--provider']
+    provider_IP         =     options['--provider_IP']
+    filename_geo_cache  =     options['--geo_cache']
+    TTL_geo             = int(options['--geo_TTL'])
+    use_requests        =     options['--requests']
+    CA_bundle           =     options['--CA_bundle']
+    pins                = dns.parse_pins(options['--resolve'])
+    dual_stack          =     options['--dual_stack']
+    check_DNS           =     options['--check_DNS']
+    check_connections   =     options['--check_connections']
+    interfaces_VPN      =     options['--VPN_interfaces']
     warn_SIGINT_country =     options['--warn_SIGINT_country']
     display             =     options['--display']
     restart_regularly   =     options['--restart_regularly']
+    low_power           =     options['--low_power']
+    grid                = int(options['--grid'])
+    battery_factor      = int(options['--battery_factor'])
     countries_whitelist =     options['--countries_whitelist']
+    address_metrics     =     options['--metrics']
+    profile             =     options['--profile']
+    profile_file        =     options['--profile_file']
+    trace_timing        =     options['--trace_timing']
+    path_socket         =     options['--socket']
+    capacity_history    = int(options['--history'])
+    action_insecure     =     options['--action_insecure']
+    action_secure       =     options['--action_secure']
+    filename_record     =     options['--record']
+    filename_checkpoint =     options['--checkpoint']
+    filename_rollup     =     options['--rollup']
     if countries_whitelist:
         countries_whitelist = countries_whitelist.split(',')
+    egress_targets = None
+    if options['--targets']:
+        unsupported = [option for option in options_single if options[option]]
+        if unsupported:
+            sys.exit('{options} cannot be combined with --targets'.format(options=', '.join(unsupported)))
+        from pebcaw import targets
+        egress_targets = targets.parse(options['--targets'])
+    metrics.interval.set(interval)
+    if address_metrics:
+        server_metrics = metrics.serve(address=address_metrics)
+        atexit.register(lambda: metrics.shutdown(server_metrics))
+    observations = None
+    histories    = None
+    server_query = None
+    recorder     = None
+    pipeline     = None
+    if capacity_history:
+        from pebcaw import history
+        if egress_targets:
+            histories = {str(target): history.History(capacity=capacity_history) for target in egress_targets}
+        else:
+            observations = history.History(capacity=capacity_history)
+    if path_socket:
+        from pebcaw import query
+        server_query = query.Server(path=path_socket, history=observations, histories=histories).start()
+    if filename_record:
+        from pebcaw import replay
+        recorder = replay.Recorder(filename=filename_record)
+    if action_insecure or action_secure:
+        from pebcaw import actions
+        pipeline = actions.Actions(
+            insecure = [actions.action(action_insecure, text='insecure')] if action_insecure else [],
+            secure   = [actions.action(action_secure,   text='secure')]   if action_secure   else []
+        )
+    begin = monitor.begin_null
+    mark  = monitor.mark_null
+    if profile or trace_timing:
+        from pebcaw import profiling
+        trace = profiling.TimingTrace() if trace_timing else None
+        if trace:
+            begin = trace.begin
+            mark  = trace.mark
+        profiling.Profiler(profile=profile, trace=trace, filename=profile_file).start()
+    checkpoint_loaded   = None
+    if filename_checkpoint:
+        from pebcaw import checkpoint
+        checkpoint_loaded = checkpoint.load(filename_checkpoint)
+    if egress_targets:
+        sinks = []
+        if pipeline:
+            sinks.append(monitor.ActionsSink(pipeline=pipeline))
+        checkpointer = None
+        if filename_checkpoint:
+            checkpointer = checkpoint.Checkpointer(filename=filename_checkpoint)
+            sinks.append(checkpointer)
+        if server_query:
+            sinks.append(monitor.QuerySink(server=server_query))
+        main_targets(
+            egress_targets    = egress_targets,
+            provider          = provider,
+            interval          = interval,
+            monitor_policy    = policy(
+                countries_whitelist = countries_whitelist,
+                warn_SIGINT_country = warn_SIGINT_country
+            ),
+            sinks             = sinks,
+            histories         = histories,
+            checkpointer      = checkpointer,
+            checkpoint_loaded = checkpoint_loaded,
+            CA_bundle         = CA_bundle,
+            pins              = pins
+        )
+        return
     message             = name + ' ' + __version__ + ' monitoring internet connection security'
     print('\n' + message + '\n^c to stop\n')
-    notify(text=message)
+    if checkpoint_loaded is None:
+        notify(text=message)
+    cache_geo = None
+    if provider_IP:
+        from pebcaw import geo
+        cache_geo = geo.Cache(TTL=TTL_geo, filename=filename_geo_cache)
+    sinks = []
+    if pipeline:
+        sinks.append(monitor.ActionsSink(pipeline=pipeline))
+    sinks.append(monitor.Notifier(notify=notify))
+    checkpointer = None
+    if filename_checkpoint:
+        checkpointer = checkpoint.Checkpointer(filename=filename_checkpoint, cache=cache_geo)
+        atexit.register(lambda: checkpointer.save(pebcaw_monitor.state))
+        sinks.append(checkpointer)
+    if server_query:
+        sinks.append(monitor.QuerySink(server=server_query))
+    if recorder:
+        sinks.append(monitor.RecorderSink(recorder=recorder))
+    if observations is not None:
+        sinks.append(monitor.HistorySink(history=observations))
+    if filename_rollup:
+        from pebcaw import rollup
+        statistics = rollup.Rollup(filename=filename_rollup)
+        atexit.register(statistics.close)
+        sinks.append(monitor.RollupSink(rollup=statistics))
+    if display and sys.stdout.isatty():
+        from pebcaw import dashboard
+        board = dashboard.Dashboard(title=name + ' ' + __version__).start(period=grid if low_power else 1)
+        atexit.register(board.close)
+        sinks.append(board)
+    elif display:
+        sinks.append(monitor.Display())
+    monitor_policy = policy(
+        countries_whitelist = countries_whitelist,
+        warn_SIGINT_country = warn_SIGINT_country
+    )
+    resolver = dns.HostCache(pins=pins)
+    if use_requests:
+        HTTP_client = client.RequestsClient(CA_bundle=CA_bundle)
+    else:
+        HTTP_client = client.Client(CA_bundle=CA_bundle, resolver=resolver)
+    if dual_stack:
+        monitor_provider = monitor.DualStackProvider(
+            URL      = provider,
+            context  = client.context(CA_bundle=CA_bundle) if CA_bundle else None,
+            resolver = resolver
+        )
+        monitor_policy   = monitor.DualStackPolicy(policy=monitor_policy)
+    elif provider_IP:
+        monitor_provider = monitor.CachedProvider(
+            URL_IP = provider_IP,
+            URL    = provider,
+            cache  = cache_geo,
+            client = HTTP_client
+        )
+    else:
+        monitor_provider = monitor.HTTPProvider(URL=provider, client=HTTP_client)
+    if check_DNS:
+        monitor_policy = monitor.DNSLeakPolicy(
+            policy = monitor_policy,
+            check  = dns.DNSCheck(interfaces_VPN=interfaces_VPN.split(',') if interfaces_VPN else None)
+        )
+    if check_connections:
+        from pebcaw import connections
+        monitor_policy = monitor.ConnectionLeakPolicy(
+            policy = monitor_policy,
+            check  = connections.EgressCheck(
+                index          = whitelist_index,
+                interfaces_VPN = interfaces_VPN.split(',') if interfaces_VPN else None
+            )
+        )
+    pebcaw_monitor = monitor.Monitor(
+        provider = monitor_provider,
+        policy   = monitor_policy,
+        sinks    = sinks,
+        interval = interval,
+        begin    = begin,
+        mark     = mark
+    )
+    time_schedule = None
+    if checkpoint_loaded:
+        state_restored = checkpointer.restore(checkpoint=checkpoint_loaded, monitor_restored=pebcaw_monitor)
+        time_schedule  = state_restored.time
+        print('resuming from {state}, observing now'.format(state=state_restored))
+    scheduler = None
+    if low_power:
+        from pebcaw import power
+        scheduler = power.Scheduler(interval=interval, grid=grid, battery_factor=battery_factor)
+        atexit.register(lambda: print('wakeups per hour: {wakeups:.1f}'.format(wakeups=metrics.wakeups_per_hour())))
     clock_restart = shijian.Clock(name='restart')
     while True:
         try:
-            data_IP      = requests.get('http://ipinfo.io/json').json()
-            IP           = data_IP['ip']
-            organisation = data_IP['org']
-            coordinates  = data_IP['loc']
-            city         = data_IP['city']
-            country      = data_IP['country']
-            region       = data_IP['region']
-            if not countries_whitelist:
-                if IP not in whitelist_IPs + whitelist_Tor:
-                    notify(
-                        text    = 'WARNING: IP not identified as AirVPN or Tor',
-                        subtext = 'IP: ' + IP
-                    )
-                if warn_SIGINT_country and country in countries_SIGINT:
-                    notify(
-                        text    = 'WARNING: IP in SIGINT country',
-                        subtext = 'IP: ' + IP
-                    )
+            pebcaw_monitor.step()
+            if restart_regularly and clock_restart.time() >= 500:
+                print('regular restart procedure engaged')
+                metrics.restarts.inc()
+                if checkpointer:
+                    checkpointer.save(pebcaw_monitor.state)
+                restart()
+            if scheduler:
+                scheduler.wait()
+            elif time_schedule is not None:
+                time.sleep(interval - (time.time() - time_schedule) % interval)
+                time_schedule = None
+                metrics.wakeups.inc()
             else:
-                if country not in countries_whitelist:
-                    notify(text=f'WARNING: country {country} not in whitelist {countries_whitelist}')
-            if display:
-                text = textwrap.dedent(
-                    """
-                    IP:           {IP}
-                    organisation: {organisation}
-                    coordinates:  {coordinates}
-                    city:         {city}
-                    country:      {country}
-                    region:       {region}
-                    """.format(
-                        IP           = IP           if IP           else 'unknown',
-                        organisation = organisation if organisation else 'unknown',
-                        coordinates  = coordinates  if coordinates  else 'unknown',
-                        city         = city         if city         else 'unknown',
-                        country      = country      if country      else 'unknown',
-                        region       = region       if region       else 'unknown'
-                    )
-                )
-                print(chr(27) + '[2J')
-                print(text)
-        except:
-            notify(text='WARNING: error observing IP, unable to identify as secure')
-        if restart_regularly and clock_restart.time() >= 500:
-            print('regular restart procedure engaged')
-            restart()
-        time.sleep(interval)
+                time.sleep(interval)
+                metrics.wakeups.inc()
+        except Exception as exception:
+            print('error in monitor loop: {exception!r}'.format(exception=exception), file=sys.stderr)
+            time.sleep(interval)
+        mark('sleep')
+
+def policy(
+    countries_whitelist = None,
+    warn_SIGINT_country = False,
+    clock               = None
+    ):
+    """
+    Return the policy of a countries whitelist if specified, otherwise of the
+    whitelist index or, if a clock is specified, of the versioned whitelist
+    index at the time of the clock.
+    """
+    if countries_whitelist:
+        return monitor.CountriesPolicy(countries_whitelist=countries_whitelist)
+    return monitor.WhitelistPolicy(
+        index               = whitelist_index if clock is None else whitelist_versioned,
+        countries_SIGINT    = countries_SIGINT,
+        warn_SIGINT_country = warn_SIGINT_country,
+        ASN_table           = ASN_table,
+        ASNs_whitelist      = ASNs_whitelist,
+        clock               = clock
+    )
+
+def extend_whitelist(entries):
+    """
+    Add IPv4 or IPv6 addresses or prefixes to the whitelist index, valid at
+    all times.
+    """
+    global whitelist_index, whitelist_versioned
+    whitelist_index     = whitelist.Index(whitelist_IPs + whitelist_Tor + list(entries))
+    whitelist_versioned = whitelist.VersionedIndex(whitelist_snapshots + [('whitelist', None, list(entries))])
+
+def is_whitelisted(IP, at=None):
+    """
+    Return whether the IP was whitelisted at a time (UNIX time or YYYY-MM-DD)
+    or, if no time is specified, at any time.
+    """
+    return whitelist_versioned.is_whitelisted(IP, at=at)
+
+def load_ASN_table(filename=None, ASNs=()):
+    """
+    Load an ASN table and the ASNs to whitelist wholesale.
+    """
+    global ASN_table, ASNs_whitelist
+    from pebcaw import asn
+    ASN_table      = asn.Table(filename)
+    ASNs_whitelist = [asn.ASN_to_integer(ASN) for ASN in ASNs if ASN]
+
+def classify(
+    IP                  = None,
+    country             = None,
+    countries_whitelist = None,
+    warn_SIGINT_country = False
+    ):
+    """
+    Return whether the IP details are secure, whether the IP is whitelisted
+    (None if the policy is by country) and the warnings to notify.
+    """
+    return policy(
+        countries_whitelist = countries_whitelist,
+        warn_SIGINT_country = warn_SIGINT_country
+    )({'ip': IP, 'country': country})
+
+def main_targets(
+    egress_targets    = None,
+    provider          = 'https://ipinfo.io/json',
+    interval          = 300,
+    monitor_policy    = None,
+    sinks             = (),
+    histories         = None,
+    checkpointer      = None,
+    checkpoint_loaded = None,
+    CA_bundle         = None,
+    pins              = None
+    ):
+    """
+    Monitor egress targets, observed concurrently each round, each by a
+    monitor of its own sharing the policy. The state of each target is
+    notified, displayed and kept in the metrics and history (if any) of the
+    target; the combined state of the targets is passed to the shared sinks
+    (e.g. actions, query server and checkpoint).
+    """
+    from pebcaw import targets
+    scheduler = targets.Scheduler(
+        targets  = egress_targets,
+        URL      = provider,
+        context  = client.context(CA_bundle=CA_bundle) if CA_bundle else None,
+        resolver = dns.HostCache(pins=pins)
+    )
+    combiner  = monitor.Combiner(targets=egress_targets, sinks=sinks)
+    providers = {}
+    monitors  = {}
+    for target in egress_targets:
+        sinks_target = [
+            monitor.Notifier(notify=notify, target=target),
+            monitor.TargetSink(target=target)
+        ]
+        if histories:
+            sinks_target.append(monitor.HistorySink(history=histories[str(target)]))
+        sinks_target.append(combiner.sink(target))
+        providers[target] = monitor.ObservationProvider()
+        monitors[target]  = monitor.Monitor(
+            provider = providers[target],
+            policy   = monitor_policy,
+            sinks    = sinks_target,
+            interval = interval
+        )
+    if checkpointer:
+        atexit.register(lambda: checkpointer.save(combiner.state))
+    message   = name + ' ' + __version__ + ' monitoring internet connection security of {number} targets'.format(
+        number = len(egress_targets)
+    )
+    print('\n' + message + '\n^c to stop\n')
+    if checkpoint_loaded is None:
+        notify(text=message)
+    else:
+        state_restored = checkpointer.restore(checkpoint=checkpoint_loaded, monitor_restored=combiner)
+        print('resuming from {state}, observing now'.format(state=state_restored))
+    while True:
+        time_start = time.monotonic()
+        try:
+            for target, data_IP, exception, duration in scheduler.observe():
+                providers[target].set(data=data_IP, exception=exception, duration=duration)
+                monitors[target].step(time_start=providers[target].time_start)
+        except Exception as exception:
+            print('error in monitor loop: {exception!r}'.format(exception=exception), file=sys.stderr)
+        time.sleep(max(0, interval - (time.monotonic() - time_start)))
+
+def main_replay(options):
+    countries_whitelist = options['--countries_whitelist']
+    if countries_whitelist:
+        countries_whitelist = countries_whitelist.split(',')
+    interval            = int(options['--interval'])
+    if interval <= 0:
+        sys.exit('specify a positive replay interval with --interval')
+    from pebcaw import replay
+    clock_replay        = time.perf_counter()
+    clock               = replay.VirtualClock()
+    trace               = replay.Trace.load(filenames=options['<file>'])
+    if not len(trace):
+        sys.exit('no observations in the trace to replay')
+    timeline, periods   = replay.replay(
+        trace    = trace,
+        interval = interval,
+        clock    = clock,
+        policy   = policy(
+            countries_whitelist = countries_whitelist,
+            warn_SIGINT_country = options['--warn_SIGINT_country'],
+            clock               = clock
+        )
+    )
+    print(replay.report(timeline=timeline, periods=periods))
+    print('replayed {duration:.0f} s of {records} observations in {time:.3f} s'.format(
+        duration = trace.times[-1] - trace.times[0],
+        records  = len(trace.records),
+        time     = time.perf_counter() - clock_replay
+    ))
+
+def main_audit(options):
+    countries_whitelist = options['--countries_whitelist']
+    countries_table     = options['--countries_table']
+    filename_offenders  = options['--offenders']
+    processes           = int(options['--processes'])
+    date                = options['--at']
+    if countries_whitelist and not countries_table:
+        sys.exit('specify the country table of the countries whitelist with --countries_table')
+    if countries_whitelist:
+        countries_whitelist = countries_whitelist.split(',')
+    from pebcaw import audit
+    auditor = audit.Auditor(
+        index               = whitelist_versioned.at(date) if date else whitelist_index,
+        country_table       = audit.CountryTable.load(countries_table) if countries_table else None,
+        countries_whitelist = countries_whitelist,
+        countries_SIGINT    = countries_SIGINT
+    )
+    offenders = None
+    if filename_offenders == '-':
+        offenders = sys.stdout.buffer
+    elif filename_offenders:
+        offenders = open(filename_offenders, 'wb')
+    clock_audit = time.perf_counter()
+    if processes != 1 and '-' not in options['<file>']:
+        aggregates = audit.audit_parallel(
+            filenames = options['<file>'],
+            auditor   = auditor,
+            offenders = offenders,
+            processes = processes
+        )
+    else:
+        aggregates = audit.audit(
+            filenames = options['<file>'],
+            auditor   = auditor,
+            offenders = offenders
+        )
+    duration    = time.perf_counter() - clock_audit
+    stream      = sys.stdout
+    if offenders is sys.stdout.buffer:
+        stream = sys.stderr
+    elif offenders:
+        offenders.close()
+    print(aggregates.report(), file=stream)
+    print('audit time (s): {duration:.3f} ({rate:.0f} IPs/s)'.format(
+        duration = duration,
+        rate     = aggregates.IPs / duration if duration else 0
+    ), file=stream)
 
 def notify(
     text    = None,
     subtext = None,
     icon    = None
     ):
+    time_start = time.perf_counter()
     try:
         if text and shutil.which('notify-send'):
-            command = 'notify-send \"{text}\"'
+            command = ['notify-send', text]
             if subtext:
-                command = command + ' \"{subtext}\"'
+                command.append(subtext)
             if icon and os.path.isfile(os.path.expandvars(icon)):
-                command = command + ' --icon={icon}'
-            command = command + ' --urgency=critical'
-            command = command.format(
-                text    = text,
-                subtext = subtext,
-                icon    = icon
-            )
+                command.append('--icon=' + os.path.expandvars(icon))
+            command.append('--urgency=critical')
             engage_command(command)
+            metrics.notifications_sent.inc()
+        else:
+            metrics.notifications_suppressed.inc()
     except:
-        pass
+        metrics.notifications_suppressed.inc()
+    metrics.duration_notify.observe(time.perf_counter() - time_start)
 
 def engage_command(
     command    = None,
     background = True,
     timeout    = None
     ):
+    """
+    Engage a command, either a Bash command line or a list of arguments, which
+    is executed directly, without a shell.
+    """
+    shell = not isinstance(command, list)
     if background:
         subprocess.Popen(
-            [command],
-            shell      = True,
-            executable = '/bin/bash'
+            [command] if shell else command,
+            shell      = shell,
+            executable = '/bin/bash' if shell else None
         )
         return None
     elif not background:
         process = subprocess.Popen(
-            [command],
-            shell      = True,
-            executable = '/bin/bash',
+            [command] if shell else command,
+            shell      = shell,
+            executable = '/bin/bash' if shell else None,
             stdout     = subprocess.PIPE
         )
         try:
@@ -175,6 +641,7 @@ def engage_command(
 
 def restart():
     import __main__
+    os.environ['PEBCAW_RESTARTS'] = str(metrics.restarts.value)
     os.execv(__main__.__file__, sys.argv)
 
 countries_SIGINT = [
@@ -1397,6 +1864,18 @@ IPs_Tor_2017_02_21 = [
 ]
 whitelist_IPs = IPs_AirVPN_2018_10_11 + IPs_AirVPN_2017_02_21
 whitelist_Tor = IPs_Tor_2017_02_21
+# the AirVPN servers of 2018-10-11 add to those of 2017-02-21, as in the live
+# whitelist index
+whitelist_snapshots = [
+    ('AirVPN', '2017-02-21', IPs_AirVPN_2017_02_21),
+    ('AirVPN', '2018-10-11', IPs_AirVPN_2018_10_11, True),
+    ('Tor',    '2017-02-21', IPs_Tor_2017_02_21)
+]
+
+whitelist_index     = whitelist.Index(whitelist_IPs + whitelist_Tor)
+whitelist_versioned = whitelist.VersionedIndex(whitelist_snapshots)
+ASN_table           = None
+ASNs_whitelist      = []
 
 if __name__ == '__main__':
     main()
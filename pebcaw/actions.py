@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW actions                                                               #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module provides actions that are engaged when the monitor classifies    #
+# the connection as insecure, and recovery actions engaged when it returns to  #
+# secure, prepared in advance so that they fire within milliseconds of         #
+# classification.                                                              #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+import functools
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from pebcaw import metrics
+
+class Command(object):
+    """
+    Shell command run by a pre-forked Bash process that waits on its standard
+    input, so firing costs a pipe write rather than a fork and exec. The
+    action completes when the command exits, which is waited for in a thread.
+    A new standby process is prepared on rearming after each firing.
+    """
+
+    def __init__(self, command=None):
+        self.command = command
+        self.prepare()
+
+    def prepare(self):
+        self.process = subprocess.Popen(
+            ['/bin/bash', '-c', 'read -r _ || exit 0; eval "$0"', self.command],
+            stdin = subprocess.PIPE
+        )
+
+    def fire(self, completed=None):
+        """
+        Start the command and call completed with its exit status when it
+        exits.
+        """
+        process = self.process
+        process.stdin.write(b'\n')
+        process.stdin.close()
+        threading.Thread(target=lambda: completed(process.wait()), daemon=True).start()
+
+    def rearm(self):
+        self.prepare()
+
+    def close(self):
+        self.process.stdin.close()
+
+    def __repr__(self):
+        return 'command ' + repr(self.command)
+
+class FIFO(object):
+    """
+    Line written to a named pipe, opened in advance when a reader is present.
+    The action completes when the line is written.
+    """
+
+    def __init__(
+        self,
+        path = None,
+        text = 'insecure'
+        ):
+        self.path = path
+        self.text = (text + '\n').encode('utf-8')
+        self.file = None
+        self.open()
+
+    def open(self):
+        try:
+            self.file = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError:
+            self.file = None
+
+    def fire(self, completed=None):
+        if self.file is None:
+            self.open()
+        try:
+            os.write(self.file, self.text)
+        except (OSError, TypeError):
+            self.file = None
+            self.open()
+            os.write(self.file, self.text)
+        completed(0)
+
+    def rearm(self):
+        pass
+
+    def close(self):
+        if self.file is not None:
+            os.close(self.file)
+
+    def __repr__(self):
+        return 'FIFO ' + repr(self.path)
+
+def action(specification=None, text='insecure'):
+    """
+    Return an action for a specification, which is either fifo:PATH or a shell
+    command.
+    """
+    if specification.startswith('fifo:'):
+        return FIFO(path=specification[len('fifo:'):], text=text)
+    return Command(command=specification)
+
+class Actions(object):
+    """
+    Pipeline of actions engaged on transition to insecure and of recovery
+    actions engaged on transition to secure. The state starts unknown, so the
+    first classification engages its actions. A state of unknown security
+    (None, e.g. unobservable) engages the insecure actions (fail closed). The
+    latency of an action is from the detection of the state to the completion
+    of the action, reported by the action itself.
+    """
+
+    def __init__(
+        self,
+        insecure = None,
+        secure   = None,
+        report   = True
+        ):
+        self.insecure  = insecure or []
+        self.secure    = secure   or []
+        self.report    = report
+        self.state     = None
+        self.latencies = []
+        self.lock      = threading.Lock()
+
+    def update(self, secure=None, time_detection=None):
+        """
+        Engage the actions for a change of state detected at a time (from
+        time.monotonic) and return the actions engaged. Their latencies are
+        recorded as they complete.
+        """
+        secure = bool(secure)
+        if secure == self.state:
+            return []
+        self.state = secure
+        engaged    = []
+        for _action in self.secure if secure else self.insecure:
+            try:
+                _action.fire(completed=functools.partial(
+                    self.completed,
+                    _action,
+                    secure,
+                    time_detection
+                ))
+            except:
+                metrics.action_errors.inc()
+                print('error engaging action {action}'.format(action=_action), file=sys.stderr)
+                continue
+            engaged.append(_action)
+        for _action in self.secure if secure else self.insecure:
+            _action.rearm()
+        return engaged
+
+    def completed(self, _action=None, secure=None, time_detection=None, status=0):
+        """
+        Record the completion of an action with an exit status.
+        """
+        latency = time.monotonic() - time_detection
+        with self.lock:
+            self.latencies.append(latency)
+            metrics.actions.inc()
+            metrics.duration_action.observe(latency)
+            if status:
+                metrics.action_errors.inc()
+        if status:
+            print('error: action {action} exited with status {status}'.format(
+                action = _action,
+                status = status
+            ), file=sys.stderr)
+        if self.report:
+            print('{state} action {action} completed {latency:.3f} ms after detection'.format(
+                state   = 'recovery' if secure else 'insecure',
+                action  = _action,
+                latency = 1000 * latency
+            ))
+
+    def close(self):
+        for _action in self.insecure + self.secure:
+            _action.close()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW ASN                                                                   #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module compiles tables of IP ranges and their autonomous system numbers #
+# (ASNs), such as the IPtoASN TSV files, into a compact binary file that is    #
+# memory-mapped and binary-searched to classify IPs by ASN and organisation    #
+# locally.                                                                     #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+import mmap
+import socket
+import struct
+
+magic   = b'PEBCAWAS'
+version = 1
+
+header  = struct.Struct('!8sIIII')
+records = {
+    socket.AF_INET:  struct.Struct('!4s4sI'),
+    socket.AF_INET6: struct.Struct('!16s16sI')
+}
+record_ASN = struct.Struct('!IIH2s')
+
+def ASN_to_integer(ASN):
+    return int(str(ASN).upper().replace('AS', ''))
+
+def compile_table(filenames=None, filename_table=None):
+    """
+    Compile TSV files of lines first address, last address, ASN, country and
+    organisation (the IPtoASN format, IPv4 or IPv6) to a binary table. ASN 0
+    (not routed) is omitted. The binary table format (big-endian) is a header
+    (magic, version, numbers of IPv4 ranges, IPv6 ranges and ASNs), the sorted
+    IPv4 and IPv6 ranges (first address, last address, ASN), the sorted ASNs
+    (ASN, organisation offset, organisation length, country) and the UTF-8
+    organisations.
+    """
+    ranges        = {socket.AF_INET: [], socket.AF_INET6: []}
+    organisations = {}
+    for filename in filenames:
+        with open(filename, encoding='utf-8', errors='replace') as file_input:
+            for line in file_input:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) < 3:
+                    continue
+                try:
+                    ASN = ASN_to_integer(fields[2])
+                except ValueError:
+                    continue
+                if not ASN:
+                    continue
+                family = socket.AF_INET6 if ':' in fields[0] else socket.AF_INET
+                try:
+                    start = socket.inet_pton(family, fields[0])
+                    end   = socket.inet_pton(family, fields[1])
+                except OSError:
+                    continue
+                ranges[family].append((start, end, ASN))
+                country      = (fields[3] if len(fields) > 3 else '')[:2].upper().encode('ascii', 'replace')
+                organisation = fields[4] if len(fields) > 4 else ''
+                organisations.setdefault(ASN, (organisation, country.ljust(2, b'-')))
+    names  = []
+    table  = []
+    offset = 0
+    for ASN in sorted(organisations):
+        organisation, country = organisations[ASN]
+        name = organisation.encode('utf-8')[:65535]
+        table.append(record_ASN.pack(ASN, offset, len(name), country))
+        names.append(name)
+        offset += len(name)
+    with open(filename_table, 'wb') as file_table:
+        file_table.write(header.pack(
+            magic,
+            version,
+            len(ranges[socket.AF_INET]),
+            len(ranges[socket.AF_INET6]),
+            len(organisations)
+        ))
+        for family in (socket.AF_INET, socket.AF_INET6):
+            for start, end, ASN in sorted(ranges[family]):
+                file_table.write(records[family].pack(start, end, ASN))
+        file_table.write(b''.join(table))
+        file_table.write(b''.join(names))
+    return len(ranges[socket.AF_INET]), len(ranges[socket.AF_INET6]), len(organisations)
+
+class Table(object):
+    """
+    Memory-mapped binary ASN table of which lookups are binary searches of the
+    mapped records, without loading the table into memory.
+    """
+
+    def __init__(self, filename=None):
+        with open(filename, 'rb') as file_table:
+            self.map = mmap.mmap(file_table.fileno(), 0, access=mmap.ACCESS_READ)
+        _magic, _version, number_IPv4, number_IPv6, number_ASNs = header.unpack_from(self.map, 0)
+        if _magic != magic or _version != version:
+            raise ValueError('not a PEBCAW ASN table: ' + filename)
+        offset = header.size
+        self.sections = {}
+        for family, number in ((socket.AF_INET, number_IPv4), (socket.AF_INET6, number_IPv6)):
+            self.sections[family] = (offset, number)
+            offset += number * records[family].size
+        self.offset_ASNs  = offset
+        self.number_ASNs  = number_ASNs
+        self.offset_names = offset + number_ASNs * record_ASN.size
+
+    def close(self):
+        self.map.close()
+
+    def ASN(self, IP=None):
+        """
+        Return the ASN of an IP, or None if it is not in a range of the table.
+        """
+        family = socket.AF_INET6 if ':' in IP else socket.AF_INET
+        try:
+            key = socket.inet_pton(family, IP)
+        except OSError:
+            return None
+        offset, number = self.sections[family]
+        record = records[family]
+        width  = len(key)
+        low, high = 0, number
+        while low < high:
+            middle = (low + high) // 2
+            start  = offset + middle * record.size
+            if self.map[start:start + width] <= key:
+                low = middle + 1
+            else:
+                high = middle
+        if not low:
+            return None
+        start, end, ASN = record.unpack_from(self.map, offset + (low - 1) * record.size)
+        return ASN if key <= end else None
+
+    def organisation(self, ASN=None):
+        """
+        Return the organisation and country of an ASN, or None.
+        """
+        low, high = 0, self.number_ASNs
+        while low < high:
+            middle = (low + high) // 2
+            _ASN   = struct.unpack_from('!I', self.map, self.offset_ASNs + middle * record_ASN.size)[0]
+            if _ASN < ASN:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.number_ASNs:
+            return None
+        _ASN, offset, length, country = record_ASN.unpack_from(self.map, self.offset_ASNs + low * record_ASN.size)
+        if _ASN != ASN:
+            return None
+        start = self.offset_names + offset
+        return self.map[start:start + length].decode('utf-8', 'replace'), country.decode('ascii').strip('-')
+
+    def lookup(self, IP=None):
+        """
+        Return the ASN, organisation and country of an IP, or None.
+        """
+        ASN = self.ASN(IP)
+        if ASN is None:
+            return None
+        organisation, country = self.organisation(ASN) or ('', '')
+        return ASN, organisation, country
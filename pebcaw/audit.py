@@ -0,0 +1,670 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW audit                                                                 #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module audits logs offline for connections that went out unprotected,   #
+# by extracting IP addresses from input files in batches, converting them to   #
+# integers with NumPy and classifying them against the whitelist index and a   #
+# table of country IP ranges with searchsorted.                                #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+import collections
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+
+from pebcaw.whitelist import IP_to_integer, integer_to_IP
+
+def numpy():
+    try:
+        import numpy
+    except ImportError:
+        sys.exit('audit requires NumPy (pip install numpy)')
+    return numpy
+
+def characters_to_integers(characters):
+    """
+    Convert a matrix of dotted-quad characters (one address per row, padded
+    with zeros) to a uint32 array in a vectorised pass over the columns,
+    returning the integers and a mask of which rows were valid addresses (four
+    octets of one to three digits, each at most 255).
+    """
+    np         = numpy()
+    characters = np.asfortranarray(characters)
+    number     = len(characters)
+    integers   = np.zeros(number, dtype=np.uint32)
+    octet      = np.zeros(number, dtype=np.uint32)
+    digits     = np.zeros(number, dtype=np.uint8)
+    dots       = np.zeros(number, dtype=np.uint8)
+    valid      = np.ones(number, dtype=bool)
+    for column in characters.T:
+        value     = column - np.uint8(48)
+        digit     = value < 10
+        dot       = column == 46
+        octet     = np.where(digit, octet * 10 + value, octet)
+        digits   += digit
+        valid    &= (octet <= 255) & (digits <= 3) & ~(dot & (digits == 0))
+        integers  = np.where(dot, (integers << 8) | octet, integers)
+        octet[dot]  = 0
+        digits[dot] = 0
+        dots     += dot
+    valid &= (digits > 0) & (dots == 3)
+    return (integers << 8) | octet, valid
+
+def IPs_to_integers(IPs):
+    """
+    Convert a sequence of dotted-quad byte strings to a uint32 array, returning
+    the integers and a mask of which strings were valid addresses.
+    """
+    np = numpy()
+    return characters_to_integers(np.array(IPs, dtype='S15').view(np.uint8).reshape(-1, 15))
+
+def extract(chunk):
+    """
+    Extract the dotted-quad addresses of a chunk of bytes, returning their
+    integers, their validity and their offsets in the chunk. Candidates are
+    found from the dots of the chunk alone: three dots separated by one to
+    three digits, with one to three digits before the first and after the last.
+    A candidate is valid if its octets are at most 255 and it is not part of a
+    longer run of digits and dots; a dot after it is allowed unless a digit
+    follows the dot (e.g. an address that ends a sentence). The bytes of the
+    chunk are scanned once; the rest of the work is on a window of 21 bytes
+    about the first dot of each candidate, in which the length and value of the
+    run of digits ending at each column are accumulated column by column.
+    """
+    np        = numpy()
+    padded    = np.zeros(len(chunk) + 24, dtype=np.uint8)
+    padded[4:-20] = np.frombuffer(chunk, dtype=np.uint8)
+    dots      = np.flatnonzero(padded == 46)
+    gaps      = np.diff(dots)
+    gap       = (gaps >= 2) & (gaps <= 4)
+    triple    = np.flatnonzero(gap[:-1] & gap[1:])
+    first     = dots[triple]
+    gap_first = gaps[triple]
+    gap_last  = gaps[triple + 1]
+    number    = len(first)
+    window    = np.lib.stride_tricks.sliding_window_view(padded, 21)[first - 4].T.copy()
+    digit     = (window - np.uint8(48)) < 10
+    values  = np.zeros((21, number), dtype=np.uint16)
+    lengths = np.zeros((21, number), dtype=np.uint8)
+    value   = np.zeros(number, dtype=np.uint16)
+    length  = np.zeros(number, dtype=np.uint8)
+    for column in range(21):
+        length  = (length + np.uint8(1)) * digit[column]
+        value   = np.minimum(value * np.uint16(10) + (window[column] - np.uint8(48)), np.uint16(1000)) * digit[column]
+        length  = np.minimum(length, np.uint8(4))
+        values[column]  = value
+        lengths[column] = length
+    rows = np.arange(number)
+    def at(matrix, column):
+        # the column of each row of a matrix of columns
+        return matrix.ravel()[column * number + rows]
+    third        = 4 + gap_first + gap_last
+    digits_first = at(lengths, np.full(number, 3)).astype(np.intp)
+    after        = [at(digit, third + offset) for offset in (1, 2, 3, 4)]
+    digits_last  = after[0] * (1 + after[1] * (1 + after[2] * (1 + after[3])))
+    candidate    = (
+        (digits_first > 0) &
+        (at(lengths, 3 + gap_first) == gap_first - 1) &
+        (at(lengths, third - 1) == gap_last - 1) &
+        (digits_last > 0)
+    )
+    valid     = (digits_first <= 3) & (digits_last <= 3)
+    valid    &= at(window, 3 - np.minimum(digits_first, 3)) != 46
+    following = third + 1 + np.minimum(digits_last, 3)
+    valid    &= (at(window, following) != 46) | ~at(digit, following + 1)
+    integers  = np.zeros(number, dtype=np.uint32)
+    for end in (np.full(number, 3), 3 + gap_first, third - 1, third + np.minimum(digits_last, 3)):
+        octet    = at(values, end)
+        valid   &= octet <= 255
+        integers = (integers << np.uint32(8)) | octet.astype(np.uint32)
+    valid &= candidate
+    return integers[candidate], valid[candidate], (first - digits_first - 4)[candidate]
+
+class CountryTable(object):
+    """
+    Table of IP ranges and their countries loaded from a CSV file of lines
+    start,end,country in which start and end are dotted quads or integers.
+    """
+
+    def __init__(self, starts=None, ends=None, codes=None, countries=None):
+        self.starts    = starts
+        self.ends      = ends
+        self.codes     = codes
+        self.countries = countries
+
+    @classmethod
+    def load(cls, filename=None):
+        np   = numpy()
+        rows = []
+        for line in open(filename):
+            fields = [field.strip().strip('"') for field in line.split(',')]
+            if len(fields) < 3 or not fields[0] or fields[0][0] not in '0123456789':
+                continue
+            try:
+                start, end = [
+                    int(field) if field.isdigit() else IP_to_integer(field)
+                    for field in fields[:2]
+                ]
+            except (OSError, ValueError):
+                continue
+            rows.append((start, end, fields[2].upper()))
+        rows.sort()
+        countries = sorted(set(row[2] for row in rows))
+        lookup    = {country: index for index, country in enumerate(countries)}
+        return cls(
+            starts    = np.array([row[0] for row in rows], dtype=np.uint32),
+            ends      = np.array([row[1] for row in rows], dtype=np.uint32),
+            codes     = np.array([lookup[row[2]] for row in rows], dtype=np.int16),
+            countries = countries
+        )
+
+    def lookup(self, integers):
+        """
+        Return the country code indices of integer addresses, -1 for unknown.
+        """
+        np    = numpy()
+        index = np.searchsorted(self.starts, integers, side='right') - 1
+        found = index >= 0
+        index = np.maximum(index, 0)
+        found &= integers <= self.ends[index]
+        return np.where(found, self.codes[index], -1)
+
+def hash_integers(integers, seed=0):
+    """
+    Return a 32-bit hash of uint32 integers (a bijection for each seed).
+    """
+    np      = numpy()
+    hashes  = (integers ^ np.uint32(seed)) * np.uint32(0x9e3779b1)
+    hashes ^= hashes >> np.uint32(15)
+    hashes *= np.uint32(0x85ebca77)
+    hashes ^= hashes >> np.uint32(13)
+    return hashes
+
+class Offenders(object):
+    """
+    Bounded summary of offending addresses in constant memory whatever their
+    number: a count-min sketch of their counts (depth rows of width counters,
+    which never undercount and overcount by at most e/width of the total with
+    probability 1 - exp(-depth)), a HyperLogLog of 2^precision registers of
+    the number of distinct addresses (standard error 1.04/sqrt(2^precision))
+    and the candidates of the most frequent addresses, at most capacity, with
+    their estimated counts. Summaries of the same dimensions are mergeable.
+    """
+
+    seeds = (0x0, 0x5bd1e995, 0x27d4eb2f, 0x165667b1, 0x61c88647, 0x7feb352d, 0x846ca68b, 0xd35a2d97)
+
+    def __init__(
+        self,
+        width     = 1 << 18,
+        depth     = 4,
+        precision = 14,
+        capacity  = 1024
+        ):
+        np = numpy()
+        self.bits       = width.bit_length() - 1
+        self.width      = 1 << self.bits
+        self.depth      = min(depth, len(self.seeds))
+        self.precision  = precision
+        self.capacity   = capacity
+        self.sketch     = np.zeros((self.depth, self.width), dtype=np.uint32)
+        self.registers  = np.zeros(1 << precision, dtype=np.uint8)
+        self.candidates = np.zeros(0, dtype=np.uint32)
+        self.counts     = np.zeros(0, dtype=np.uint32)
+
+    def indices(self, integers):
+        np = numpy()
+        return [
+            (hash_integers(integers, seed=seed) >> np.uint32(32 - self.bits)).astype(np.intp)
+            for seed in self.seeds[:self.depth]
+        ]
+
+    def estimate(self, integers, indices=None):
+        """
+        Return the estimated counts of integer addresses.
+        """
+        np = numpy()
+        indices = self.indices(integers) if indices is None else indices
+        counts  = self.sketch[0][indices[0]]
+        for row in range(1, self.depth):
+            counts = np.minimum(counts, self.sketch[row][indices[row]])
+        return counts
+
+    def update(self, integers):
+        """
+        Add a batch of offending integer addresses (with repetitions).
+        """
+        np = numpy()
+        if not len(integers):
+            return
+        indices = self.indices(integers)
+        for row in range(self.depth):
+            self.sketch[row] += np.bincount(indices[row], minlength=self.width).astype(np.uint32)
+        hashes    = hash_integers(integers, seed=self.seeds[-1])
+        rest      = 32 - self.precision
+        remainder = (hashes & np.uint32((1 << rest) - 1)).astype(np.float64)
+        ranks     = (rest + 1 - np.frexp(remainder)[1]).astype(np.uint8)
+        np.maximum.at(self.registers, (hashes >> np.uint32(rest)).astype(np.intp), ranks)
+        counts    = self.estimate(integers, indices=indices)
+        threshold = self.counts.min() if len(self.counts) >= self.capacity else 0
+        self.select(np.concatenate((self.candidates, integers[counts > threshold])))
+
+    def select(self, integers):
+        """
+        Keep the most frequent of the candidates and of integer addresses.
+        """
+        np     = numpy()
+        unique = np.unique(integers)
+        counts = self.estimate(unique)
+        if len(unique) > self.capacity:
+            keep   = np.argpartition(counts, len(unique) - self.capacity)[len(unique) - self.capacity:]
+            unique = unique[keep]
+            counts = counts[keep]
+        self.candidates = unique
+        self.counts     = counts
+
+    def merge(self, other):
+        np = numpy()
+        self.sketch += other.sketch
+        np.maximum(self.registers, other.registers, out=self.registers)
+        self.select(np.concatenate((self.candidates, other.candidates)))
+        return self
+
+    def distinct(self):
+        """
+        Return the estimated number of distinct addresses.
+        """
+        np       = numpy()
+        number   = len(self.registers)
+        alpha    = 0.7213 / (1 + 1.079 / number)
+        estimate = alpha * number * number / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        zeros    = int((self.registers == 0).sum())
+        if zeros == number:
+            return 0
+        if estimate <= 2.5 * number and zeros:
+            estimate = number * np.log(number / zeros)
+        elif estimate > 2 ** 32 / 30:
+            estimate = -2 ** 32 * np.log(1 - estimate / 2 ** 32)
+        return int(round(estimate))
+
+    def most_common(self, number=20):
+        """
+        Return the most frequent addresses as (integer, estimated count),
+        most frequent first (lowest address first among equal counts).
+        """
+        np    = numpy()
+        order = np.lexsort((self.candidates, -self.counts.astype(np.int64)))[:number]
+        return list(zip(self.candidates[order].tolist(), self.counts[order].tolist()))
+
+    def __len__(self):
+        return len(self.candidates)
+
+class Aggregates(object):
+    """
+    Counts accumulated by an audit, mergeable across partial audits.
+    """
+
+    def __init__(self):
+        self.lines       = 0
+        self.IPs         = 0
+        self.invalid     = 0
+        self.whitelisted = 0
+        self.offending   = 0
+        self.SIGINT      = 0
+        self.countries   = collections.Counter()
+        self.offenders   = Offenders()
+
+    def merge(self, other):
+        self.lines       += other.lines
+        self.IPs         += other.IPs
+        self.invalid     += other.invalid
+        self.whitelisted += other.whitelisted
+        self.offending   += other.offending
+        self.SIGINT      += other.SIGINT
+        self.countries.update(other.countries)
+        self.offenders.merge(other.offenders)
+        return self
+
+    def report(self, top=20):
+        lines = [
+            'lines:                 {}'.format(self.lines),
+            'IPs:                   {}'.format(self.IPs),
+            'invalid IPs:           {}'.format(self.invalid),
+            'whitelisted IPs:       {}'.format(self.whitelisted),
+            'offending IPs:         {}'.format(self.offending),
+            'unique offending IPs:  ~{}'.format(self.offenders.distinct())
+        ]
+        if self.countries:
+            lines.append('IPs in SIGINT countries: {}'.format(self.SIGINT))
+            lines.append('countries:')
+            for country, count in self.countries.most_common():
+                lines.append('    {:<8} {}'.format(country, count))
+        if len(self.offenders):
+            lines.append('top offending IPs (estimated counts):')
+            for integer, count in self.offenders.most_common(top):
+                lines.append('    {:<16} {}'.format(integer_to_IP(int(integer)), count))
+        return '\n'.join(lines)
+
+class Auditor(object):
+    """
+    Classifier of batches of addresses against the whitelist index or, if a
+    countries whitelist is given, against a country table.
+    """
+
+    def __init__(
+        self,
+        index               = None,
+        country_table       = None,
+        countries_whitelist = None,
+        countries_SIGINT    = ()
+        ):
+        np = numpy()
+        self.starts              = np.frombuffer(index.starts, dtype=np.uint32) if index is not None else None
+        self.ends                = np.frombuffer(index.ends,   dtype=np.uint32) if index is not None else None
+        self.country_table       = country_table
+        self.countries_whitelist = countries_whitelist
+        self.codes_whitelist     = None
+        self.codes_SIGINT        = None
+        if country_table:
+            codes = {country: index for index, country in enumerate(country_table.countries)}
+            self.codes_SIGINT = np.array(
+                [codes[country] for country in countries_SIGINT if country in codes],
+                dtype = np.int16
+            )
+            if countries_whitelist:
+                self.codes_whitelist = np.array(
+                    [codes[country] for country in countries_whitelist if country in codes],
+                    dtype = np.int16
+                )
+        elif countries_whitelist:
+            raise ValueError('a countries whitelist requires a country table')
+
+    def arrays(self):
+        """
+        Return the arrays of the compiled tables by name.
+        """
+        arrays = {'starts': self.starts, 'ends': self.ends}
+        if self.country_table:
+            arrays['country_starts'] = self.country_table.starts
+            arrays['country_ends']   = self.country_table.ends
+            arrays['country_codes']  = self.country_table.codes
+            arrays['codes_SIGINT']   = self.codes_SIGINT
+        if self.codes_whitelist is not None:
+            arrays['codes_whitelist'] = self.codes_whitelist
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays=None, countries=None):
+        """
+        Return an auditor of compiled table arrays, which are used without
+        copying.
+        """
+        auditor = cls.__new__(cls)
+        auditor.starts              = arrays['starts']
+        auditor.ends                = arrays['ends']
+        auditor.country_table       = None
+        auditor.countries_whitelist = None
+        auditor.codes_whitelist     = arrays.get('codes_whitelist')
+        auditor.codes_SIGINT        = arrays.get('codes_SIGINT')
+        if 'country_starts' in arrays:
+            auditor.country_table = CountryTable(
+                starts    = arrays['country_starts'],
+                ends      = arrays['country_ends'],
+                codes     = arrays['country_codes'],
+                countries = countries
+            )
+        return auditor
+
+    def whitelisted(self, integers):
+        np    = numpy()
+        index = np.searchsorted(self.starts, integers, side='right') - 1
+        found = index >= 0
+        index = np.maximum(index, 0)
+        return found & (integers <= self.ends[index])
+
+    def classify(self, integers, aggregates=None):
+        """
+        Return a mask of offending addresses, updating the aggregates.
+        """
+        np    = numpy()
+        codes = None
+        if self.country_table:
+            codes = self.country_table.lookup(integers)
+            if aggregates is not None:
+                counts = np.bincount(codes + 1, minlength=len(self.country_table.countries) + 1)
+                for index in np.flatnonzero(counts):
+                    country = self.country_table.countries[index - 1] if index else 'unknown'
+                    aggregates.countries[country] += int(counts[index])
+                aggregates.SIGINT += int(np.isin(codes, self.codes_SIGINT).sum())
+        if self.codes_whitelist is not None:
+            allowed = np.isin(codes, self.codes_whitelist)
+        else:
+            allowed = self.whitelisted(integers)
+        if aggregates is not None:
+            aggregates.whitelisted += int(allowed.sum())
+        return ~allowed
+
+    def audit_chunk(self, chunk, aggregates=None, offenders=None):
+        """
+        Audit a chunk of whole lines, updating the aggregates and writing
+        offending lines to the offenders stream if specified.
+        """
+        np = numpy()
+        aggregates.lines += chunk.count(b'\n')
+        integers, valid, starts = extract(chunk)
+        aggregates.invalid += int((~valid).sum())
+        integers   = integers[valid]
+        aggregates.IPs += len(integers)
+        if not len(integers):
+            return aggregates
+        offending  = self.classify(integers, aggregates=aggregates)
+        number     = int(offending.sum())
+        if not number:
+            return aggregates
+        aggregates.offending += number
+        aggregates.offenders.update(integers[offending])
+        if offenders is not None:
+            newlines = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == 10)
+            lines    = np.unique(np.searchsorted(newlines, starts[valid][offending]))
+            for line in lines.tolist():
+                start = newlines[line - 1] + 1 if line else 0
+                end   = newlines[line] + 1 if line < len(newlines) else len(chunk)
+                offenders.write(chunk[start:end])
+        return aggregates
+
+def chunks(filename=None, size=8388608):
+    """
+    Yield chunks of whole lines of a file (- for standard input).
+    """
+    file_input = sys.stdin.buffer if filename == '-' else open(filename, 'rb')
+    try:
+        remainder = b''
+        while True:
+            data = file_input.read(size)
+            if not data:
+                break
+            data  = remainder + data
+            index = data.rfind(b'\n')
+            if index == -1:
+                remainder = data
+                continue
+            remainder = data[index + 1:]
+            yield data[:index + 1]
+        if remainder:
+            yield remainder + b'\n'
+    finally:
+        if file_input is not sys.stdin.buffer:
+            file_input.close()
+
+def audit(
+    filenames  = None,
+    auditor    = None,
+    offenders  = None,
+    chunk_size = 8388608
+    ):
+    aggregates = Aggregates()
+    for filename in filenames:
+        for chunk in chunks(filename=filename, size=chunk_size):
+            auditor.audit_chunk(chunk, aggregates=aggregates, offenders=offenders)
+    return aggregates
+
+class SharedTables(object):
+    """
+    Compiled table arrays of an auditor written once to a temporary file that
+    worker processes memory-map read-only, so that the tables are shared in
+    the page cache rather than pickled or copied per worker.
+    """
+
+    def __init__(self, auditor=None, countries=None):
+        np        = numpy()
+        directory = '/dev/shm' if os.path.isdir('/dev/shm') else None
+        self.file = tempfile.NamedTemporaryFile(prefix='pebcaw_', dir=directory)
+        self.layout    = []
+        self.countries = countries
+        offset         = 0
+        for name, array in auditor.arrays().items():
+            array = np.ascontiguousarray(array)
+            self.file.write(array.tobytes())
+            self.layout.append((name, array.dtype.str, offset, len(array)))
+            offset += array.nbytes
+        self.file.flush()
+
+    def description(self):
+        return self.file.name, self.layout, self.countries
+
+    def close(self):
+        self.file.close()
+
+def attach(filename=None, layout=None, countries=None):
+    """
+    Return an auditor of the tables memory-mapped from a shared tables file.
+    """
+    np     = numpy()
+    size   = os.path.getsize(filename)
+    memory = np.memmap(filename, dtype=np.uint8, mode='r', shape=(size,)) if size else None
+    arrays = {}
+    for name, dtype, offset, length in layout:
+        if length:
+            arrays[name] = memory[offset:offset + length * np.dtype(dtype).itemsize].view(dtype)
+        else:
+            arrays[name] = np.zeros(0, dtype=dtype)
+    return Auditor.from_arrays(arrays=arrays, countries=countries)
+
+def ranges(filenames=None, size=67108864):
+    """
+    Yield (filename, start, end) byte ranges of files for parallel audit.
+    """
+    for filename in filenames:
+        total = os.path.getsize(filename)
+        for start in range(0, max(total, 1), size):
+            yield filename, start, min(start + size, total)
+
+def chunks_range(filename=None, start=0, end=None, size=8388608):
+    """
+    Yield chunks of whole lines of a byte range of a file. A line belongs to the
+    range that contains its first byte.
+    """
+    with open(filename, 'rb') as file_input:
+        if start:
+            file_input.seek(start - 1)
+            if file_input.read(1) != b'\n':
+                file_input.readline()
+        position = file_input.tell()
+        while position < end:
+            data = file_input.read(min(size, end - position))
+            if not data:
+                break
+            position += len(data)
+            if position >= end:
+                if not data.endswith(b'\n'):
+                    data += file_input.readline()
+                yield data if data.endswith(b'\n') else data + b'\n'
+                break
+            index = data.rfind(b'\n')
+            if index == -1:
+                data     += file_input.readline()
+                position  = file_input.tell()
+                yield data
+                continue
+            file_input.seek(position - len(data) + index + 1)
+            position = file_input.tell()
+            yield data[:index + 1]
+
+auditor_worker = None
+
+def initialise_worker(description):
+    global auditor_worker
+    auditor_worker = attach(*description)
+
+def audit_range(task):
+    filename, start, end, chunk_size, output = task
+    aggregates = Aggregates()
+    offenders  = io.BytesIO() if output else None
+    for chunk in chunks_range(filename=filename, start=start, end=end, size=chunk_size):
+        auditor_worker.audit_chunk(chunk, aggregates=aggregates, offenders=offenders)
+    return aggregates, offenders.getvalue() if output else b''
+
+def audit_parallel(
+    filenames  = None,
+    auditor    = None,
+    offenders  = None,
+    chunk_size = 8388608,
+    range_size = 67108864,
+    processes  = None
+    ):
+    """
+    Audit files across a pool of processes and merge their partial aggregates.
+    Offending lines are written in input order.
+    """
+    tables = SharedTables(
+        auditor   = auditor,
+        countries = auditor.country_table.countries if auditor.country_table else None
+    )
+    try:
+        aggregates = Aggregates()
+        tasks      = [
+            (filename, start, end, chunk_size, offenders is not None)
+            for filename, start, end in ranges(filenames=filenames, size=range_size)
+        ]
+        with multiprocessing.Pool(
+            processes   = processes or None,
+            initializer = initialise_worker,
+            initargs    = (tables.description(),)
+        ) as pool:
+            for partial, lines in pool.imap(audit_range, tasks):
+                aggregates.merge(partial)
+                if lines:
+                    offenders.write(lines)
+    finally:
+        tables.close()
+    return aggregates
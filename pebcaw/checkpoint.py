@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW checkpoint                                                            #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module checkpoints the state of the monitor (last observation and      #
+# cached IP details) atomically to a small file whenever it changes, so that a #
+# restart resumes warm.                                                        #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+import json
+import os
+
+from pebcaw import monitor
+
+version = 1
+
+def save(filename=None, checkpoint=None):
+    """
+    Write a checkpoint atomically: to a temporary file, synchronised, that
+    then replaces the checkpoint.
+    """
+    filename_temporary = filename + '.tmp'
+    with open(filename_temporary, 'w') as file_checkpoint:
+        json.dump(checkpoint, file_checkpoint, separators=(',', ':'))
+        file_checkpoint.flush()
+        os.fsync(file_checkpoint.fileno())
+    os.replace(filename_temporary, filename)
+
+def load(filename=None):
+    """
+    Return the checkpoint of a file, or None if there is no valid checkpoint.
+    """
+    try:
+        with open(filename) as file_checkpoint:
+            checkpoint = json.load(file_checkpoint)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(checkpoint, dict) or checkpoint.get('version') != version:
+        return None
+    return checkpoint
+
+class Checkpointer(object):
+    """
+    Sink that checkpoints the state of a monitor and the entries of a cache of
+    IP details when either changes. The latest state should also be saved at
+    exit and before restart, so that the schedule resumes from the latest
+    observation. The state of the actions is not checkpointed: the firewall
+    rules or other effects of an action engaged before a crash or reboot may
+    be gone, so the first observation after a restart engages its actions
+    again (fail closed).
+    """
+
+    def __init__(
+        self,
+        filename = None,
+        cache    = None
+        ):
+        self.filename = filename
+        self.cache    = cache
+        self.key      = None
+        self.writes   = 0
+
+    def key_state(self, state):
+        return (
+            state.key(),
+            frozenset(self.cache.entries) if self.cache is not None else None
+        )
+
+    def __call__(self, state):
+        if self.key_state(state) != self.key:
+            self.save(state)
+
+    def save(self, state=None):
+        if state is None:
+            return
+        self.key = self.key_state(state)
+        save(filename=self.filename, checkpoint={
+            'version': version,
+            'state':   state.dictionary(),
+            'geo':     self.cache.dump() if self.cache is not None else []
+        })
+        self.writes += 1
+
+    def restore(self, checkpoint=None, monitor_restored=None):
+        """
+        Restore a checkpoint to the monitor, as its previous state, and to the
+        cache, and return the restored state.
+        """
+        state = monitor.State.from_dictionary(checkpoint['state'])
+        monitor_restored.state = state
+        if self.cache is not None:
+            self.cache.restore(checkpoint.get('geo', []))
+        self.key = self.key_state(state)
+        return state
@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW client                                                                #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module provides a minimal HTTP/1.1 client on sockets for observations,  #
+# with persistent connections, timeouts, chunked transfer decoding and         #
+# optional TLS with session resumption and a pinned CA bundle.                 #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+import json
+import socket
+import urllib.parse
+
+class HTTPError(IOError):
+    pass
+
+def context(CA_bundle=None):
+    """
+    Return a client TLS context verifying certificates against the system CA
+    certificates or, if a CA bundle is specified, against only that bundle.
+    """
+    import ssl
+    return ssl.create_default_context(cafile=CA_bundle)
+
+class Response(object):
+    """
+    HTTP response of which the body has been read in full.
+    """
+
+    def __init__(self, status=None, reason='', headers=None, content=b''):
+        self.status_code = status
+        self.reason      = reason
+        self.headers     = headers or {}
+        self.content     = content
+
+    @property
+    def text(self):
+        _, _, charset = self.headers.get('content-type', '').partition('charset=')
+        return self.content.decode(charset.split(';')[0].strip() or 'utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if not 200 <= self.status_code < 300:
+            raise HTTPError('HTTP status {status} {reason}'.format(
+                status = self.status_code,
+                reason = self.reason
+            ))
+
+class Connection(object):
+    """
+    Persistent HTTP/1.1 connection to a host, opened on the first request and
+    kept alive between requests unless the server closes it. A request on a
+    kept-alive connection that the server has since closed is retried once on
+    a new connection. Over TLS, a new connection resumes the session of the
+    previous one, so that it costs an abbreviated handshake. If a resolver is
+    specified, the host is connected at the addresses it returns, in turn,
+    rather than resolved by the system.
+    """
+
+    def __init__(
+        self,
+        host     = None,
+        port     = 80,
+        TLS      = False,
+        timeout  = 10,
+        context  = None,
+        resolver = None
+        ):
+        self.host     = host
+        self.port     = port
+        self.TLS      = TLS
+        self.timeout  = timeout
+        self.context  = context
+        self.resolver = resolver
+        self.session  = None
+        self.socket   = None
+        self.file     = None
+
+    def connect_addresses(self):
+        exception = OSError('no addresses of ' + self.host)
+        for address in self.resolver.addresses(self.host):
+            sock = socket.socket(socket.AF_INET6 if ':' in address else socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                sock.settimeout(self.timeout)
+                sock.connect((address, self.port))
+                return sock
+            except OSError as _exception:
+                sock.close()
+                exception = _exception
+        raise exception
+
+    def connect(self):
+        if self.resolver:
+            sock = self.connect_addresses()
+        else:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.TLS:
+            if self.context is None:
+                self.context = context()
+            try:
+                sock = self.context.wrap_socket(
+                    sock,
+                    server_hostname = self.host,
+                    session         = self.session
+                )
+            except:
+                sock.close()
+                raise
+        self.socket = sock
+        self.file   = sock.makefile('rb')
+
+    def close(self):
+        if self.socket is not None:
+            if self.TLS:
+                self.session = self.socket.session or self.session
+            self.file.close()
+            self.socket.close()
+        self.socket = None
+        self.file   = None
+
+    def request(self, method='GET', path='/', headers=None):
+        reused = self.socket is not None
+        try:
+            return self.exchange(method=method, path=path, headers=headers)
+        except (ConnectionError, EOFError, socket.timeout) as exception:
+            self.close()
+            if not reused or isinstance(exception, socket.timeout):
+                raise
+        return self.exchange(method=method, path=path, headers=headers)
+
+    def exchange(self, method='GET', path='/', headers=None):
+        if self.socket is None:
+            self.connect()
+        host = self.host if self.port == (443 if self.TLS else 80) else '{host}:{port}'.format(
+            host = self.host,
+            port = self.port
+        )
+        lines = [
+            '{method} {path} HTTP/1.1'.format(method=method, path=path),
+            'Host: ' + host,
+            'Accept-Encoding: identity'
+        ]
+        lines.extend('{name}: {value}'.format(name=name, value=value) for name, value in (headers or {}).items())
+        self.socket.settimeout(self.timeout)
+        self.socket.sendall(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        try:
+            response, keep_alive = self.read_response(method=method)
+        except:
+            self.close()
+            raise
+        if self.TLS:
+            self.session = self.socket.session or self.session
+        if not keep_alive:
+            self.close()
+        return response
+
+    def readline(self):
+        line = self.file.readline(65537)
+        if not line:
+            raise EOFError('connection closed by server')
+        return line
+
+    def read_response(self, method='GET'):
+        version, _, rest = self.readline().decode('latin-1').rstrip('\r\n').partition(' ')
+        status, _, reason = rest.partition(' ')
+        if not version.startswith('HTTP/'):
+            raise HTTPError('invalid status line')
+        status  = int(status)
+        headers = {}
+        while True:
+            line = self.readline().decode('latin-1').rstrip('\r\n')
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' and (version != 'HTTP/1.0' or connection == 'keep-alive')
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            content = b''
+        elif 'chunked' in headers.get('transfer-encoding', '').lower():
+            content = self.read_chunked()
+        elif 'content-length' in headers:
+            content = self.read_exactly(int(headers['content-length']))
+        else:
+            content    = self.file.read()
+            keep_alive = False
+        return Response(status=status, reason=reason, headers=headers, content=content), keep_alive
+
+    def read_exactly(self, size):
+        content = self.file.read(size)
+        if len(content) < size:
+            raise EOFError('connection closed by server')
+        return content
+
+    def read_chunked(self):
+        chunks = []
+        while True:
+            size = int(self.readline().split(b';')[0].strip(), 16)
+            if not size:
+                break
+            chunks.append(self.read_exactly(size))
+            self.readline()
+        while self.readline() not in (b'\r\n', b'\n'):
+            pass
+        return b''.join(chunks)
+
+class Client(object):
+    """
+    HTTP client of a persistent connection per scheme, host and port, sharing
+    one TLS context, created on the first HTTPS request if not specified, and
+    optionally a resolver of hosts.
+    """
+
+    def __init__(self, timeout=10, context=None, CA_bundle=None, resolver=None):
+        self.timeout     = timeout
+        self.context     = context
+        self.CA_bundle   = CA_bundle
+        self.resolver    = resolver
+        self.connections = {}
+
+    def get(self, URL=None, headers=None, timeout=None):
+        URL  = urllib.parse.urlsplit(URL)
+        TLS  = URL.scheme == 'https'
+        port = URL.port or (443 if TLS else 80)
+        key  = (URL.scheme, URL.hostname, port)
+        connection = self.connections.get(key)
+        if TLS and self.context is None:
+            self.context = context(CA_bundle=self.CA_bundle)
+        if connection is None:
+            connection = self.connections[key] = Connection(
+                host     = URL.hostname,
+                port     = port,
+                TLS      = TLS,
+                timeout  = self.timeout,
+                context  = self.context,
+                resolver = self.resolver
+            )
+        if timeout is not None:
+            connection.timeout = timeout
+        path = (URL.path or '/') + ('?' + URL.query if URL.query else '')
+        return connection.request(method='GET', path=path, headers=headers)
+
+    def close(self):
+        for connection in self.connections.values():
+            connection.close()
+        self.connections.clear()
+
+class RequestsClient(object):
+    """
+    HTTP client by way of the requests library, imported on first use.
+    """
+
+    def __init__(self, timeout=10, CA_bundle=None):
+        import requests
+        self.timeout = timeout
+        self.session = requests.Session()
+        if CA_bundle:
+            self.session.verify = CA_bundle
+
+    def get(self, URL=None, headers=None, timeout=None):
+        return self.session.get(URL, headers=headers, timeout=timeout or self.timeout)
+
+    def close(self):
+        self.session.close()
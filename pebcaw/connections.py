@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW connections                                                           #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module passively checks the egress of the connected sockets of the      #
+# system, listed in /proc/net/tcp, tcp6, udp and udp6, against the routes of   #
+# the kernel and the whitelist index, classifying only connections new since   #
+# the last scan, and flags connections that leave outside the VPN interfaces.  #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+import struct
+
+from pebcaw import network
+from pebcaw import whitelist
+
+ESTABLISHED = '01'
+
+tables_default = (
+    ('tcp',  '/proc/net/tcp'),
+    ('tcp6', '/proc/net/tcp6'),
+    ('udp',  '/proc/net/udp'),
+    ('udp6', '/proc/net/udp6')
+)
+
+networks_local = (
+    '10.0.0.0/8',
+    '172.16.0.0/12',
+    '192.168.0.0/16',
+    '169.254.0.0/16',
+    '224.0.0.0/4',
+    'fc00::/7',
+    'fe80::/10',
+    'ff00::/8'
+)
+
+IPv4_mapped  = 0xffff << 32
+size_remotes = 65536
+
+def hex_to_integer_IPv6(text):
+    """
+    Return the integer of an address in the hexadecimal of /proc/net/tcp6, of
+    four 32-bit words in host byte order.
+    """
+    return int.from_bytes(struct.pack('!4I', *struct.unpack('=4I', bytes.fromhex(text))), 'big')
+
+def parse_address(text):
+    """
+    Return the family bits (32 or 128), integer address and port of an
+    address of /proc/net/tcp or tcp6 (e.g. 0100007F:0035). IPv4-mapped IPv6
+    addresses are returned as IPv4.
+    """
+    address, _, port = text.partition(':')
+    if len(address) == 8:
+        return 32, network.hex_to_integer_IPv4(address), int(port, 16)
+    integer = hex_to_integer_IPv6(address)
+    if integer >> 32 == 0xffff:
+        return 32, integer - IPv4_mapped, int(port, 16)
+    return 128, integer, int(port, 16)
+
+def format_address(bits=32, integer=None, port=None):
+    if bits == 32:
+        return whitelist.integer_to_IP(integer) + ':' + str(port)
+    return '[' + whitelist.integer_to_IPv6(integer) + ']:' + str(port)
+
+class EgressCheck(object):
+    """
+    Incremental check of the egress of connected TCP and UDP sockets. Each
+    scan streams the socket tables and classifies only the connections (by
+    protocol, local and remote address) not seen in the previous scan. A
+    connection leaks if its remote address is neither loopback, local nor
+    whitelisted (e.g. the VPN server) and the kernel routes it by an interface
+    that is not a VPN interface. Classifications of remote addresses are
+    cached until the network changes, on which all connections are classified
+    again.
+    """
+
+    def __init__(
+        self,
+        index          = None,
+        interfaces_VPN = None,
+        local          = networks_local,
+        changes        = None,
+        router         = None,
+        tables         = tables_default
+        ):
+        self.index          = index if index is not None else whitelist.Index()
+        self.interfaces_VPN = interfaces_VPN
+        self.local          = whitelist.Index(local)
+        self.changes        = changes or network.NetworkChanges()
+        self.router         = router or network.router()
+        self.tables         = tables
+        self.connections    = {}
+        self.remotes        = {}
+        self.classified     = 0
+        self.scans          = 0
+
+    def interface(self, bits=32, integer=None):
+        """
+        Return the interface by which an integer address leaves, or None if it
+        does not leave (loopback, local, whitelisted or without a route).
+        """
+        if bits == 32:
+            if integer >> 24 == 127 or integer == 0:
+                return None
+            if self.local.contains_integer(integer) or self.index.contains_integer(integer):
+                return None
+        else:
+            if integer in (0, 1):
+                return None
+            if self.local.contains_integer_IPv6(integer) or self.index.contains_integer_IPv6(integer):
+                return None
+        interface = self.router.route_integer(integer=integer, bits=bits)
+        return None if interface == 'lo' else interface
+
+    def classify(self, protocol=None, local=None, remote=None, inode=None):
+        """
+        Return the details of a connection if it leaks, otherwise None.
+        """
+        address = remote.partition(':')[0]
+        if address not in self.remotes:
+            bits, integer, _ = parse_address(remote)
+            interface = self.interface(bits=bits, integer=integer)
+            self.remotes[address] = (
+                interface is not None and not network.is_VPN_interface(interface, self.interfaces_VPN),
+                interface
+            )
+        leak, interface = self.remotes[address]
+        if not leak:
+            return None
+        return {
+            'protocol':  protocol,
+            'local':     format_address(*parse_address(local)),
+            'remote':    format_address(*parse_address(remote)),
+            'interface': interface,
+            'inode':     int(inode)
+        }
+
+    def scan(self):
+        """
+        Scan the socket tables and return the details of the connections that
+        leak.
+        """
+        self.scans += 1
+        if len(self.remotes) > size_remotes:
+            self.remotes = {}
+        if self.changes.changed():
+            self.connections = {}
+            self.remotes     = {}
+        connections = {}
+        for protocol, path in self.tables:
+            try:
+                with open(path) as file_table:
+                    for line in file_table:
+                        fields = line.split(None, 4)
+                        if len(fields) < 5 or fields[3] != ESTABLISHED:
+                            continue
+                        key = (protocol, fields[1], fields[2])
+                        if key in self.connections:
+                            connections[key] = self.connections[key]
+                        else:
+                            connections[key] = self.classify(*key, inode=fields[4].split()[5])
+                            self.classified += 1
+            except OSError:
+                continue
+        self.connections = connections
+        return [connection for connection in connections.values() if connection is not None]
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW dashboard                                                             #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module provides a terminal dashboard of the monitor state that draws a  #
+# static layout once and then rewrites only the fields of which the values     #
+# changed, by cursor addressing, so that refreshes cost few bytes over slow    #
+# remote terminals.                                                            #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+import collections
+import sys
+import threading
+import time
+
+ESC = chr(27)
+
+blocks = '▁▂▃▄▅▆▇█'
+
+labels = (
+    ('state',        'state:'),
+    ('IP',           'IP:'),
+    ('organisation', 'organisation:'),
+    ('coordinates',  'coordinates:'),
+    ('city',         'city:'),
+    ('country',      'country:'),
+    ('region',       'region:'),
+    ('latency',      'check latency:'),
+    ('changed',      'since change:'),
+    ('checks',       'checks:'),
+    ('history',      'history:'),
+    ('latencies',    'latencies:')
+)
+
+def sparkline(values):
+    """
+    Return a sparkline of values scaled between their minimum and maximum.
+    """
+    if not values:
+        return ''
+    minimum = min(values)
+    scale   = (max(values) - minimum) or 1
+    return ''.join(blocks[int((value - minimum) / scale * (len(blocks) - 1))] for value in values)
+
+def duration_text(seconds):
+    seconds = int(seconds)
+    if seconds < 3600:
+        return '{:d}m {:02d}s'.format(seconds // 60, seconds % 60)
+    return '{:d}h {:02d}m'.format(seconds // 3600, seconds % 3600 // 60)
+
+class Dashboard(object):
+    """
+    Sink that renders the monitor state as a terminal dashboard. The layout of
+    labels is drawn once; each refresh moves the cursor to and rewrites only
+    the fields of which the text changed.
+    """
+
+    stage = 'display'
+
+    def __init__(
+        self,
+        stream  = sys.stdout,
+        title   = 'PEBCAW',
+        history = 40,
+        row     = 1
+        ):
+        self.stream        = stream
+        self.title         = title
+        self.row           = row
+        self.column        = max(len(label) for key, label in labels) + 3
+        self.rows          = {key: row + 2 + index for index, (key, label) in enumerate(labels)}
+        self.values        = {}
+        self.history       = collections.deque(maxlen=history)
+        self.latencies     = collections.deque(maxlen=history)
+        self.checks        = 0
+        self.key           = None
+        self.time_changed  = None
+        self.drawn         = False
+        self.bytes_written = 0
+        self.lock          = threading.Lock()
+
+    def write(self, text):
+        self.stream.write(text)
+        self.stream.flush()
+        self.bytes_written += len(text.encode('utf-8'))
+
+    def layout(self):
+        text = ESC + '[2J' + ESC + '[?25l' + ESC + '[{};1H'.format(self.row) + self.title
+        for key, label in labels:
+            text += ESC + '[{};1H'.format(self.rows[key]) + label
+        self.values = {}
+        self.drawn  = True
+        return text
+
+    def render(self, fields):
+        """
+        Return the escape sequences that update the changed fields.
+        """
+        text = '' if self.drawn else self.layout()
+        for key, value in fields.items():
+            if self.values.get(key) != value:
+                text += ESC + '[{};{}H'.format(self.rows[key], self.column) + value + ESC + '[K'
+                self.values[key] = value
+        return text
+
+    def fields_time(self):
+        if self.time_changed is None:
+            return {}
+        return {'changed': duration_text(time.monotonic() - self.time_changed)}
+
+    def __call__(self, state):
+        data = state.data
+        self.checks += 1
+        self.history.append(state.secure)
+        if state.duration is not None:
+            self.latencies.append(state.duration)
+        if state.key() != self.key:
+            self.key          = state.key()
+            self.time_changed = time.monotonic()
+        if state.error is not None:
+            text_state = 'INSECURE (error observing IP)'
+        else:
+            text_state = 'secure' if state.secure else 'INSECURE'
+        fields = {
+            'state':     text_state,
+            'latency':   '{:.1f} ms'.format(1000 * state.duration) if state.duration is not None else 'unknown',
+            'checks':    str(self.checks),
+            'history':   ''.join('▁' if secure else '█' for secure in self.history),
+            'latencies': sparkline(list(self.latencies))
+        }
+        if state.error is None:
+            fields.update({
+                'IP':           data.get('ip')      or 'unknown',
+                'organisation': data.get('org')     or 'unknown',
+                'coordinates':  data.get('loc')     or 'unknown',
+                'city':         data.get('city')    or 'unknown',
+                'country':      data.get('country') or 'unknown',
+                'region':       data.get('region')  or 'unknown'
+            })
+        fields.update(self.fields_time())
+        with self.lock:
+            self.write(self.render(fields) + ESC + '[{};1H'.format(self.rows['latencies'] + 2))
+
+    def refresh(self):
+        """
+        Update the time since change.
+        """
+        with self.lock:
+            text = self.render(self.fields_time())
+            if text:
+                self.write(text + ESC + '[{};1H'.format(self.rows['latencies'] + 2))
+
+    def start(self, period=1):
+        """
+        Refresh the time since change periodically in a background thread.
+        """
+        def run():
+            while True:
+                time.sleep(period)
+                self.refresh()
+        threading.Thread(target=run, daemon=True).start()
+        return self
+
+    def close(self):
+        self.write(ESC + '[?25h')
@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW DNS                                                                   #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module checks for DNS leaks by inspecting the resolver configuration of #
+# the system (including the upstream servers of systemd-resolved) and the      #
+# routes toward its nameservers, and by probing nameservers with DNS queries.  #
+# Results are cached until the network or resolver configuration changes. It   #
+# also caches the addresses of provider hostnames, honouring their TTLs with   #
+# background refresh, so that observations need not resolve hostnames.         #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+import os
+import random
+import socket
+import struct
+import threading
+import time
+
+from pebcaw import network
+
+path_resolv_conf          = '/etc/resolv.conf'
+path_resolv_conf_upstream = '/run/systemd/resolve/resolv.conf'
+nameservers_stub          = ('127.0.0.53', '127.0.0.54')
+
+def nameservers(path=path_resolv_conf):
+    _nameservers = []
+    try:
+        with open(path) as file_resolv_conf:
+            for line in file_resolv_conf:
+                fields = line.split()
+                if len(fields) >= 2 and fields[0] == 'nameserver':
+                    _nameservers.append(fields[1].split('%')[0])
+    except OSError:
+        pass
+    return _nameservers
+
+def nameservers_system(
+    path          = path_resolv_conf,
+    path_upstream = path_resolv_conf_upstream
+    ):
+    """
+    Return the nameservers of the system. If the resolver is the stub of
+    systemd-resolved, its upstream nameservers are returned.
+    """
+    _nameservers = nameservers(path)
+    if _nameservers and all(nameserver in nameservers_stub for nameserver in _nameservers):
+        upstream = nameservers(path_upstream)
+        if upstream:
+            return upstream
+    return _nameservers
+
+def query_packet(name='example.com', identifier=None, type_=1):
+    """
+    Return a recursive DNS query packet for a name (type 1 is A).
+    """
+    identifier = random.getrandbits(16) if identifier is None else identifier
+    packet = struct.pack('!HHHHHH', identifier, 0x0100, 1, 0, 0, 0)
+    for label in name.rstrip('.').split('.'):
+        packet += bytes([len(label)]) + label.encode('ascii')
+    return packet + b'\0' + struct.pack('!HH', type_, 1)
+
+def query(
+    nameserver = None,
+    port       = 53,
+    name       = 'example.com',
+    type_      = 1,
+    timeout    = 2
+    ):
+    """
+    Query a nameserver over UDP and return the response and the response time
+    (s). An exception is raised if there is no valid response.
+    """
+    family     = socket.AF_INET6 if ':' in nameserver else socket.AF_INET
+    identifier = random.getrandbits(16)
+    with socket.socket(family, socket.SOCK_DGRAM) as connection:
+        connection.settimeout(timeout)
+        time_start = time.monotonic()
+        connection.sendto(query_packet(name=name, identifier=identifier, type_=type_), (nameserver, port))
+        while True:
+            response, address = connection.recvfrom(4096)
+            if len(response) >= 12 and struct.unpack('!H', response[:2])[0] == identifier:
+                break
+        if not response[2] & 0x80:
+            raise IOError('invalid DNS response from ' + nameserver)
+        return response, time.monotonic() - time_start
+
+def probe(
+    nameserver = None,
+    port       = 53,
+    name       = 'example.com',
+    timeout    = 2
+    ):
+    """
+    Query a nameserver over UDP and return the response time (s). An exception
+    is raised if there is no valid response.
+    """
+    return query(nameserver=nameserver, port=port, name=name, timeout=timeout)[1]
+
+def skip_name(packet, offset):
+    while True:
+        length = packet[offset]
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        if not length:
+            return offset + 1
+        offset += length + 1
+
+def answers(packet, type_=1):
+    """
+    Return the addresses and TTLs (s) of the answers of a type (1 is A, 28 is
+    AAAA) in a DNS response.
+    """
+    flags, questions, number = struct.unpack('!HHH', packet[2:8])
+    if flags & 0x000F:
+        raise IOError('DNS error response (rcode {rcode})'.format(rcode=flags & 0x000F))
+    offset = 12
+    for _ in range(questions):
+        offset = skip_name(packet, offset) + 4
+    results = []
+    for _ in range(number):
+        offset = skip_name(packet, offset)
+        type_answer, class_answer, TTL, length = struct.unpack('!HHIH', packet[offset:offset + 10])
+        offset += 10
+        data    = packet[offset:offset + length]
+        offset += length
+        if type_answer == type_ and class_answer == 1 and length in (4, 16):
+            results.append((socket.inet_ntop(socket.AF_INET if length == 4 else socket.AF_INET6, data), TTL))
+    return results
+
+def resolve(
+    name        = None,
+    nameservers = None,
+    port        = 53,
+    timeout     = 2
+    ):
+    """
+    Return the IPv4 and IPv6 addresses of a name and the least of their TTLs
+    (s), queried directly of the nameservers (by default those of the system),
+    trying each in turn. An exception is raised if no nameserver answers.
+    """
+    exception = IOError('no nameservers')
+    for nameserver in nameservers or nameservers_system():
+        try:
+            addresses, TTLs = [], []
+            for type_ in (1, 28):
+                response, _ = query(nameserver=nameserver, port=port, name=name, type_=type_, timeout=timeout)
+                for address, TTL in answers(response, type_=type_):
+                    addresses.append(address)
+                    TTLs.append(TTL)
+            if addresses:
+                return addresses, min(TTLs)
+            exception = IOError('no addresses of ' + name)
+        except (OSError, IOError, struct.error, IndexError) as _exception:
+            exception = _exception
+    raise exception
+
+class HostCache(object):
+    """
+    Cache of the addresses of provider hostnames. A hostname is resolved once,
+    directly of the nameservers of the system (falling back to getaddrinfo),
+    and its addresses are refreshed in the background once most of their TTL
+    has elapsed, so that lookups never wait on resolution after the first.
+    Expired addresses continue to be returned until a refresh succeeds, so
+    that lookups succeed while the resolver is down. Pinned hostnames are
+    never resolved.
+    """
+
+    def __init__(
+        self,
+        pins        = None,
+        nameservers = None,
+        port        = 53,
+        TTL_minimum = 60,
+        TTL_default = 300,
+        refresh     = 0.8,
+        clock       = time
+        ):
+        self.pins        = {host: list(addresses) for host, addresses in (pins or {}).items()}
+        self.nameservers = nameservers
+        self.port        = port
+        self.TTL_minimum = TTL_minimum
+        self.TTL_default = TTL_default
+        self.refresh     = refresh
+        self.clock       = clock
+        self.entries     = {}
+        self.refreshing  = set()
+        self.lock        = threading.Lock()
+        self.resolutions = 0
+
+    def resolve(self, host):
+        self.resolutions += 1
+        try:
+            addresses, TTL = resolve(name=host, nameservers=self.nameservers, port=self.port)
+        except (OSError, IOError, struct.error, IndexError):
+            addresses = []
+            for _family, _, _, _, address in socket.getaddrinfo(host, None, type=socket.SOCK_STREAM):
+                if address[0] not in addresses:
+                    addresses.append(address[0])
+            TTL = self.TTL_default
+        time_now = self.clock.monotonic()
+        with self.lock:
+            self.entries[host] = (addresses, time_now, time_now + max(TTL, self.TTL_minimum))
+        return addresses
+
+    def refresh_background(self, host):
+        with self.lock:
+            if host in self.refreshing:
+                return
+            self.refreshing.add(host)
+        def refresh():
+            try:
+                self.resolve(host)
+            except OSError:
+                pass
+            finally:
+                with self.lock:
+                    self.refreshing.discard(host)
+        threading.Thread(target=refresh, name='pebcaw_resolve', daemon=True).start()
+
+    def addresses(self, host):
+        """
+        Return the addresses of a hostname.
+        """
+        if host in self.pins:
+            return self.pins[host]
+        try:
+            socket.inet_pton(socket.AF_INET6 if ':' in host else socket.AF_INET, host)
+            return [host]
+        except OSError:
+            pass
+        entry = self.entries.get(host)
+        if entry is None:
+            return self.resolve(host)
+        addresses, time_resolved, time_expiry = entry
+        if self.clock.monotonic() >= time_resolved + self.refresh * (time_expiry - time_resolved):
+            self.refresh_background(host)
+        return addresses
+
+def parse_pins(text=None):
+    """
+    Return the pinned addresses by hostname of comma-separated host:IP pairs
+    (e.g. ipinfo.io:34.117.59.81,ipinfo.io:2600:1901:0:13e0::).
+    """
+    pins = {}
+    for pair in (text or '').split(','):
+        if pair:
+            host, _, address = pair.partition(':')
+            pins.setdefault(host, []).append(address)
+    return pins
+
+class DNSCheck(object):
+    """
+    Cached DNS leak check. A nameserver leaks if the kernel routes it by an
+    interface that is not a VPN interface; a nameserver without a route (e.g.
+    blackholed by a kill switch) does not leak. Loopback nameservers other than
+    the systemd-resolved stub are local resolvers of which the upstream is
+    unknown and are not classified as leaks. The check is re-run only when the
+    network or the resolver configuration changes.
+    """
+
+    def __init__(
+        self,
+        interfaces_VPN = None,
+        probe_name     = None,
+        port           = 53,
+        changes        = None,
+        nameservers    = None
+        ):
+        self.interfaces_VPN = interfaces_VPN
+        self.probe_name     = probe_name
+        self.port           = port
+        self.changes        = changes or network.NetworkChanges()
+        self.nameservers    = nameservers
+        self.results        = None
+        self.time_modified  = None
+        self.runs           = 0
+
+    def resolver_modified(self):
+        try:
+            time_modified = (
+                os.stat(path_resolv_conf).st_mtime,
+                os.path.exists(path_resolv_conf_upstream) and os.stat(path_resolv_conf_upstream).st_mtime
+            )
+        except OSError:
+            time_modified = None
+        modified           = time_modified != self.time_modified
+        self.time_modified = time_modified
+        return modified
+
+    def run(self):
+        """
+        Return the results of the check per nameserver.
+        """
+        self.runs += 1
+        results = []
+        for nameserver in self.nameservers or nameservers_system():
+            try:
+                interface = network.route(nameserver)
+            except (OSError, ValueError):
+                interface = None
+            leak   = interface not in (None, 'lo') and not network.is_VPN_interface(interface, self.interfaces_VPN)
+            result = {
+                'nameserver': nameserver,
+                'interface':  interface,
+                'leak':       leak
+            }
+            if self.probe_name:
+                try:
+                    result['latency'] = probe(nameserver, port=self.port, name=self.probe_name)
+                except (OSError, IOError) as exception:
+                    result['latency'] = None
+                    result['error']   = str(exception)
+            results.append(result)
+        return results
+
+    def check(self):
+        """
+        Return the cached results, re-running the check if the network or the
+        resolver configuration changed.
+        """
+        changed = self.changes.changed()
+        if self.resolver_modified() or changed or self.results is None:
+            self.results = self.run()
+        return self.results
+
+    def leaks(self):
+        return [result for result in self.check() if result['leak']]
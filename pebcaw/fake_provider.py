@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW fake provider                                                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This program is a local stand-in for an IP details provider such as          #
+# ipinfo.io, of which the responses are scripted: sequences of IPs and         #
+# countries, injected latency, HTTP errors, connection resets and timeouts.    #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+
+usage:
+    program [options]
+
+options:
+    -h, --help          display help message
+    --address=TEXT      address to serve [default: 127.0.0.1:8080]
+    --script=FILE       JSON lines of response steps (default: one whitelisted IP)
+    --certificate=FILE  PEM certificate chain with which to serve HTTPS
+    --key=FILE          PEM private key of the certificate
+
+Each step of a script is a JSON object with optional fields ip, country, org,
+city, region, loc, latency (s), status (HTTP status), error (reset or timeout)
+and repeat (number of consecutive responses). Steps are served in order,
+cyclically.
+"""
+
+import collections
+import docopt
+import http.server
+import json
+import socket
+import ssl
+import threading
+import time
+
+step_default = {
+    'ip':      '109.202.107.10',
+    'country': 'CH',
+    'org':     'AS49453 Global Layer B.V.',
+    'city':    'Zurich',
+    'region':  'Zurich',
+    'loc':     '47.3667,8.5500'
+}
+
+fields = ('ip', 'city', 'region', 'country', 'loc', 'org')
+
+class Script(object):
+    """
+    Cyclic sequence of response steps, safe to advance from many threads.
+    """
+
+    def __init__(self, steps=None):
+        self.steps = []
+        for step in steps or [step_default]:
+            self.steps.extend([dict(step_default, **step)] * int(step.get('repeat', 1)))
+        self.index = 0
+        self.lock  = threading.Lock()
+
+    @classmethod
+    def load(cls, filename=None):
+        with open(filename) as file_script:
+            return cls(steps=[json.loads(line) for line in file_script if line.strip()])
+
+    def next(self):
+        with self.lock:
+            step       = self.steps[self.index % len(self.steps)]
+            self.index += 1
+        return step
+
+class Handler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version        = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.server.arrivals.append(time.monotonic())
+        step = self.server.script.next()
+        if step.get('latency'):
+            time.sleep(step['latency'])
+        error = step.get('error')
+        if error == 'timeout':
+            time.sleep(step.get('timeout', 3600))
+            self.close_connection = True
+            return
+        if error == 'reset':
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, b'\1\0\0\0\0\0\0\0')
+            self.close_connection = True
+            return
+        status = int(step.get('status', 200))
+        if status != 200:
+            self.send_error(status)
+            return
+        if self.path.rstrip('/').endswith('/ip'):
+            body = (step['ip'] + '\n').encode('utf-8')
+            content_type = 'text/plain; charset=utf-8'
+        else:
+            body = json.dumps(
+                {field: step[field] for field in fields if field in step},
+                indent = 2
+            ).encode('utf-8')
+            content_type = 'application/json; charset=utf-8'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class Server(http.server.ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), script=None, log_size=1048576, context=None):
+        super().__init__(address, Handler)
+        self.script   = script or Script()
+        self.arrivals = collections.deque(maxlen=log_size)
+        self.context  = context
+        if context:
+            self.socket = context.wrap_socket(self.socket, server_side=True)
+
+    def URL(self, path='/json'):
+        host, port = self.server_address[:2]
+        return '{scheme}://{host}:{port}{path}'.format(
+            scheme = 'https' if self.context else 'http',
+            host   = host,
+            port   = port,
+            path   = path
+        )
+
+def context(certificate=None, key=None):
+    """
+    Return a server TLS context of a certificate chain and key, issuing
+    session tickets for resumption.
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certificate, key)
+    return context
+
+def serve(address='127.0.0.1:0', script=None, certificate=None, key=None):
+    """
+    Serve a script in a background thread, over HTTPS if a certificate is
+    specified, and return the server.
+    """
+    host, port = address.rsplit(':', 1)
+    server     = Server(
+        address = (host, int(port)),
+        script  = script,
+        context = context(certificate=certificate, key=key) if certificate else None
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    options = docopt.docopt(__doc__)
+    host, port = options['--address'].rsplit(':', 1)
+    script = Script.load(options['--script']) if options['--script'] else Script()
+    server = Server(
+        address = (host, int(port)),
+        script  = script,
+        context = context(certificate=options['--certificate'], key=options['--key']) if options['--certificate'] else None
+    )
+    print('serving fake IP details at ' + server.URL())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
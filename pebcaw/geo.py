@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW geo                                                                   #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module caches the details of IP addresses (country, organisation,       #
+# location etc.) in a bounded least-recently-used cache with a time to live,   #
+# persisted to a file across restarts.                                         #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+import collections
+import json
+import os
+import time
+
+def URL_details(URL=None, IP=None):
+    """
+    Return the URL of the details of an IP at a provider, either by
+    substituting {IP} in the provider URL or by inserting the IP before its
+    last path component (e.g. https://ipinfo.io/json to
+    https://ipinfo.io/1.2.3.4/json).
+    """
+    if '{IP}' in URL:
+        return URL.format(IP=IP)
+    base, _, last = URL.rpartition('/')
+    return base + '/' + IP + '/' + last
+
+class Cache(object):
+    """
+    Cache of the details of IPs, keyed by IP, of at most size entries, of
+    which the least recently used is evicted first and entries older than the
+    time to live expire. If a filename is specified, the cache is loaded from
+    it and saved to it, atomically, whenever an entry is added.
+    """
+
+    def __init__(
+        self,
+        size     = 256,
+        TTL      = 86400,
+        filename = None,
+        clock    = time
+        ):
+        self.size     = size
+        self.TTL      = TTL
+        self.filename = filename
+        self.clock    = clock
+        self.entries  = collections.OrderedDict()
+        if filename:
+            self.load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, IP):
+        """
+        Return the details of the IP if cached and not expired, otherwise None.
+        """
+        entry = self.entries.get(IP)
+        if entry is None:
+            return None
+        time_cached, data = entry
+        if self.clock.time() - time_cached >= self.TTL:
+            del self.entries[IP]
+            return None
+        self.entries.move_to_end(IP)
+        return data
+
+    def put(self, IP, data):
+        self.entries[IP] = (self.clock.time(), data)
+        self.entries.move_to_end(IP)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        if self.filename:
+            self.save()
+
+    def dump(self):
+        """
+        Return the entries as a list of [IP, time cached, details], least
+        recently used first.
+        """
+        return [[IP, time_cached, data] for IP, (time_cached, data) in self.entries.items()]
+
+    def restore(self, entries=()):
+        """
+        Restore the unexpired entries of a dump.
+        """
+        time_now = self.clock.time()
+        for IP, time_cached, data in entries[-self.size:]:
+            if time_now - time_cached < self.TTL:
+                self.entries[IP] = (time_cached, data)
+
+    def load(self):
+        try:
+            with open(self.filename) as file_cache:
+                self.restore(json.load(file_cache))
+        except (OSError, ValueError):
+            pass
+
+    def save(self):
+        filename_temporary = self.filename + '.tmp'
+        with open(filename_temporary, 'w') as file_cache:
+            json.dump(self.dump(), file_cache, separators=(',', ':'))
+        os.replace(filename_temporary, self.filename)
@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW history                                                               #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module keeps a bounded history of recent observations in a ring buffer  #
+# of array columns (packed IPs, times, interned country codes and flags) with  #
+# running totals from which windowed aggregates are computed in logarithmic    #
+# time.                                                                        #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+import array
+import threading
+
+from pebcaw import whitelist
+
+SECURE            = 1
+WHITELISTED       = 2
+WHITELISTED_KNOWN = 4
+ERROR             = 8
+IPv6              = 16
+IP_KNOWN          = 32
+
+modulus = 1 << 32
+
+class Observation(object):
+    """
+    View of an observation in a history, valid until the history wraps around
+    over it.
+    """
+
+    __slots__ = ('history', 'position')
+
+    def __init__(self, history=None, position=0):
+        self.history  = history
+        self.position = position
+
+    @property
+    def time(self):
+        return self.history.times[self.position]
+
+    @property
+    def IP(self):
+        flags = self.history.flags[self.position]
+        if not flags & IP_KNOWN:
+            return None
+        if flags & IPv6:
+            return self.history.IPv6_addresses[self.history.IPs[self.position]]
+        return whitelist.integer_to_IP(self.history.IPs[self.position])
+
+    @property
+    def country(self):
+        return self.history.countries_interned[self.history.countries[self.position]]
+
+    @property
+    def secure(self):
+        return bool(self.history.flags[self.position] & SECURE)
+
+    @property
+    def whitelisted(self):
+        flags = self.history.flags[self.position]
+        return bool(flags & WHITELISTED) if flags & WHITELISTED_KNOWN else None
+
+    @property
+    def error(self):
+        return bool(self.history.flags[self.position] & ERROR)
+
+    @property
+    def duration(self):
+        return self.history.duration(self.position)
+
+    def __repr__(self):
+        return 'Observation(time={time!r}, IP={IP!r}, country={country!r}, secure={secure!r})'.format(
+            time    = self.time,
+            IP      = self.IP,
+            country = self.country,
+            secure  = self.secure
+        )
+
+class History(object):
+    """
+    Ring buffer of at most capacity observations, in order of time, stored in
+    preallocated array columns of 35 bytes per observation: the time (double),
+    the IPv4 address as an integer or the index of an interned IPv6 address,
+    the interned country code, flags and the running totals before the
+    observation of duration, insecure observations, errors and IP changes.
+    Appends are O(1) and aggregates over a window of time are O(log n), by
+    bisection of the times and subtraction of the running totals. An IPv6
+    address is interned only while observations of the ring refer to it, so at
+    most capacity are held, and the indices of addresses no longer referred to
+    are reused. Appends and aggregates hold a lock, so aggregates may be taken
+    in other threads (e.g. by a query server) while the monitor appends.
+    """
+
+    def __init__(self, capacity=86400):
+        self.capacity           = capacity
+        self.times              = array.array('d', bytes(8 * capacity))
+        self.IPs                = array.array('I', bytes(4 * capacity))
+        self.countries          = array.array('H', bytes(2 * capacity))
+        self.flags              = array.array('B', bytes(capacity))
+        self.totals_duration    = array.array('d', bytes(8 * capacity))
+        self.totals_insecure    = array.array('I', bytes(4 * capacity))
+        self.totals_errors      = array.array('I', bytes(4 * capacity))
+        self.totals_changes     = array.array('I', bytes(4 * capacity))
+        self.countries_interned = [None]
+        self.country_codes      = {None: 0}
+        self.IPv6_addresses     = []
+        self.IPv6_indices       = {}
+        self.IPv6_references    = []
+        self.IPv6_free          = []
+        self.total_duration     = 0.0
+        self.total_insecure     = 0
+        self.total_errors       = 0
+        self.total_changes      = 0
+        self.IP_last            = None
+        self.head               = 0
+        self.count              = 0
+        self.lock               = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return self.capacity * 35
+
+    def position(self, index):
+        """
+        Return the position in the columns of the index of an observation,
+        oldest first (negative indices count from the newest).
+        """
+        count = self.count
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError('history index out of range')
+        return (self.head - count + index) % self.capacity
+
+    def __getitem__(self, index):
+        return Observation(history=self, position=self.position(index))
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    def intern_country(self, country):
+        code = self.country_codes.get(country)
+        if code is None:
+            if len(self.countries_interned) > 65535:
+                return 0
+            code = self.country_codes[country] = len(self.countries_interned)
+            self.countries_interned.append(country)
+        return code
+
+    def encode_IP(self, IP):
+        if IP is None:
+            return 0, 0
+        try:
+            if ':' in IP:
+                index = self.IPv6_indices.get(IP)
+                if index is None:
+                    if self.IPv6_free:
+                        index = self.IPv6_free.pop()
+                        self.IPv6_addresses[index] = IP
+                    else:
+                        index = len(self.IPv6_addresses)
+                        self.IPv6_addresses.append(IP)
+                        self.IPv6_references.append(0)
+                    self.IPv6_indices[IP] = index
+                self.IPv6_references[index] += 1
+                return index, IP_KNOWN | IPv6
+            return whitelist.IP_to_integer(IP), IP_KNOWN
+        except (OSError, TypeError, ValueError):
+            return 0, 0
+
+    def release_IP(self, position):
+        """
+        Release the interned IPv6 address, if any, of the observation of a
+        position that is to be overwritten.
+        """
+        if self.flags[position] & (IP_KNOWN | IPv6) != IP_KNOWN | IPv6:
+            return
+        index = self.IPs[position]
+        self.IPv6_references[index] -= 1
+        if not self.IPv6_references[index]:
+            del self.IPv6_indices[self.IPv6_addresses[index]]
+            self.IPv6_addresses[index] = None
+            self.IPv6_free.append(index)
+
+    def append(
+        self,
+        time        = None,
+        IP          = None,
+        country     = None,
+        secure      = False,
+        whitelisted = None,
+        error       = False,
+        duration    = 0.0
+        ):
+        with self.lock:
+            if self.count == self.capacity:
+                self.release_IP(self.head)
+            integer, flags = self.encode_IP(IP)
+            flags |= (SECURE if secure else 0) | (ERROR if error else 0)
+            if whitelisted is not None:
+                flags |= WHITELISTED_KNOWN | (WHITELISTED if whitelisted else 0)
+            position = self.head
+            self.times[position]           = time
+            self.IPs[position]             = integer
+            self.countries[position]       = self.intern_country(country)
+            self.flags[position]           = flags
+            self.totals_duration[position] = self.total_duration
+            self.totals_insecure[position] = self.total_insecure
+            self.totals_errors[position]   = self.total_errors
+            self.totals_changes[position]  = self.total_changes
+            self.total_duration += duration or 0.0
+            self.total_insecure  = (self.total_insecure + (not secure)) % modulus
+            self.total_errors    = (self.total_errors + bool(error)) % modulus
+            if flags & IP_KNOWN:
+                IP_key = IP if flags & IPv6 else integer
+                if self.IP_last is not None and IP_key != self.IP_last:
+                    self.total_changes = (self.total_changes + 1) % modulus
+                self.IP_last = IP_key
+            self.head  = (position + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    def append_state(self, state):
+        """
+        Append a classified state of the monitor.
+        """
+        self.append(
+            time        = state.time,
+            IP          = state.IP,
+            country     = state.country,
+            secure      = state.secure,
+            whitelisted = state.whitelisted,
+            error       = state.error is not None,
+            duration    = state.duration
+        )
+
+    def totals(self, index):
+        """
+        Return the running totals before the observation of an index, or after
+        the newest observation if the index is the number of observations.
+        """
+        if index >= self.count:
+            return self.total_duration, self.total_insecure, self.total_errors, self.total_changes
+        position = self.position(index)
+        return (
+            self.totals_duration[position],
+            self.totals_insecure[position],
+            self.totals_errors[position],
+            self.totals_changes[position]
+        )
+
+    def duration(self, position):
+        following = (position + 1) % self.capacity
+        if following == self.head:
+            return self.total_duration - self.totals_duration[position]
+        return self.totals_duration[following] - self.totals_duration[position]
+
+    def bisect(self, time_observation, right=False):
+        """
+        Return the index of the first observation at or (if right) after a
+        time.
+        """
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            time_middle = self.times[(self.head - self.count + middle) % self.capacity]
+            if time_middle < time_observation or (right and time_middle == time_observation):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def aggregates(self, seconds=None, time_end=None):
+        """
+        Return the aggregates of the observations of a window of seconds up to
+        a time (by default the newest observation), or of all observations if
+        no window is specified.
+        """
+        with self.lock:
+            count = self.count
+            if not count:
+                return {'observations': 0}
+            if time_end is None:
+                time_end = self.times[(self.head - 1) % self.capacity]
+            start  = 0 if seconds is None else self.bisect(time_end - seconds)
+            end    = self.bisect(time_end, right=True)
+            number = end - start
+            if number <= 0:
+                return {'observations': 0}
+            duration_start, insecure_start, errors_start, changes_start = self.totals(start)
+            duration_end,   insecure_end,   errors_end,   changes_end   = self.totals(end)
+            changes_first = self.totals(start + 1)[3]
+            insecure      = (insecure_end - insecure_start) % modulus
+            return {
+                'observations':  number,
+                'time_start':    self.times[self.position(start)],
+                'time_end':      self.times[self.position(end - 1)],
+                'secure':        1 - insecure / number,
+                'insecure':      insecure,
+                'errors':        (errors_end - errors_start) % modulus,
+                'IP_changes':    (changes_end - changes_first) % modulus,
+                'duration_mean': (duration_end - duration_start) / number
+            }
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW load test                                                             #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This program drives the PEBCAW monitor loop at high frequency against a      #
+# local fake IP details provider and reports throughput, latency percentiles   #
+# and resource usage.                                                          #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+
+usage:
+    program [options] [-- <argument>...]
+
+options:
+    -h, --help         display help message
+    --duration=FLOAT   duration of load test (s) [default: 10]
+    --script=FILE      JSON lines of fake provider response steps
+    --output=FILE      file to which to save results as JSON
+
+Arguments after -- are passed to the monitor (e.g. -- --countries_whitelist=CH).
+"""
+
+import docopt
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from pebcaw import fake_provider
+from pebcaw import metrics
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def parse_exposition(text):
+    """
+    Return the samples of Prometheus exposition text by name.
+    """
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+def histogram_quantile(samples, name, fraction):
+    """
+    Return a quantile of a histogram estimated by linear interpolation within
+    its buckets, as Prometheus does.
+    """
+    buckets = []
+    for key, value in samples.items():
+        if key.startswith(name + '_bucket{le="'):
+            bound = key[len(name + '_bucket{le="'):-2]
+            buckets.append((float(bound), value))
+    buckets.sort()
+    if not buckets or not buckets[-1][1]:
+        return None
+    rank = fraction * buckets[-1][1]
+    bound_lower, count_lower = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if bound == float('inf'):
+                return bound_lower
+            return bound_lower + (bound - bound_lower) * (rank - count_lower) / max(count - count_lower, 1e-12)
+        bound_lower, count_lower = bound, count
+    return bound_lower
+
+def CPU_time(pid):
+    with open('/proc/{pid}/stat'.format(pid=pid)) as file_stat:
+        fields = file_stat.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+def run(
+    duration  = 10,
+    script    = None,
+    arguments = ()
+    ):
+    """
+    Run the monitor with a zero interval against a fake provider for a duration
+    and return the results.
+    """
+    server  = fake_provider.serve(script=script)
+    address = os.path.join(tempfile.mkdtemp(prefix='pebcaw_'), 'metrics.sock')
+    process = subprocess.Popen(
+        [
+            sys.executable, '-c', 'import pebcaw; pebcaw.main()',
+            '--interval=0',
+            '--provider=' + server.URL(),
+            '--metrics=' + address
+        ] + list(arguments),
+        stdout = subprocess.DEVNULL
+    )
+    try:
+        while not os.path.exists(address) and process.poll() is None:
+            time.sleep(0.01)
+        time_start  = time.monotonic()
+        CPU_start   = CPU_time(process.pid)
+        count_start = len(server.arrivals)
+        time.sleep(duration)
+        samples     = parse_exposition(metrics.scrape(address))
+        CPU_stop    = CPU_time(process.pid)
+        time_stop   = time.monotonic()
+    finally:
+        process.terminate()
+        process.wait()
+        server.shutdown()
+    arrivals = [
+        arrival for arrival in list(server.arrivals)[count_start:]
+        if time_start <= arrival <= time_stop
+    ]
+    cycles   = [second - first for first, second in zip(arrivals, arrivals[1:])]
+    elapsed  = time_stop - time_start
+    results  = {
+        'duration':               elapsed,
+        'observations':           len(arrivals),
+        'observations_per_second': len(arrivals) / elapsed,
+        'cycle_p50':              percentile(cycles, 0.50),
+        'cycle_p90':              percentile(cycles, 0.90),
+        'cycle_p99':              percentile(cycles, 0.99),
+        'cycle_max':              max(cycles) if cycles else None,
+        'CPU_fraction':           (CPU_stop - CPU_start) / elapsed,
+        'RSS_bytes':              samples.get('pebcaw_resident_memory_bytes'),
+        'provider_errors':        samples.get('pebcaw_provider_errors_total'),
+        'notifications':          samples.get('pebcaw_notifications_sent_total', 0) +
+                                  samples.get('pebcaw_notifications_suppressed_total', 0)
+    }
+    for stage in ('fetch', 'parse', 'whitelist', 'notify'):
+        name = 'pebcaw_{stage}_duration_seconds'.format(stage=stage)
+        for fraction in (0.5, 0.99):
+            results['{stage}_p{percentile}'.format(
+                stage      = stage,
+                percentile = int(100 * fraction)
+            )] = histogram_quantile(samples, name, fraction)
+    return results
+
+def report(results):
+    lines = []
+    for key, value in results.items():
+        if isinstance(value, float):
+            value = '{:.6g}'.format(value)
+        lines.append('{:<24} {}'.format(key + ':', value))
+    return '\n'.join(lines)
+
+def main():
+    options = docopt.docopt(__doc__)
+    results = run(
+        duration  = float(options['--duration']),
+        script    = fake_provider.Script.load(options['--script']) if options['--script'] else None,
+        arguments = options['<argument>']
+    )
+    print(report(results))
+    if options['--output']:
+        with open(options['--output'], 'w') as file_output:
+            json.dump(results, file_output, indent=4)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,435 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW metrics                                                               #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module provides counters, gauges and histograms for monitoring PEBCAW   #
+# and serves them in the Prometheus text exposition format over HTTP on a      #
+# local port or Unix socket.                                                   #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+import bisect
+import http.server
+import os
+import socket
+import socketserver
+import threading
+import time
+
+buckets_default = (
+    0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5, 5.0, 10.0
+)
+
+class Counter(object):
+
+    type = 'counter'
+
+    def __init__(
+        self,
+        name = None,
+        help = ''
+        ):
+        self.name  = name
+        self.help  = help
+        self.value = 0
+
+    def inc(self, value=1):
+        self.value += value
+
+    def samples(self):
+        yield self.name, self.value
+
+class Gauge(object):
+
+    type = 'gauge'
+
+    def __init__(
+        self,
+        name     = None,
+        help     = '',
+        function = None
+        ):
+        self.name     = name
+        self.help     = help
+        self.value    = 0
+        self.function = function
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        if self.function:
+            try:
+                self.value = self.function()
+            except:
+                pass
+        yield self.name, self.value
+
+class Histogram(object):
+
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name    = None,
+        help    = '',
+        buckets = buckets_default
+        ):
+        self.name    = name
+        self.help    = help
+        self.buckets = tuple(sorted(buckets))
+        self.counts  = [0] * (len(self.buckets) + 1)
+        self.sum     = 0.0
+        self.count   = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum   += value
+        self.count += 1
+
+    def time(self):
+        return Timer(self)
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield self.name + '_bucket{le="' + repr(bound) + '"}', cumulative
+        yield self.name + '_bucket{le="+Inf"}', self.count
+        yield self.name + '_sum',               self.sum
+        yield self.name + '_count',             self.count
+
+class Labelled(object):
+    """
+    Metric of a value per value of a label (e.g. per egress target), of the
+    type of a gauge or a counter.
+    """
+
+    def __init__(
+        self,
+        name  = None,
+        help  = '',
+        type  = 'gauge',
+        label = None
+        ):
+        self.name   = name
+        self.help   = help
+        self.type   = type
+        self.label  = label
+        self.values = {}
+
+    def set(self, label_value, value):
+        self.values[label_value] = value
+
+    def inc(self, label_value, value=1):
+        self.values[label_value] = self.values.get(label_value, 0) + value
+
+    def samples(self):
+        for label_value, value in sorted(self.values.items()):
+            yield '{name}{{{label}="{value}"}}'.format(
+                name  = self.name,
+                label = self.label,
+                value = str(label_value).replace('\\', '\\\\').replace('"', '\\"')
+            ), value
+
+class Timer(object):
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.duration = time.perf_counter() - self.start
+        self.histogram.observe(self.duration)
+        return False
+
+class Registry(object):
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help=''):
+        return self.register(Counter(name=name, help=help))
+
+    def gauge(self, name, help='', function=None):
+        return self.register(Gauge(name=name, help=help, function=function))
+
+    def histogram(self, name, help='', buckets=buckets_default):
+        return self.register(Histogram(name=name, help=help, buckets=buckets))
+
+    def labelled(self, name, help='', type='gauge', label=None):
+        return self.register(Labelled(name=name, help=help, type=type, label=label))
+
+    def exposition(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append('# HELP ' + metric.name + ' ' + metric.help)
+            lines.append('# TYPE ' + metric.name + ' ' + metric.type)
+            for name, value in metric.samples():
+                lines.append(name + ' ' + repr(value))
+        return '\n'.join(lines) + '\n'
+
+def RSS():
+    """
+    Return the resident set size of this process in bytes.
+    """
+    with open('/proc/self/statm') as file_statm:
+        return int(file_statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+def wakeups_per_hour():
+    """
+    Return the wakeups of the monitor loop per hour since start.
+    """
+    hours = (time.monotonic() - time_start) / 3600
+    return wakeups.value / hours if hours else 0.0
+
+time_start = time.monotonic()
+registry   = Registry()
+
+observations             = registry.counter(
+    'pebcaw_observations_total',
+    'IP observations made'
+)
+provider_errors          = registry.counter(
+    'pebcaw_provider_errors_total',
+    'IP observations failed'
+)
+provider_requests        = registry.counter(
+    'pebcaw_provider_requests_total',
+    'HTTP requests to the IP details provider'
+)
+provider_bytes           = registry.counter(
+    'pebcaw_provider_bytes_total',
+    'bytes received from the IP details provider'
+)
+geo_cache_hits           = registry.counter(
+    'pebcaw_geo_cache_hits_total',
+    'IP details served from the cache'
+)
+geo_cache_misses         = registry.counter(
+    'pebcaw_geo_cache_misses_total',
+    'IP details fetched from the provider'
+)
+notifications_sent       = registry.counter(
+    'pebcaw_notifications_sent_total',
+    'notifications dispatched'
+)
+notifications_suppressed = registry.counter(
+    'pebcaw_notifications_suppressed_total',
+    'notifications not dispatched'
+)
+actions                  = registry.counter(
+    'pebcaw_actions_total',
+    'actions completed'
+)
+action_errors            = registry.counter(
+    'pebcaw_action_errors_total',
+    'actions failed'
+)
+sink_errors              = registry.counter(
+    'pebcaw_sink_errors_total',
+    'sinks failed'
+)
+target_secure            = registry.labelled(
+    'pebcaw_target_secure',
+    'whether the egress target is secure (1) or not (0)',
+    label = 'target'
+)
+target_duration          = registry.labelled(
+    'pebcaw_target_observation_duration_seconds',
+    'duration of the latest observation of the egress target',
+    label = 'target'
+)
+target_errors            = registry.labelled(
+    'pebcaw_target_errors_total',
+    'failed observations of the egress target',
+    type  = 'counter',
+    label = 'target'
+)
+restarts                 = registry.counter(
+    'pebcaw_restarts_total',
+    'regular restarts engaged'
+)
+wakeups                  = registry.counter(
+    'pebcaw_wakeups_total',
+    'wakeups of the monitor loop'
+)
+secure                   = registry.gauge(
+    'pebcaw_secure',
+    'current state (1 secure, 0 insecure)'
+)
+interval                 = registry.gauge(
+    'pebcaw_interval_seconds',
+    'observation interval'
+)
+RSS_bytes                = registry.gauge(
+    'pebcaw_resident_memory_bytes',
+    'resident set size',
+    function = RSS
+)
+wakeups_hourly           = registry.gauge(
+    'pebcaw_wakeups_per_hour',
+    'wakeups of the monitor loop per hour',
+    function = wakeups_per_hour
+)
+duration_fetch           = registry.histogram(
+    'pebcaw_fetch_duration_seconds',
+    'HTTP fetch of IP details'
+)
+duration_parse           = registry.histogram(
+    'pebcaw_parse_duration_seconds',
+    'JSON parse of IP details'
+)
+duration_whitelist       = registry.histogram(
+    'pebcaw_whitelist_duration_seconds',
+    'whitelist lookup'
+)
+duration_notify          = registry.histogram(
+    'pebcaw_notify_duration_seconds',
+    'notification dispatch'
+)
+duration_action          = registry.histogram(
+    'pebcaw_action_latency_seconds',
+    'detection-to-completion latency of actions'
+)
+
+restarts.inc(int(os.environ.get('PEBCAW_RESTARTS', 0)))
+
+class Handler(http.server.BaseHTTPRequestHandler):
+
+    registry = registry
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.registry.exposition().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        return str(self.client_address)
+
+    def log_message(self, *args):
+        pass
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+    def get_request(self):
+        request, client_address = super().get_request()
+        return request, ['local', 0]
+
+def server(address=None, registry=registry):
+    """
+    Return an HTTP server for the metrics of a registry. The address is either
+    host:port or a Unix socket path (any address containing a slash).
+    """
+    handler = type('Handler', (Handler,), {'registry': registry})
+    if '/' in address:
+        if os.path.exists(address):
+            os.remove(address)
+        return UnixHTTPServer(address, handler)
+    host, port = address.rsplit(':', 1)
+    return http.server.ThreadingHTTPServer((host or '127.0.0.1', int(port)), handler)
+
+def serve(address=None, registry=registry):
+    """
+    Serve the metrics of a registry in a background thread and return the
+    server. The thread blocks until a request arrives, so it does not wake
+    while idle; stop it with shutdown.
+    """
+    _server = server(address=address, registry=registry)
+    thread  = threading.Thread(
+        target = lambda: _server.serve_forever(poll_interval=None),
+        daemon = True
+    )
+    thread.start()
+    return _server
+
+def shutdown(server, timeout=5):
+    """
+    Stop a server started by serve and close its socket. The thread of the
+    server blocks without a timeout, so it is woken by connecting to it until
+    the shutdown completes.
+    """
+    thread = threading.Thread(target=server.shutdown, daemon=True)
+    thread.start()
+    time_stop = time.monotonic() + timeout
+    while thread.is_alive() and time.monotonic() < time_stop:
+        if isinstance(server.server_address, str):
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            connection = socket.socket(server.address_family, socket.SOCK_STREAM)
+        try:
+            connection.settimeout(timeout)
+            connection.connect(server.server_address)
+        except OSError:
+            pass
+        finally:
+            connection.close()
+        thread.join(0.05)
+    server.server_close()
+
+def scrape(address=None, timeout=5):
+    """
+    Return the metrics text served at an address.
+    """
+    if '/' in address:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(timeout)
+        connection.connect(address)
+        host = 'localhost'
+    else:
+        host, port = address.rsplit(':', 1)
+        connection = socket.create_connection((host or '127.0.0.1', int(port)), timeout=timeout)
+    with connection:
+        request = 'GET /metrics HTTP/1.0\r\nHost: ' + host + '\r\n\r\n'
+        connection.sendall(request.encode('ascii'))
+        response = b''
+        while True:
+            data = connection.recv(65536)
+            if not data:
+                break
+            response += data
+    header, body = response.split(b'\r\n\r\n', 1)
+    return body.decode('utf-8')
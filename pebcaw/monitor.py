@@ -0,0 +1,755 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW monitor                                                               #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module provides the Monitor library API: a monitor of internet          #
+# connection security with pluggable providers of IP details, policies that    #
+# classify them and sinks that act on the classified state, stepped one        #
+# observation at a time or iterated over state changes.                        #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+import concurrent.futures
+import socket
+import sys
+import textwrap
+import time
+
+from pebcaw import client as pebcaw_client
+from pebcaw import geo
+from pebcaw import metrics
+from pebcaw import targets
+
+def mark_null(stage):
+    pass
+
+def begin_null():
+    pass
+
+def engage_sink(sink=None, state=None):
+    """
+    Pass a state to a sink. An exception of the sink is reported and counted
+    rather than raised, so that one failing sink does not stop the others.
+    """
+    try:
+        sink(state)
+    except Exception as exception:
+        metrics.sink_errors.inc()
+        print('error in sink {sink}: {exception!r}'.format(
+            sink      = getattr(sink, '__name__', type(sink).__name__),
+            exception = exception
+        ), file=sys.stderr)
+
+class ProviderError(Exception):
+    pass
+
+class State(object):
+    """
+    Classified observation of the IP details. The time of detection is the
+    monotonic time at which the observation was classified; it is not
+    meaningful across processes, so it is not kept in dictionaries.
+    """
+
+    __slots__ = ('time', 'data', 'secure', 'whitelisted', 'warnings', 'error', 'duration', 'time_detection')
+
+    def __init__(
+        self,
+        time           = None,
+        data           = None,
+        secure         = False,
+        whitelisted    = None,
+        warnings       = (),
+        error          = None,
+        duration       = None,
+        time_detection = None
+        ):
+        self.time           = time
+        self.data           = data or {}
+        self.secure         = secure
+        self.whitelisted    = whitelisted
+        self.warnings       = warnings
+        self.error          = error
+        self.duration       = duration
+        self.time_detection = time_detection
+
+    @property
+    def IP(self):
+        return self.data.get('ip')
+
+    @property
+    def country(self):
+        return self.data.get('country')
+
+    def key(self):
+        return self.secure, self.IP
+
+    def dictionary(self):
+        return {
+            'time':        self.time,
+            'data':        self.data,
+            'secure':      self.secure,
+            'whitelisted': self.whitelisted,
+            'warnings':    list(self.warnings),
+            'error':       None if self.error is None else str(self.error) or type(self.error).__name__,
+            'duration':    self.duration
+        }
+
+    @classmethod
+    def from_dictionary(cls, dictionary=None):
+        """
+        Return the state of a dictionary, of which the error, if any, is
+        restored as a provider error.
+        """
+        error = dictionary.get('error')
+        return cls(
+            time        = dictionary.get('time'),
+            data        = dictionary.get('data'),
+            secure      = dictionary.get('secure', False),
+            whitelisted = dictionary.get('whitelisted'),
+            warnings    = dictionary.get('warnings', ()),
+            error       = None if error is None else ProviderError(error),
+            duration    = dictionary.get('duration')
+        )
+
+    def __repr__(self):
+        return 'State(IP={IP!r}, country={country!r}, secure={secure!r})'.format(
+            IP      = self.IP,
+            country = self.country,
+            secure  = self.secure
+        )
+
+class HTTPProvider(object):
+    """
+    Provider of IP details from a JSON HTTP API such as ipinfo.io, by way of
+    an HTTP client with a persistent connection (by default the built-in
+    client).
+    """
+
+    def __init__(
+        self,
+        URL     = 'https://ipinfo.io/json',
+        timeout = 10,
+        client  = None
+        ):
+        self.URL     = URL
+        self.timeout = timeout
+        self.client  = client or pebcaw_client.Client(timeout=timeout)
+
+    def __call__(self, mark=mark_null):
+        with metrics.duration_fetch.time():
+            response = self.client.get(self.URL, timeout=self.timeout)
+        metrics.provider_requests.inc()
+        metrics.provider_bytes.inc(len(response.content))
+        response.raise_for_status()
+        mark('fetch')
+        with metrics.duration_parse.time():
+            data = response.json()
+        mark('decode')
+        return data
+
+class CachedProvider(object):
+    """
+    Provider of IP details that each observation fetches only the current IP
+    from a plain text probe (e.g. https://ipinfo.io/ip) and fetches the details
+    of the IP from the provider only if they are not in the cache, which is
+    the case only when the IP changes or its details expire.
+    """
+
+    def __init__(
+        self,
+        URL_IP  = 'https://ipinfo.io/ip',
+        URL     = 'https://ipinfo.io/json',
+        cache   = None,
+        timeout = 10,
+        client  = None
+        ):
+        self.URL_IP  = URL_IP
+        self.URL     = URL
+        self.cache   = cache if cache is not None else geo.Cache()
+        self.timeout = timeout
+        self.client  = client or pebcaw_client.Client(timeout=timeout)
+
+    def get(self, URL):
+        response = self.client.get(URL, timeout=self.timeout)
+        metrics.provider_requests.inc()
+        metrics.provider_bytes.inc(len(response.content))
+        response.raise_for_status()
+        return response
+
+    def __call__(self, mark=mark_null):
+        with metrics.duration_fetch.time():
+            IP = self.get(self.URL_IP).text.strip()
+            socket.inet_pton(socket.AF_INET6 if ':' in IP else socket.AF_INET, IP)
+            data = self.cache.get(IP)
+            if data is None:
+                metrics.geo_cache_misses.inc()
+                response = self.get(geo.URL_details(URL=self.URL, IP=IP))
+            else:
+                metrics.geo_cache_hits.inc()
+        mark('fetch')
+        if data is None:
+            with metrics.duration_parse.time():
+                data = dict(response.json(), ip=IP)
+            self.cache.put(IP, data)
+        mark('decode')
+        return data
+
+class DualStackProvider(object):
+    """
+    Provider of IP details observed concurrently over IPv4 only and over IPv6
+    only, on sockets of each family, so that the observation takes as long as
+    the slower family rather than both. The details of the IPv4 observation are
+    returned with those of the IPv6 observation under the key IPv6 (None if
+    there is no IPv6 connectivity). If only IPv6 has connectivity, its details
+    are returned. A family is taken to be without connectivity only for errors
+    of no route or address; any other error of the IPv4 observation is raised
+    and that of the IPv6 observation is returned under the key IPv6_error, so
+    that a family that fails to be observed is not taken to be secure.
+    """
+
+    def __init__(
+        self,
+        URL      = 'https://ipinfo.io/json',
+        timeout  = 10,
+        context  = None,
+        resolver = None
+        ):
+        self.URL      = URL
+        self.timeout  = timeout
+        self.context  = context
+        self.resolver = resolver
+        if context is None and URL.startswith('https:'):
+            self.context = pebcaw_client.context()
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers        = 2,
+            thread_name_prefix = 'pebcaw_family'
+        )
+
+    def __call__(self, mark=mark_null):
+        with metrics.duration_fetch.time():
+            futures = [
+                self.executor.submit(
+                    targets.observe,
+                    URL      = self.URL,
+                    timeout  = self.timeout,
+                    family   = family,
+                    context  = self.context,
+                    resolver = self.resolver
+                )
+                for family in (socket.AF_INET, socket.AF_INET6)
+            ]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as exception:
+                    results.append(exception)
+        mark('fetch')
+        mark('decode')
+        data_IPv4, data_IPv6 = results
+        if isinstance(data_IPv4, Exception):
+            if isinstance(data_IPv6, Exception) or not targets.is_unreachable(data_IPv4):
+                raise data_IPv4
+            return data_IPv6
+        data_IPv4 = dict(data_IPv4)
+        if isinstance(data_IPv6, Exception):
+            data_IPv4['IPv6'] = None
+            if not targets.is_unreachable(data_IPv6):
+                data_IPv4['IPv6_error'] = str(data_IPv6) or type(data_IPv6).__name__
+        else:
+            data_IPv4['IPv6'] = data_IPv6
+        return data_IPv4
+
+class ObservationProvider(object):
+    """
+    Provider of the IP details of an observation made elsewhere, e.g. by a
+    scheduler of egress targets that observes all targets concurrently, set
+    with the duration of the observation before each step of the monitor,
+    which is passed the start of the observation. The exception of a failed
+    observation is raised.
+    """
+
+    def __init__(self, clock=time):
+        self.clock      = clock
+        self.data       = None
+        self.exception  = None
+        self.time_start = None
+
+    def set(self, data=None, exception=None, duration=0):
+        self.data       = data
+        self.exception  = exception
+        self.time_start = self.clock.monotonic() - duration
+
+    def __call__(self, mark=mark_null):
+        if self.exception is not None:
+            raise self.exception
+        mark('fetch')
+        mark('decode')
+        return self.data
+
+class DualStackPolicy(object):
+    """
+    Policy that both the IPv4 and, where observed, the IPv6 details satisfy a
+    policy, which classifies each against the index of its family. An IPv6
+    observation that failed, rather than for lack of IPv6 connectivity, is
+    insecure (fail closed).
+    """
+
+    def __init__(self, policy=None):
+        self.policy = policy
+
+    def __call__(self, data):
+        secure, whitelisted, warnings = self.policy(data)
+        if data.get('IPv6_error'):
+            return False, whitelisted, warnings + [{
+                'text':    'WARNING: error observing IPv6, unable to identify as secure',
+                'subtext': data['IPv6_error']
+            }]
+        data_IPv6 = data.get('IPv6')
+        if not data_IPv6:
+            return secure, whitelisted, warnings
+        secure_IPv6, whitelisted_IPv6, warnings_IPv6 = self.policy(data_IPv6)
+        for warning in warnings_IPv6:
+            warning['text'] = warning['text'] + ' (IPv6 leak)'
+        if whitelisted is not None:
+            whitelisted = whitelisted and whitelisted_IPv6
+        return secure and secure_IPv6, whitelisted, warnings + warnings_IPv6
+
+class DNSLeakPolicy(object):
+    """
+    Policy that the IP details satisfy a policy and that the cached DNS leak
+    check finds no nameserver routed outside the VPN.
+    """
+
+    def __init__(self, policy=None, check=None):
+        self.policy = policy
+        self.check  = check
+
+    def __call__(self, data):
+        secure, whitelisted, warnings = self.policy(data)
+        leaks = self.check.leaks()
+        if leaks:
+            secure   = False
+            warnings = warnings + [{
+                'text':    'WARNING: DNS leak',
+                'subtext': ', '.join(
+                    'nameserver {nameserver} via {interface}'.format(
+                        nameserver = leak['nameserver'],
+                        interface  = leak['interface'] or 'no route'
+                    ) for leak in leaks
+                )
+            }]
+        return secure, whitelisted, warnings
+
+class ConnectionLeakPolicy(object):
+    """
+    Policy that the IP details satisfy a policy and that the incremental
+    egress check finds no connected socket routed outside the VPN.
+    """
+
+    def __init__(self, policy=None, check=None, shown=5):
+        self.policy = policy
+        self.check  = check
+        self.shown  = shown
+
+    def __call__(self, data):
+        secure, whitelisted, warnings = self.policy(data)
+        leaks = self.check.scan()
+        if leaks:
+            secure   = False
+            subtext  = ', '.join(
+                '{protocol} {remote} via {interface}'.format(
+                    protocol  = leak['protocol'],
+                    remote    = leak['remote'],
+                    interface = leak['interface'] or 'no route'
+                ) for leak in leaks[:self.shown]
+            )
+            if len(leaks) > self.shown:
+                subtext += ' and {number} more'.format(number=len(leaks) - self.shown)
+            warnings = warnings + [{
+                'text':    'WARNING: connections outside VPN',
+                'subtext': subtext
+            }]
+        return secure, whitelisted, warnings
+
+class WhitelistPolicy(object):
+    """
+    Policy that the IP is in a whitelist index or, if an ASN table is
+    specified, that the IP is in a whitelisted ASN, optionally warning if it is
+    in a SIGINT country. If a clock is specified, the index is a versioned
+    index queried at the time of the clock.
+    """
+
+    def __init__(
+        self,
+        index               = None,
+        countries_SIGINT    = (),
+        warn_SIGINT_country = False,
+        ASN_table           = None,
+        ASNs_whitelist      = (),
+        clock               = None
+        ):
+        self.index               = index
+        self.countries_SIGINT    = countries_SIGINT
+        self.warn_SIGINT_country = warn_SIGINT_country
+        self.ASN_table           = ASN_table
+        self.ASNs_whitelist      = frozenset(ASNs_whitelist)
+        self.clock               = clock
+
+    def __call__(self, data):
+        IP       = data.get('ip')
+        warnings = []
+        subtext  = 'IP: ' + str(IP)
+        with metrics.duration_whitelist.time():
+            if self.clock is None:
+                whitelisted = IP in self.index
+            else:
+                whitelisted = self.index.is_whitelisted(IP, at=self.clock.time())
+            if not whitelisted and self.ASN_table and IP:
+                result = self.ASN_table.lookup(IP)
+                if result:
+                    ASN, organisation, country = result
+                    whitelisted = ASN in self.ASNs_whitelist
+                    subtext     = subtext + ' AS{ASN} {organisation}'.format(
+                        ASN          = ASN,
+                        organisation = organisation
+                    )
+        if not whitelisted:
+            warnings.append({
+                'text':    'WARNING: IP not identified as AirVPN or Tor',
+                'subtext': subtext
+            })
+        if self.warn_SIGINT_country and data.get('country') in self.countries_SIGINT:
+            warnings.append({
+                'text':    'WARNING: IP in SIGINT country',
+                'subtext': 'IP: ' + str(IP)
+            })
+        return whitelisted, whitelisted, warnings
+
+class CountriesPolicy(object):
+    """
+    Policy that the country of the IP is in a whitelist of countries.
+    """
+
+    def __init__(self, countries_whitelist=None):
+        self.countries_whitelist = countries_whitelist
+
+    def __call__(self, data):
+        country = data.get('country')
+        if country in self.countries_whitelist:
+            return True, None, []
+        return False, None, [{
+            'text': f'WARNING: country {country} not in whitelist {self.countries_whitelist}'
+        }]
+
+class Monitor(object):
+    """
+    Monitor of internet connection security. Each step makes one observation
+    with the provider, classifies it with the policy and passes the state to
+    each sink (a callable taking the state, optionally with a stage attribute
+    naming the timing stage it ends) in order. A sink that fails is counted
+    and reported without affecting the other sinks. Steps do not sleep;
+    iterating over the monitor (synchronously or asynchronously) steps at the
+    interval and yields the states that differ in security or IP from the
+    previous state.
+    """
+
+    def __init__(
+        self,
+        provider = None,
+        policy   = None,
+        sinks    = (),
+        interval = 300,
+        clock    = time,
+        begin    = begin_null,
+        mark     = mark_null
+        ):
+        self.provider = provider or HTTPProvider()
+        self.policy   = policy
+        self.sinks    = list(sinks)
+        self.interval = interval
+        self.clock    = clock
+        self.begin    = begin
+        self.mark     = mark
+        self.state    = None
+        self.changed  = False
+
+    def step(self, time_start=None):
+        """
+        Make one observation, classify it, pass it to the sinks and return the
+        state. The duration of the state is from the start of the step or, if
+        specified, from the monotonic time at which the observation started
+        (e.g. an observation made elsewhere before the step).
+        """
+        self.begin()
+        if time_start is None:
+            time_start = self.clock.monotonic()
+        try:
+            data = self.provider(mark=self.mark)
+            metrics.observations.inc()
+            secure, whitelisted, warnings = self.policy(data)
+            time_detection = self.clock.monotonic()
+            state = State(
+                time           = self.clock.time(),
+                data           = data,
+                secure         = secure,
+                whitelisted    = whitelisted,
+                warnings       = warnings,
+                duration       = time_detection - time_start,
+                time_detection = time_detection
+            )
+        except Exception as exception:
+            metrics.provider_errors.inc()
+            time_detection = self.clock.monotonic()
+            state = State(
+                time           = self.clock.time(),
+                warnings       = [{'text': 'WARNING: error observing IP, unable to identify as secure'}],
+                error          = exception,
+                duration       = time_detection - time_start,
+                time_detection = time_detection
+            )
+        metrics.secure.set(int(state.secure))
+        self.mark('classify')
+        self.changed = self.state is None or self.state.key() != state.key()
+        self.state   = state
+        for sink in self.sinks:
+            engage_sink(sink=sink, state=state)
+            stage = getattr(sink, 'stage', None)
+            if stage:
+                self.mark(stage)
+        return state
+
+    def __iter__(self):
+        while True:
+            state = self.step()
+            if self.changed:
+                yield state
+            self.clock.sleep(self.interval)
+            self.mark('sleep')
+
+    async def __aiter__(self):
+        import asyncio
+        while True:
+            state = await asyncio.get_running_loop().run_in_executor(None, self.step)
+            if self.changed:
+                yield state
+            await asyncio.sleep(self.interval)
+            self.mark('sleep')
+
+    def run(self):
+        for state in self:
+            pass
+
+class Notifier(object):
+    """
+    Sink that notifies the warnings of each state.
+    """
+
+    stage = 'notify'
+
+    def __init__(self, notify=None, target=None):
+        self.notify = notify
+        self.target = target
+
+    def __call__(self, state):
+        for warning in state.warnings:
+            if self.target is not None:
+                warning = dict(warning, text=warning['text'] + ' ({target})'.format(target=self.target))
+            self.notify(**warning)
+
+class Display(object):
+    """
+    Sink that displays the IP details of each state.
+    """
+
+    stage = 'display'
+
+    def __call__(self, state):
+        if state.error is not None:
+            return
+        text = textwrap.dedent(
+            """
+            IP:           {IP}
+            organisation: {organisation}
+            coordinates:  {coordinates}
+            city:         {city}
+            country:      {country}
+            region:       {region}
+            """.format(
+                IP           = state.data.get('ip')      or 'unknown',
+                organisation = state.data.get('org')     or 'unknown',
+                coordinates  = state.data.get('loc')     or 'unknown',
+                city         = state.data.get('city')    or 'unknown',
+                country      = state.data.get('country') or 'unknown',
+                region       = state.data.get('region')  or 'unknown'
+            )
+        )
+        print(chr(27) + '[2J')
+        print(text)
+
+class ActionsSink(object):
+    """
+    Sink that engages an action pipeline on the security of each state, timed
+    from the detection of the state.
+    """
+
+    def __init__(self, pipeline=None):
+        self.pipeline = pipeline
+
+    def __call__(self, state):
+        time_detection = state.time_detection
+        self.pipeline.update(
+            secure         = state.secure,
+            time_detection = time.monotonic() if time_detection is None else time_detection
+        )
+
+class QuerySink(object):
+    """
+    Sink that updates the state served by a query server.
+    """
+
+    def __init__(self, server=None):
+        self.server = server
+
+    def __call__(self, state):
+        self.server.update(
+            IP               = state.IP,
+            country          = state.country,
+            whitelisted      = state.whitelisted,
+            secure           = state.secure,
+            time_observation = state.time
+        )
+
+class RecorderSink(object):
+    """
+    Sink that records each observation to a trace.
+    """
+
+    def __init__(self, recorder=None):
+        self.recorder = recorder
+
+    def __call__(self, state):
+        if state.error is not None:
+            self.recorder.record(error=state.error, time_observation=state.time)
+        else:
+            self.recorder.record(
+                data             = state.data,
+                duration         = state.duration,
+                time_observation = state.time
+            )
+
+class HistorySink(object):
+    """
+    Sink that appends each state to a history of observations.
+    """
+
+    def __init__(self, history=None):
+        self.history = history
+
+    def __call__(self, state):
+        self.history.append_state(state)
+
+class RollupSink(object):
+    """
+    Sink that consolidates each state into a round-robin file of statistics.
+    """
+
+    def __init__(self, rollup=None):
+        self.rollup = rollup
+
+    def __call__(self, state):
+        self.rollup.update_state(state)
+
+class TargetSink(object):
+    """
+    Sink that reports each state of the monitor of an egress target: a line of
+    its security and IP and the metrics of the target.
+    """
+
+    stage = 'display'
+
+    def __init__(self, target=None):
+        self.target = str(target)
+
+    def __call__(self, state):
+        metrics.target_secure.set(self.target, int(state.secure))
+        if state.error is not None:
+            metrics.target_errors.inc(self.target)
+            text = 'error observing IP: {error}'.format(error=state.error)
+        else:
+            metrics.target_duration.set(self.target, state.duration)
+            text = 'IP: {IP} country: {country}'.format(IP=state.IP, country=state.country)
+        print('{target:<32} {state:<8} {text}'.format(
+            target = self.target,
+            state  = 'secure' if state.secure else 'insecure',
+            text   = text
+        ))
+
+class Combiner(object):
+    """
+    Combination of the states of the monitors of several egress targets,
+    passed to sinks shared by the targets (e.g. actions, query server and
+    checkpoint). The combined state is secure only if the latest state of
+    every target is secure. Otherwise it is that of the first insecure target,
+    so that shared actions are engaged while any target is insecure and
+    recovered only when all are secure (fail closed). Nothing is passed until
+    every target has been observed. The sink of each target is returned by
+    sink.
+    """
+
+    def __init__(self, targets=None, sinks=()):
+        self.targets = list(targets)
+        self.sinks   = list(sinks)
+        self.states  = {}
+        self.state   = None
+
+    def sink(self, target):
+        def sink_target(state):
+            self.update(target=target, state=state)
+        return sink_target
+
+    def update(self, target=None, state=None):
+        self.states[target] = state
+        if len(self.states) < len(self.targets):
+            return
+        insecure = [self.states[_target] for _target in self.targets if not self.states[_target].secure]
+        chosen   = insecure[0] if insecure else state
+        self.state = State(
+            time           = state.time,
+            data           = chosen.data,
+            secure         = not insecure,
+            whitelisted    = chosen.whitelisted,
+            error          = chosen.error,
+            duration       = state.duration,
+            time_detection = state.time_detection
+        )
+        metrics.secure.set(int(self.state.secure))
+        for sink in self.sinks:
+            engage_sink(sink=sink, state=self.state)
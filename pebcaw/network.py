@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW network                                                               #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module reads the IPv4 and IPv6 route tables of the kernel and watches   #
+# for network changes (links, addresses and routes) by way of a netlink        #
+# socket.                                                                      #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+import socket
+import struct
+import threading
+
+from pebcaw import whitelist
+
+NETLINK_ROUTE      = 0
+RTMGRP_LINK        = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE  = 0x40
+RTMGRP_IPV6_IFADDR = 0x100
+RTMGRP_IPV6_ROUTE  = 0x400
+RTM_NEWROUTE       = 24
+RTM_GETROUTE       = 26
+NLM_F_REQUEST      = 0x1
+RTA_DST            = 1
+RTA_OIF            = 4
+RTN_UNICAST        = 1
+RTN_LOCAL          = 2
+
+header_netlink   = struct.Struct('=IHHII')
+header_route     = struct.Struct('=BBBBBBBBI')
+header_attribute = struct.Struct('=HH')
+
+interfaces_VPN_prefixes = ('tun', 'tap', 'wg', 'ppp', 'ipsec', 'vti', 'utun')
+
+def is_VPN_interface(interface=None, interfaces_VPN=None):
+    """
+    Return whether an interface is a VPN interface, either one of those
+    specified or, if none are specified, one of a name typical of VPNs.
+    """
+    if interfaces_VPN:
+        return interface in interfaces_VPN
+    return interface is not None and interface.startswith(interfaces_VPN_prefixes)
+
+def hex_to_integer_IPv4(text):
+    """
+    Return the integer of an address in the host byte order hexadecimal of
+    /proc/net/route.
+    """
+    return struct.unpack('!I', struct.pack('=I', int(text, 16)))[0]
+
+def routes_IPv4(path='/proc/net/route'):
+    """
+    Return the IPv4 routes as (destination, prefix length, metric, interface).
+    """
+    routes = []
+    try:
+        with open(path) as file_routes:
+            next(file_routes)
+            for line in file_routes:
+                fields = line.split()
+                if len(fields) < 8 or not int(fields[3], 16) & 0x1:
+                    continue
+                mask = hex_to_integer_IPv4(fields[7])
+                routes.append((
+                    hex_to_integer_IPv4(fields[1]),
+                    bin(mask).count('1'),
+                    int(fields[6]),
+                    fields[0]
+                ))
+    except (OSError, StopIteration):
+        pass
+    return routes
+
+def routes_IPv6(path='/proc/net/ipv6_route'):
+    """
+    Return the IPv6 routes as (destination, prefix length, metric, interface).
+    """
+    routes = []
+    try:
+        with open(path) as file_routes:
+            for line in file_routes:
+                fields = line.split()
+                if len(fields) < 10 or not int(fields[8], 16) & 0x1 or fields[9] == 'lo':
+                    continue
+                routes.append((int(fields[0], 16), int(fields[1], 16), int(fields[5], 16), fields[9]))
+    except OSError:
+        pass
+    return routes
+
+def route(IP=None, routes=None):
+    """
+    Return the interface by which the kernel routes packets to an IP, or None
+    if there is no route. If routes are specified, the interface is that of
+    the route of the routes by longest prefix match, lowest metric first.
+    Loopback addresses route by lo.
+    """
+    if routes is None:
+        return router().route(IP)
+    if ':' in IP:
+        integer, bits = whitelist.IPv6_to_integer(IP), 128
+        if integer == 1:
+            return 'lo'
+    else:
+        integer, bits = whitelist.IP_to_integer(IP), 32
+        if integer >> 24 == 127:
+            return 'lo'
+    return route_integer(integer=integer, bits=bits, routes=routes)
+
+def route_integer(integer=None, bits=32, routes=None):
+    """
+    Return the interface of the route to an integer address of a number of
+    bits (32 or 128) by longest prefix match, lowest metric first, or None if
+    there is no route.
+    """
+    best = None
+    for destination, length, metric, interface in routes:
+        mask = ((1 << length) - 1) << (bits - length)
+        if integer & mask == destination & mask:
+            if best is None or (length, -metric) > (best[0], -best[1]):
+                best = (length, metric, interface)
+    return best[2] if best else None
+
+class Router(object):
+    """
+    Route lookup by the kernel, by way of RTM_GETROUTE netlink requests as of
+    ip route get, so that the routing policy rules (ip rule, e.g. the table
+    51820 and suppress_prefixlength 0 rules of wg-quick) apply as to an
+    unmarked packet of this host. Destinations of unreachable, blackhole or
+    prohibit routes have no route. Where netlink is unavailable, the route is
+    that of the main table of /proc/net/route and /proc/net/ipv6_route.
+    """
+
+    def __init__(self, timeout=1):
+        self.sequence = 0
+        self.lock     = threading.Lock()
+        try:
+            self.socket = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+            self.socket.settimeout(timeout)
+            self.socket.bind((0, 0))
+        except (AttributeError, OSError):
+            self.socket = None
+
+    def route(self, IP):
+        if ':' in IP:
+            return self.route_integer(integer=whitelist.IPv6_to_integer(IP), bits=128)
+        return self.route_integer(integer=whitelist.IP_to_integer(IP), bits=32)
+
+    def route_integer(self, integer=None, bits=32):
+        """
+        Return the interface of the route to an integer address of a number of
+        bits (32 or 128), or None if there is no route.
+        """
+        if self.socket is not None:
+            try:
+                return self.lookup(integer=integer, bits=bits)
+            except OSError:
+                pass
+        if bits == 32 and integer >> 24 == 127 or bits == 128 and integer == 1:
+            return 'lo'
+        routes = routes_IPv4() if bits == 32 else routes_IPv6()
+        return route_integer(integer=integer, bits=bits, routes=routes)
+
+    def lookup(self, integer=None, bits=32):
+        family  = socket.AF_INET if bits == 32 else socket.AF_INET6
+        address = integer.to_bytes(bits // 8, 'big')
+        with self.lock:
+            self.sequence = (self.sequence + 1) & 0xffffffff
+            attribute = header_attribute.pack(header_attribute.size + len(address), RTA_DST) + address
+            body      = header_route.pack(family, bits, 0, 0, 0, 0, 0, 0, 0) + attribute
+            self.socket.send(header_netlink.pack(
+                header_netlink.size + len(body),
+                RTM_GETROUTE,
+                NLM_F_REQUEST,
+                self.sequence,
+                0
+            ) + body)
+            while True:
+                data = self.socket.recv(65536)
+                offset = 0
+                while offset + header_netlink.size <= len(data):
+                    length, type_, _, sequence, _ = header_netlink.unpack_from(data, offset)
+                    if length < header_netlink.size:
+                        break
+                    if sequence == self.sequence:
+                        return self.parse(type_, data[offset + header_netlink.size:offset + length])
+                    offset += (length + 3) & ~3
+
+    @staticmethod
+    def parse(type_=None, message=None):
+        """
+        Return the interface of a route message, or None if it is an error (no
+        route) or a route of a type by which packets do not leave.
+        """
+        if type_ != RTM_NEWROUTE:
+            return None
+        route_type = header_route.unpack_from(message, 0)[7]
+        if route_type not in (RTN_UNICAST, RTN_LOCAL):
+            return None
+        offset = header_route.size
+        while offset + header_attribute.size <= len(message):
+            length, type_attribute = header_attribute.unpack_from(message, offset)
+            if length < header_attribute.size:
+                break
+            if type_attribute == RTA_OIF:
+                try:
+                    return socket.if_indextoname(struct.unpack_from('=I', message, offset + header_attribute.size)[0])
+                except OSError:
+                    return None
+            offset += (length + 3) & ~3
+        return None
+
+    def close(self):
+        if self.socket:
+            self.socket.close()
+
+router_shared = None
+
+def router():
+    """
+    Return the shared kernel route lookup.
+    """
+    global router_shared
+    if router_shared is None:
+        router_shared = Router()
+    return router_shared
+
+class NetworkChanges(object):
+    """
+    Watcher of link, address and route changes subscribed to by a netlink
+    socket. Where netlink is unavailable, changes are detected by comparison of
+    the route tables.
+    """
+
+    def __init__(self):
+        self.socket      = None
+        self.fingerprint = None
+        try:
+            self.socket = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+            self.socket.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV4_ROUTE | RTMGRP_IPV6_IFADDR | RTMGRP_IPV6_ROUTE))
+            self.socket.setblocking(False)
+        except (AttributeError, OSError):
+            self.socket = None
+            self.fingerprint = self.routes_fingerprint()
+
+    @staticmethod
+    def routes_fingerprint():
+        return hash((tuple(routes_IPv4()), tuple(routes_IPv6())))
+
+    def fileno(self):
+        return self.socket.fileno() if self.socket else None
+
+    def changed(self):
+        """
+        Return whether the network changed since the last call, draining the
+        pending change messages.
+        """
+        if self.socket is None:
+            fingerprint      = self.routes_fingerprint()
+            changed          = fingerprint != self.fingerprint
+            self.fingerprint = fingerprint
+            return changed
+        changed = False
+        while True:
+            try:
+                if not self.socket.recv(65536):
+                    break
+                changed = True
+            except BlockingIOError:
+                break
+            except OSError:
+                changed = True
+                break
+        return changed
+
+    def close(self):
+        if self.socket:
+            self.socket.close()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW power                                                                 #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module schedules observations in a low-power mode, in which wakeups are #
+# aligned to a coarse grid of wall-clock time so that they coalesce with other #
+# timers, the interval is lengthened on battery and network changes trigger    #
+# observations in place of frequent polls.                                     #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+import math
+import os
+import select
+import time
+
+from pebcaw import metrics
+from pebcaw import network
+
+path_power_supply = '/sys/class/power_supply'
+
+def read(path):
+    try:
+        with open(path) as file_attribute:
+            return file_attribute.read().strip()
+    except OSError:
+        return None
+
+def on_battery(path=path_power_supply):
+    """
+    Return whether the system is running on battery: no mains or USB supply is
+    online and a battery is discharging.
+    """
+    try:
+        supplies = os.listdir(path)
+    except OSError:
+        return False
+    discharging = False
+    for supply in supplies:
+        type_ = read(os.path.join(path, supply, 'type'))
+        if type_ in ('Mains', 'USB') and read(os.path.join(path, supply, 'online')) == '1':
+            return False
+        if type_ == 'Battery' and read(os.path.join(path, supply, 'status')) == 'Discharging':
+            discharging = True
+    return discharging
+
+class Scheduler(object):
+    """
+    Low-power scheduler of observations. Each wait lasts until the first grid
+    point (a multiple of the grid in UNIX time) at least the interval away,
+    with the interval multiplied by the battery factor on battery, or until the
+    network changes, after the network has settled.
+    """
+
+    def __init__(
+        self,
+        interval       = 300,
+        grid           = 60,
+        battery_factor = 4,
+        settle         = 2,
+        changes        = None,
+        path           = path_power_supply,
+        clock          = time
+        ):
+        self.interval       = interval
+        self.grid           = grid
+        self.battery_factor = battery_factor
+        self.settle         = settle
+        self.changes        = changes if changes is not None else network.NetworkChanges()
+        self.path           = path
+        self.clock          = clock
+
+    def interval_current(self):
+        if on_battery(self.path):
+            return self.interval * self.battery_factor
+        return self.interval
+
+    def deadline(self, time_now=None):
+        time_now = self.clock.time() if time_now is None else time_now
+        deadline = time_now + self.interval_current()
+        if self.grid > 0:
+            deadline = math.ceil(deadline / self.grid) * self.grid
+        return deadline
+
+    def wait(self):
+        """
+        Wait until the next observation and return the reason (timer or
+        network).
+        """
+        deadline = self.deadline()
+        fileno   = self.changes.fileno()
+        reason   = 'timer'
+        while True:
+            remaining = deadline - self.clock.time()
+            if remaining <= 0:
+                break
+            if fileno is None:
+                self.clock.sleep(remaining)
+                break
+            readable, _, _ = select.select([fileno], [], [], remaining)
+            if readable:
+                self.clock.sleep(self.settle)
+                if self.changes.changed():
+                    reason = 'network'
+                    break
+        metrics.wakeups.inc()
+        return reason
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW profiling                                                             #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module provides per-iteration timing traces of the monitor loop in a    #
+# ring buffer and an optional cProfile and tracemalloc mode, dumped on SIGUSR1 #
+# or at exit.                                                                  #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+import array
+import atexit
+import cProfile
+import io
+import pstats
+import signal
+import sys
+import time
+import tracemalloc
+
+stages = ('fetch', 'decode', 'classify', 'notify', 'display', 'sleep')
+
+class TimingTrace(object):
+    """
+    Ring buffer of monotonic stage timestamps, one row per loop iteration. Each
+    row holds the iteration start time followed by the end time of each stage.
+    """
+
+    def __init__(
+        self,
+        capacity = 1024,
+        stages   = stages
+        ):
+        self.capacity = capacity
+        self.stages   = stages
+        self.indices  = {stage: index + 1 for index, stage in enumerate(stages)}
+        self.width    = len(stages) + 1
+        self.data     = array.array('d', [0.0]) * (capacity * self.width)
+        self.count    = 0
+        self.offset   = 0
+
+    def begin(self):
+        self.offset = (self.count % self.capacity) * self.width
+        self.count += 1
+        for index in range(self.offset, self.offset + self.width):
+            self.data[index] = 0.0
+        self.data[self.offset] = time.monotonic()
+
+    def mark(self, stage):
+        self.data[self.offset + self.indices[stage]] = time.monotonic()
+
+    def rows(self):
+        """
+        Yield the recorded rows from oldest to newest as dictionaries of stage
+        durations (s). Stages not reached in an iteration are omitted.
+        """
+        number = min(self.count, self.capacity)
+        for row in range(self.count - number, self.count):
+            offset   = (row % self.capacity) * self.width
+            previous = self.data[offset]
+            durations = {}
+            for stage in self.stages:
+                time_end = self.data[offset + self.indices[stage]]
+                if time_end:
+                    durations[stage] = time_end - previous
+                    previous         = time_end
+            yield durations
+
+    def summary(self):
+        durations = {stage: [] for stage in self.stages}
+        for row in self.rows():
+            for stage, duration in row.items():
+                durations[stage].append(duration)
+        lines = [
+            'timing trace: {iterations} iterations, last {number} retained'.format(
+                iterations = self.count,
+                number     = min(self.count, self.capacity)
+            ),
+            '{:<10} {:>8} {:>12} {:>12} {:>12}'.format('stage', 'n', 'mean (s)', 'p99 (s)', 'max (s)')
+        ]
+        for stage in self.stages:
+            values = sorted(durations[stage])
+            if not values:
+                continue
+            lines.append('{:<10} {:>8} {:>12.6f} {:>12.6f} {:>12.6f}'.format(
+                stage,
+                len(values),
+                sum(values) / len(values),
+                values[min(len(values) - 1, int(0.99 * len(values)))],
+                values[-1]
+            ))
+        return '\n'.join(lines)
+
+class Profiler(object):
+    """
+    cProfile and tracemalloc session of which the statistics are dumped on
+    SIGUSR1 and at exit.
+    """
+
+    def __init__(
+        self,
+        profile  = False,
+        trace    = None,
+        filename = None,
+        top      = 25,
+        stream   = sys.stderr
+        ):
+        self.profile  = cProfile.Profile() if profile else None
+        self.trace    = trace
+        self.filename = filename
+        self.top      = top
+        self.stream   = stream
+
+    def start(self):
+        if self.profile:
+            tracemalloc.start()
+            self.profile.enable()
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.dump())
+        atexit.register(self.dump)
+        return self
+
+    def dump(self):
+        if self.profile:
+            self.profile.disable()
+            output = io.StringIO()
+            statistics = pstats.Stats(self.profile, stream=output)
+            statistics.sort_stats('cumulative').print_stats(self.top)
+            if self.filename:
+                statistics.dump_stats(self.filename)
+            print(output.getvalue(), file=self.stream)
+            snapshot = tracemalloc.take_snapshot()
+            print('tracemalloc top {top}:'.format(top=self.top), file=self.stream)
+            for statistic in snapshot.statistics('lineno')[:self.top]:
+                print(statistic, file=self.stream)
+            self.profile.enable()
+        if self.trace:
+            print(self.trace.summary(), file=self.stream)
+        self.stream.flush()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW query                                                                 #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module serves the latest classified state of the monitor from memory    #
+# over a Unix domain socket with a line protocol, and pushes state changes to  #
+# subscribed clients.                                                          #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+import json
+import os
+import selectors
+import socket
+import sys
+import threading
+import time
+
+size_output  = 1048576
+delay_accept = 0.1
+
+class State(object):
+    """
+    Latest classified state. Updates replace an immutable snapshot so readers in
+    other threads never see a partial update.
+    """
+
+    def __init__(self):
+        self.snapshot = (None, b'{}', b'-')
+
+    def update(
+        self,
+        IP               = None,
+        country          = None,
+        whitelisted      = None,
+        secure           = None,
+        time_observation = None
+        ):
+        """
+        Set the state and return True if the secure or IP fields changed.
+        """
+        if time_observation is None:
+            time_observation = time.time()
+        data = {
+            'IP':          IP,
+            'country':     country,
+            'whitelisted': whitelisted,
+            'secure':      secure,
+            'time':        time_observation
+        }
+        previous = self.snapshot[0]
+        self.snapshot = (
+            data,
+            json.dumps(data)[:-1].encode('utf-8'),
+            b'-' if secure is None else (b'1' if secure else b'0')
+        )
+        return previous is None or (previous['secure'], previous['IP']) != (secure, IP)
+
+    def line(self):
+        data, prefix, secure = self.snapshot
+        if data is None:
+            return b'{}\n'
+        age = time.time() - data['time']
+        return prefix + b', "age": ' + repr(round(age, 3)).encode('ascii') + b'}\n'
+
+    def line_secure(self):
+        return self.snapshot[2] + b'\n'
+
+class Server(object):
+    """
+    Single-threaded selector server on a Unix domain socket, run in a
+    background thread. Line protocol (one command per line, one response line
+    per command):
+
+        state      JSON of IP, country, whitelisted, secure, time and age (s)
+        secure     1 if secure, 0 if insecure, - if unknown
+        subscribe  response as for state, then a state line on each change
+        window [S] [TARGET]
+                   JSON of aggregates of the history of the last S seconds (or
+                   all), if a history is kept, or of the history of an egress
+                   target, if histories of targets are kept
+        ping       pong
+
+    Responses that cannot be sent at once are buffered per connection and sent
+    as the connection becomes writable, meanwhile its requests are not read.
+    A connection of which the unsent responses exceed size_output bytes (e.g.
+    a subscriber that does not read) is closed, as is a connection of which a
+    request fails; failures are reported and do not stop the server.
+    """
+
+    def __init__(
+        self,
+        path      = None,
+        state     = None,
+        history   = None,
+        histories = None
+        ):
+        self.path        = path
+        self.state       = state or State()
+        self.history     = history
+        self.histories   = histories or {}
+        self.selector    = selectors.DefaultSelector()
+        self.buffers     = {}
+        self.outputs     = {}
+        self.subscribers = set()
+        if os.path.exists(path):
+            os.remove(path)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.bind(path)
+        self.socket.listen(1024)
+        self.socket.setblocking(False)
+        self.selector.register(self.socket, selectors.EVENT_READ, self.accept)
+        self.wake_read, self.wake_write = socket.socketpair()
+        self.wake_read.setblocking(False)
+        self.wake_write.setblocking(False)
+        self.selector.register(self.wake_read, selectors.EVENT_READ, self.push)
+        self.running = False
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        # blocks until a connection, a request or a wake by notify
+        while self.running:
+            for key, events in self.selector.select():
+                # a connection may have been closed by an earlier callback
+                if key.fileobj.fileno() == -1:
+                    continue
+                try:
+                    if events & selectors.EVENT_WRITE:
+                        self.flush(key.fileobj)
+                    if events & selectors.EVENT_READ and key.fileobj.fileno() != -1:
+                        key.data(key.fileobj)
+                except Exception as exception:
+                    print('error in query server: {exception!r}'.format(exception=exception), file=sys.stderr)
+                    if key.fileobj in self.buffers:
+                        self.close(key.fileobj)
+
+    def stop(self):
+        self.running = False
+        self.notify()
+
+    def update(self, **kwargs):
+        """
+        Update the state and push it to subscribers if it changed.
+        """
+        if self.state.update(**kwargs) and self.subscribers:
+            self.notify()
+
+    def notify(self):
+        try:
+            self.wake_write.send(b'\0')
+        except BlockingIOError:
+            pass
+
+    def accept(self, listener):
+        try:
+            connection, address = listener.accept()
+        except BlockingIOError:
+            return
+        except OSError as exception:
+            # e.g. out of file descriptors: back off rather than spin
+            print('error accepting query connection: {exception!r}'.format(exception=exception), file=sys.stderr)
+            time.sleep(delay_accept)
+            return
+        connection.setblocking(False)
+        self.buffers[connection] = b''
+        self.selector.register(connection, selectors.EVENT_READ, self.read)
+
+    def close(self, connection):
+        self.selector.unregister(connection)
+        self.buffers.pop(connection, None)
+        self.outputs.pop(connection, None)
+        self.subscribers.discard(connection)
+        connection.close()
+
+    def send(self, connection, data):
+        """
+        Send data to a connection, buffering what cannot be sent at once.
+        """
+        output = self.outputs.get(connection)
+        if output is not None:
+            output += data
+            if len(output) > size_output:
+                self.close(connection)
+            return
+        try:
+            sent = connection.send(data)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self.close(connection)
+            return
+        if sent < len(data):
+            self.outputs[connection] = bytearray(data[sent:])
+            self.selector.modify(connection, selectors.EVENT_WRITE, self.read)
+
+    def flush(self, connection):
+        """
+        Send the buffered data of a writable connection.
+        """
+        output = self.outputs.get(connection)
+        if output is None:
+            return
+        try:
+            sent = connection.send(output)
+        except BlockingIOError:
+            return
+        except OSError:
+            self.close(connection)
+            return
+        del output[:sent]
+        if not output:
+            del self.outputs[connection]
+            self.selector.modify(connection, selectors.EVENT_READ, self.read)
+
+    def read(self, connection):
+        try:
+            data = connection.recv(4096)
+        except (BlockingIOError, ConnectionError):
+            data = b''
+        if not data:
+            self.close(connection)
+            return
+        buffer = self.buffers[connection] + data
+        *lines, self.buffers[connection] = buffer.split(b'\n')
+        if len(self.buffers[connection]) > 4096:
+            self.close(connection)
+            return
+        for line in lines:
+            command = line.strip().lower()
+            if command == b'state':
+                self.send(connection, self.state.line())
+            elif command == b'secure':
+                self.send(connection, self.state.line_secure())
+            elif command == b'subscribe':
+                self.subscribers.add(connection)
+                self.send(connection, self.state.line())
+            elif command.split()[:1] == [b'window'] and (self.history is not None or self.histories):
+                arguments = line.split()[1:]
+                if len(arguments) > 1:
+                    history = self.histories.get(arguments[1].decode('utf-8', 'replace'))
+                else:
+                    history = self.history
+                try:
+                    seconds = float(arguments[0]) if arguments else None
+                    if history is None:
+                        self.send(connection, b'error: unknown target\n')
+                    else:
+                        self.send(connection, json.dumps(history.aggregates(seconds=seconds)).encode('utf-8') + b'\n')
+                except ValueError:
+                    self.send(connection, b'error: invalid window\n')
+            elif command == b'ping':
+                self.send(connection, b'pong\n')
+            elif command:
+                self.send(connection, b'error: unknown command\n')
+            if connection not in self.buffers:
+                return
+
+    def push(self, wake_read):
+        try:
+            while wake_read.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        line = self.state.line()
+        for connection in list(self.subscribers):
+            self.send(connection, line)
+
+def query(path=None, command='state', timeout=5):
+    """
+    Return the response to a command sent to a query server.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(path)
+        connection.sendall(command.encode('utf-8') + b'\n')
+        response = b''
+        while not response.endswith(b'\n'):
+            data = connection.recv(4096)
+            if not data:
+                break
+            response += data
+    return response.decode('utf-8').strip()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW replay                                                                #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module records observation traces and replays them through the          #
+# classification, notification and scheduling logic of the monitor on a        #
+# virtual clock at full speed, producing the alert timeline and detection      #
+# latencies.                                                                   #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+import bisect
+import json
+import math
+import time
+
+from pebcaw import monitor
+
+class VirtualClock(object):
+    """
+    Clock of which sleeping advances the time instantly.
+    """
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, duration):
+        self.now += max(0.0, duration)
+
+class Recorder(object):
+    """
+    Writer of observations to a trace of JSON lines, one line per observation:
+    {"time": ..., "duration": ..., "data": {...}} or {"time": ..., "error": ...}.
+    """
+
+    def __init__(self, filename=None):
+        self.file = open(filename, 'a', buffering=1)
+
+    def record(self, data=None, error=None, duration=None, time_observation=None):
+        line = {'time': time.time() if time_observation is None else time_observation}
+        if duration is not None:
+            line['duration'] = round(duration, 6)
+        if error is not None:
+            line['error'] = str(error) or type(error).__name__
+        else:
+            line['data'] = data
+        self.file.write(json.dumps(line, separators=(',', ':')) + '\n')
+
+    def close(self):
+        self.file.close()
+
+class Trace(object):
+    """
+    Recorded observations, each at the time at which it completed. The
+    observation of a time is the one in progress at that time, that started
+    (its time less its duration) at or before it, otherwise the latest
+    recorded at or before that time.
+    """
+
+    def __init__(self, records=None):
+        self.records = sorted(records, key=lambda record: record['time'])
+        self.times   = [record['time'] for record in self.records]
+
+    @classmethod
+    def load(cls, filenames=None):
+        records = []
+        for filename in filenames:
+            with open(filename) as file_trace:
+                records.extend(json.loads(line) for line in file_trace if line.strip())
+        return cls(records=records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def start(self, index):
+        return self.times[index] - self.records[index].get('duration', 0)
+
+    def at(self, time_observation):
+        index = bisect.bisect_right(self.times, time_observation)
+        if index < len(self.records) and self.start(index) <= time_observation:
+            return self.records[index]
+        return self.records[max(0, index - 1)]
+
+class TraceProvider(object):
+    """
+    Provider of the IP details recorded in a trace at the time of a virtual
+    clock, which it advances by the recorded duration of the observation.
+    """
+
+    def __init__(self, trace=None, clock=None):
+        self.trace = trace
+        self.clock = clock
+
+    def __call__(self, mark=None):
+        record = self.trace.at(self.clock.time())
+        if 'error' in record:
+            raise monitor.ProviderError(record['error'])
+        self.clock.sleep(record.get('duration', 0))
+        return record['data']
+
+def replay(
+    trace     = None,
+    policy    = None,
+    interval  = 300,
+    clock     = None,
+    tolerance = 0.5
+    ):
+    """
+    Replay a trace through a monitor on a virtual clock, starting at the first
+    record and stopping after the last, and return the alert timeline and the
+    insecure periods of the trace with their detection latencies. The clock
+    may be shared with a policy that classifies at the time of observation.
+    Each step is an interval after the previous step completed, as in the
+    monitor loop, except that a record that started up to a tolerance (a
+    fraction of the interval) later is taken to be the observation of that
+    step and is stepped when it started, so that a trace recorded by the
+    monitor, of which each cycle is the interval plus the time of the
+    observation and of the sinks, replays at its own observations. Steps at
+    which the trace would not have changed since the previous step are
+    skipped: the clock advances by whole intervals to the next record.
+    """
+    if interval <= 0:
+        raise ValueError('replay interval must be positive')
+    if not len(trace):
+        raise ValueError('no observations to replay')
+    clock     = clock or VirtualClock()
+    clock.now = trace.start(0)
+    timeline  = []
+    def sink(state):
+        for warning in state.warnings:
+            timeline.append(dict(warning, time=state.time, secure=state.secure))
+    monitor_replay = monitor.Monitor(
+        provider = TraceProvider(trace=trace, clock=clock),
+        policy   = policy,
+        sinks    = [sink],
+        interval = interval,
+        clock    = clock
+    )
+    while True:
+        monitor_replay.step()
+        index = bisect.bisect_right(trace.times, clock.time())
+        if index == len(trace):
+            break
+        start     = trace.start(index)
+        steps     = max(1, math.ceil((start - clock.time()) / interval - tolerance))
+        clock.now = max(clock.time() + steps * interval, start)
+    periods         = []
+    secure_previous = True
+    for record in trace.records:
+        clock.now = record['time']
+        secure    = 'error' not in record and policy(record['data'])[0]
+        if not secure and secure_previous:
+            periods.append({'start': record['time'], 'end': None})
+        elif secure and not secure_previous:
+            periods[-1]['end'] = record['time']
+        secure_previous = secure
+    times_alert = [event['time'] for event in timeline if not event['secure']]
+    for period in periods:
+        index = bisect.bisect_left(times_alert, period['start'])
+        if index < len(times_alert) and (period['end'] is None or times_alert[index] < period['end']):
+            period['latency'] = times_alert[index] - period['start']
+        else:
+            period['latency'] = None
+    return timeline, periods
+
+def report(timeline=None, periods=None):
+    lines = ['alert timeline:']
+    for event in timeline:
+        lines.append('    {time} {text}{subtext}'.format(
+            time    = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(event['time'])),
+            text    = event['text'],
+            subtext = ' (' + event['subtext'] + ')' if event.get('subtext') else ''
+        ))
+    lines.append('insecure periods:')
+    for period in periods:
+        lines.append('    {start} to {end}: {latency}'.format(
+            start   = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(period['start'])),
+            end     = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(period['end'])) if period['end'] else 'end of trace',
+            latency = 'detected after {:.1f} s'.format(period['latency']) if period['latency'] is not None else 'undetected'
+        ))
+    latencies = [period['latency'] for period in periods if period['latency'] is not None]
+    lines.append('alerts: {}'.format(len(timeline)))
+    lines.append('insecure periods: {} ({} undetected)'.format(len(periods), len(periods) - len(latencies)))
+    if latencies:
+        lines.append('detection latency (s): mean {:.1f}, max {:.1f}'.format(
+            sum(latencies) / len(latencies),
+            max(latencies)
+        ))
+    return '\n'.join(lines)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW rollup                                                                #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module stores long-term statistics of the monitor in a fixed-size       #
+# round-robin file of archives at several resolutions (per minute, hour and    #
+# day), consolidated (count, average, minimum, maximum) in place by way of     #
+# mmap, so that disk usage is constant and each observation costs O(1).        #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+import math
+import mmap
+import os
+import struct
+import time
+
+magic   = b'PEBCAWRR'
+version = 1
+
+header         = struct.Struct('!8sIII')
+record_metric  = struct.Struct('!16s')
+record_archive = struct.Struct('!II')
+
+metrics_default  = ('secure', 'latency', 'alerts', 'errors')
+archives_default = (
+    (60,    1440),
+    (3600,  720),
+    (86400, 730)
+)
+
+def record_row(number_metrics):
+    """
+    Return the structure of a row: the slot (time divided by the step of the
+    archive) and, per metric, the count, sum, minimum and maximum.
+    """
+    return struct.Struct('!q' + 'Iddd' * number_metrics)
+
+class Rollup(object):
+    """
+    Round-robin file of archives, each of a number of rows of a step (s). The
+    row of a time in an archive is its slot (the time divided by the step)
+    modulo the number of rows; a row of an older slot is reset when a newer
+    slot reaches it. The file format (big-endian) is a header (magic, version,
+    numbers of metrics and archives), the metric names, the archive steps and
+    rows and the rows of each archive. If the file does not exist, it is
+    created with the metrics and archives specified, unless it is opened read
+    only (e.g. for a report), in which case it must exist.
+    """
+
+    def __init__(
+        self,
+        filename  = None,
+        metrics   = metrics_default,
+        archives  = archives_default,
+        read_only = False
+        ):
+        if read_only:
+            self.file = open(filename, 'rb')
+            self.map  = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            if not os.path.exists(filename):
+                self.create(filename=filename, metrics=metrics, archives=archives)
+            self.file = open(filename, 'r+b')
+            self.map  = mmap.mmap(self.file.fileno(), 0)
+        if len(self.map) < header.size:
+            raise ValueError('not a PEBCAW rollup file: ' + filename)
+        _magic, _version, number_metrics, number_archives = header.unpack_from(self.map, 0)
+        if _magic != magic or _version != version:
+            raise ValueError('not a PEBCAW rollup file: ' + filename)
+        offset       = header.size
+        self.metrics = []
+        for index in range(number_metrics):
+            self.metrics.append(record_metric.unpack_from(self.map, offset)[0].rstrip(b'\0').decode('ascii'))
+            offset += record_metric.size
+        self.indices = {metric: index for index, metric in enumerate(self.metrics)}
+        self.row     = record_row(number_metrics)
+        self.archives = []
+        offset_rows   = offset + number_archives * record_archive.size
+        for index in range(number_archives):
+            step, rows = record_archive.unpack_from(self.map, offset)
+            offset += record_archive.size
+            self.archives.append((step, rows, offset_rows))
+            offset_rows += rows * self.row.size
+        if offset_rows != len(self.map):
+            raise ValueError('truncated PEBCAW rollup file: ' + filename)
+
+    @staticmethod
+    def create(filename=None, metrics=metrics_default, archives=archives_default):
+        row  = record_row(len(metrics))
+        data = header.pack(magic, version, len(metrics), len(archives))
+        for metric in metrics:
+            data += record_metric.pack(metric.encode('ascii'))
+        for step, rows in archives:
+            data += record_archive.pack(step, rows)
+        # empty rows are of slot -1, so that slot 0 is not taken to be filled
+        empty = row.pack(-1, *[0, 0.0, math.inf, -math.inf] * len(metrics))
+        filename_temporary = filename + '.tmp'
+        with open(filename_temporary, 'wb') as file_rollup:
+            file_rollup.write(data)
+            for step, rows in archives:
+                file_rollup.write(empty * rows)
+        os.replace(filename_temporary, filename)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def update(self, time_observation=None, values=None):
+        """
+        Consolidate the values of metrics by name (None for unknown) at a time
+        into the row of the time of each archive. A time older than the span
+        of an archive is omitted from it.
+        """
+        time_observation = time.time() if time_observation is None else time_observation
+        for step, rows, offset in self.archives:
+            slot   = int(time_observation // step)
+            start  = offset + (slot % rows) * self.row.size
+            fields = list(self.row.unpack_from(self.map, start))
+            if fields[0] > slot:
+                continue
+            if fields[0] != slot:
+                fields = [slot] + [0, 0.0, math.inf, -math.inf] * len(self.metrics)
+            for metric, value in values.items():
+                if value is None or metric not in self.indices:
+                    continue
+                index = 1 + 4 * self.indices[metric]
+                fields[index]     += 1
+                fields[index + 1] += value
+                fields[index + 2]  = min(fields[index + 2], value)
+                fields[index + 3]  = max(fields[index + 3], value)
+            self.row.pack_into(self.map, start, *fields)
+
+    def update_state(self, state):
+        """
+        Consolidate a classified state of the monitor: whether it is secure,
+        the latency of the observation (unknown if it failed), the number of
+        alerts and whether the observation failed.
+        """
+        error = state.error is not None
+        self.update(time_observation=state.time, values={
+            'secure':  1.0 if state.secure else 0.0,
+            'latency': None if error else state.duration,
+            'alerts':  len(state.warnings),
+            'errors':  1.0 if error else 0.0
+        })
+
+    def fetch(self, step=None, time_start=None, time_end=None):
+        """
+        Return the rows of the archive of a step from a time to a time (by
+        default the span of the archive up to now), in order of time, as
+        (time, {metric: (count, average, minimum, maximum)}), omitting empty
+        rows.
+        """
+        for _step, rows, offset in self.archives:
+            if _step == step:
+                break
+        else:
+            raise ValueError('no archive of step {step}'.format(step=step))
+        time_end   = time.time() if time_end is None else time_end
+        slot_end   = int(time_end // step)
+        slot_start = max(int(time_start // step) if time_start is not None else 0, slot_end - rows + 1)
+        results    = []
+        for slot in range(slot_start, slot_end + 1):
+            fields = self.row.unpack_from(self.map, offset + (slot % rows) * self.row.size)
+            if fields[0] != slot:
+                continue
+            consolidated = {}
+            for index, metric in enumerate(self.metrics):
+                count, total, minimum, maximum = fields[1 + 4 * index:5 + 4 * index]
+                if count:
+                    consolidated[metric] = (count, total / count, minimum, maximum)
+            if consolidated:
+                results.append((slot * step, consolidated))
+        return results
+
+def report(rollup=None, rows=24):
+    """
+    Return a text report of the latest rows of each archive.
+    """
+    lines = []
+    for step, _rows, offset in rollup.archives:
+        lines.append('per {step} s:'.format(step=step))
+        lines.append('    {:<20} {:>12} {:>9} {:>12} {:>12} {:>8} {:>8}'.format(
+            'time', 'observations', 'secure', 'latency (s)', 'maximum (s)', 'alerts', 'errors'
+        ))
+        for time_row, consolidated in rollup.fetch(step=step)[-rows:]:
+            count, secure, _, _ = consolidated.get('secure', (0, 0.0, 0.0, 0.0))
+            latency             = consolidated.get('latency', (0, float('nan'), 0.0, float('nan')))
+            alerts              = consolidated.get('alerts', (0, 0.0, 0.0, 0.0))
+            errors              = consolidated.get('errors', (0, 0.0, 0.0, 0.0))
+            lines.append('    {:<20} {:>12} {:>8.1f}% {:>12.3f} {:>12.3f} {:>8.0f} {:>8.0f}'.format(
+                time.strftime('%Y-%m-%dT%H:%MZ', time.gmtime(time_row)),
+                count,
+                100 * secure,
+                latency[1],
+                latency[3],
+                alerts[0] * alerts[1],
+                errors[0] * errors[1]
+            ))
+    return '\n'.join(lines)
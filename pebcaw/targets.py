@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW targets                                                               #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module observes the egress IP of many network namespaces, interfaces or #
+# source addresses concurrently from one process, on a shared pool of threads. #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+import concurrent.futures
+import ctypes
+import ctypes.util
+import errno
+import http.client
+import json
+import os
+import socket
+import time
+import urllib.parse
+
+from pebcaw import client
+from pebcaw import metrics
+
+CLONE_NEWNET = 0x40000000
+
+libc     = None
+sessions = {}
+
+def setns(file_descriptor, namespace_type=CLONE_NEWNET):
+    global libc
+    if libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    if libc.setns(file_descriptor, namespace_type) != 0:
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error))
+
+class Target(object):
+    """
+    Egress path of which to observe the IP: a network namespace (netns:NAME or
+    netns:/path), an interface (interface:NAME) or a source address
+    (source:IP).
+    """
+
+    def __init__(self, specification=None):
+        self.specification = specification
+        self.kind, _, self.value = specification.partition(':')
+        if self.kind not in ('netns', 'interface', 'source') or not self.value:
+            raise ValueError('invalid target: ' + specification)
+        if self.kind == 'netns' and '/' not in self.value:
+            self.value = os.path.join('/var/run/netns', self.value)
+
+    def __str__(self):
+        return self.specification
+
+    def create_socket(self, family=socket.AF_INET, type=socket.SOCK_STREAM):
+        """
+        Return a socket of which the traffic leaves by this target.
+        """
+        if self.kind == 'netns':
+            return self.socket_namespace(family=family, type=type)
+        _socket = socket.socket(family, type)
+        try:
+            if self.kind == 'interface':
+                _socket.setsockopt(
+                    socket.SOL_SOCKET,
+                    socket.SO_BINDTODEVICE,
+                    self.value.encode('utf-8')
+                )
+            else:
+                _socket.bind((self.value, 0))
+        except:
+            _socket.close()
+            raise
+        return _socket
+
+    def socket_namespace(self, family=socket.AF_INET, type=socket.SOCK_STREAM):
+        """
+        Return a socket created in a network namespace. The calling thread
+        enters the namespace only for the creation of the socket, which stays
+        in that namespace afterwards.
+        """
+        with open('/proc/thread-self/ns/net') as namespace_original, \
+             open(self.value) as namespace_target:
+            setns(namespace_target.fileno())
+            try:
+                return socket.socket(family, type)
+            finally:
+                setns(namespace_original.fileno())
+
+class NoAddressError(OSError):
+    """
+    Error that a host has no address of an address family (e.g. no AAAA
+    record).
+    """
+
+# errors of an address family without connectivity, as opposed to errors of
+# an observation that failed over a family that has it
+errnos_unreachable = (errno.ENETUNREACH, errno.EHOSTUNREACH, errno.EADDRNOTAVAIL, errno.EAFNOSUPPORT)
+codes_no_address   = tuple(
+    getattr(socket, name) for name in ('EAI_ADDRFAMILY', 'EAI_NODATA', 'EAI_NONAME') if hasattr(socket, name)
+)
+
+def is_unreachable(exception):
+    """
+    Return whether the exception of an observation over an address family is
+    that the family has no connectivity (no route or address, or no address
+    of the host of the family) rather than that the observation failed.
+    """
+    if isinstance(exception, NoAddressError):
+        return True
+    if isinstance(exception, socket.gaierror):
+        return exception.errno in codes_no_address
+    return isinstance(exception, OSError) and exception.errno in errnos_unreachable
+
+def parse(text=None):
+    return [Target(specification) for specification in text.split(',') if specification]
+
+class HTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP connection of one address family, by way of a target if specified,
+    over TLS if a context is specified, resuming the last TLS session of the
+    target, family and host, and at an address of a resolver if specified.
+    """
+
+    def __init__(self, host, target=None, family=socket.AF_INET, context=None, resolver=None, **kwargs):
+        super().__init__(host, **kwargs)
+        self.target   = target
+        self.family   = family
+        self.context  = context
+        self.resolver = resolver
+
+    def address(self):
+        if self.resolver:
+            for address in self.resolver.addresses(self.host):
+                if (':' in address) == (self.family == socket.AF_INET6):
+                    return address, self.port
+            raise NoAddressError('no addresses of {host} of the family'.format(host=self.host))
+        return socket.getaddrinfo(self.host, self.port, self.family, socket.SOCK_STREAM)[0][4]
+
+    def key(self):
+        return str(self.target), self.family, self.host, self.port
+
+    def connect(self):
+        address = self.address()
+        if self.target:
+            self.sock = self.target.create_socket(family=self.family)
+        else:
+            self.sock = socket.socket(self.family, socket.SOCK_STREAM)
+        try:
+            self.sock.settimeout(self.timeout)
+            self.sock.connect(address)
+            if self.context:
+                self.sock = self.context.wrap_socket(
+                    self.sock,
+                    server_hostname = self.host,
+                    session         = sessions.get(self.key())
+                )
+        except:
+            self.sock.close()
+            raise
+
+def observe(
+    target   = None,
+    URL      = 'https://ipinfo.io/json',
+    timeout  = 10,
+    family   = socket.AF_INET,
+    context  = None,
+    resolver = None
+    ):
+    """
+    Return the IP details observed over an address family by way of a target,
+    over HTTPS if the URL is https, with the TLS context if specified, and at
+    an address of the resolver if specified.
+    """
+    URL = urllib.parse.urlsplit(URL)
+    if URL.scheme == 'https' and context is None:
+        context = client.context()
+    connection = HTTPConnection(
+        URL.hostname,
+        port     = URL.port or (443 if URL.scheme == 'https' else 80),
+        target   = target,
+        family   = family,
+        context  = context if URL.scheme == 'https' else None,
+        resolver = resolver,
+        timeout  = timeout
+    )
+    try:
+        connection.request('GET', URL.path or '/', headers={'Accept': 'application/json'})
+        response = connection.getresponse()
+        if response.status != 200:
+            raise IOError('HTTP status {status}'.format(status=response.status))
+        data = json.loads(response.read())
+        if connection.context and connection.sock:
+            sessions[connection.key()] = connection.sock.session
+        return data
+    finally:
+        connection.close()
+
+class Scheduler(object):
+    """
+    Shared pool of threads on which all targets are observed concurrently each
+    round.
+    """
+
+    def __init__(
+        self,
+        targets  = None,
+        URL      = 'https://ipinfo.io/json',
+        workers  = 32,
+        timeout  = 10,
+        context  = None,
+        resolver = None
+        ):
+        self.targets  = targets
+        self.URL      = URL
+        self.timeout  = timeout
+        self.context  = context
+        self.resolver = resolver
+        if context is None and URL.startswith('https:'):
+            self.context = client.context()
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers        = max(1, min(workers, len(targets))),
+            thread_name_prefix = 'pebcaw'
+        )
+
+    def observe_timed(self, function=observe, target=None):
+        """
+        Return the IP details observed by way of a target, the exception if
+        the observation failed and its duration (s).
+        """
+        time_start = time.monotonic()
+        try:
+            data_IP, exception = function(
+                target,
+                URL      = self.URL,
+                timeout  = self.timeout,
+                context  = self.context,
+                resolver = self.resolver
+            ), None
+        except Exception as _exception:
+            data_IP, exception = None, _exception
+        duration = time.monotonic() - time_start
+        metrics.duration_fetch.observe(duration)
+        return data_IP, exception, duration
+
+    def observe(self, function=observe):
+        """
+        Yield (target, IP details, exception, duration) for each target as its
+        observation completes.
+        """
+        futures = {
+            self.executor.submit(self.observe_timed, function=function, target=target): target
+            for target in self.targets
+        }
+        for future in concurrent.futures.as_completed(futures):
+            yield (futures[future],) + future.result()
+
+    def close(self):
+        self.executor.shutdown(wait=False)
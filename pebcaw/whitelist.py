@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW whitelist                                                             #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# This module provides a compiled whitelist index of IP addresses and prefixes #
+# as sorted integer ranges searched by bisection, and a time-versioned index   #
+# of dated whitelist snapshots annotating each range with its validity.        #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+import array
+import bisect
+import calendar
+import collections
+import socket
+import struct
+import time
+
+def IP_to_integer(IP):
+    return struct.unpack('!I', socket.inet_pton(socket.AF_INET, IP))[0]
+
+def integer_to_IP(integer):
+    return socket.inet_ntop(socket.AF_INET, struct.pack('!I', integer))
+
+def IPv6_to_integer(IP):
+    return int.from_bytes(socket.inet_pton(socket.AF_INET6, IP), 'big')
+
+def integer_to_IPv6(integer):
+    return socket.inet_ntop(socket.AF_INET6, integer.to_bytes(16, 'big'))
+
+def family(IP):
+    return socket.AF_INET6 if ':' in IP else socket.AF_INET
+
+def entry_to_range(entry):
+    """
+    Return the family and the first and last integer addresses of an IPv4 or
+    IPv6 address or CIDR prefix (e.g. 10.0.0.0/8 or 2001:db8::/32).
+    """
+    IP, _, length = entry.partition('/')
+    if family(IP) == socket.AF_INET6:
+        integer, bits = IPv6_to_integer(IP), 128
+    else:
+        integer, bits = IP_to_integer(IP), 32
+    if not length:
+        return family(IP), integer, integer
+    size  = 1 << (bits - int(length))
+    start = integer & ~(size - 1) & ((1 << bits) - 1)
+    return family(IP), start, start + size - 1
+
+def merge(ranges, starts, ends):
+    for start, end in sorted(ranges):
+        if ends and start <= ends[-1] + 1:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+class Index(object):
+    """
+    Whitelist of IPv4 and IPv6 addresses and prefixes compiled to sorted,
+    disjoint integer ranges per address family. Membership is a bisection of
+    the range starts of the family of the address.
+    """
+
+    def __init__(self, entries=()):
+        ranges = {socket.AF_INET: [], socket.AF_INET6: []}
+        for entry in entries:
+            _family, start, end = entry_to_range(entry)
+            ranges[_family].append((start, end))
+        self.starts, self.ends = merge(
+            ranges[socket.AF_INET],
+            array.array('I'),
+            array.array('I')
+        )
+        self.starts_IPv6, self.ends_IPv6 = merge(ranges[socket.AF_INET6], [], [])
+
+    def __len__(self):
+        return len(self.starts) + len(self.starts_IPv6)
+
+    def contains_integer(self, integer):
+        index = bisect.bisect_right(self.starts, integer) - 1
+        return index >= 0 and integer <= self.ends[index]
+
+    def contains_integer_IPv6(self, integer):
+        index = bisect.bisect_right(self.starts_IPv6, integer) - 1
+        return index >= 0 and integer <= self.ends_IPv6[index]
+
+    def __contains__(self, IP):
+        try:
+            if ':' in IP:
+                return self.contains_integer_IPv6(IPv6_to_integer(IP))
+            return self.contains_integer(IP_to_integer(IP))
+        except (OSError, TypeError, ValueError):
+            return False
+
+def date_to_time(date):
+    """
+    Return the UNIX time of a date (YYYY-MM-DD, UTC) or of a time in seconds.
+    """
+    if isinstance(date, str):
+        return float(calendar.timegm(time.strptime(date, '%Y-%m-%d')))
+    return float(date)
+
+def merge_periods(periods):
+    merged = []
+    for start, end in sorted(periods):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return tuple(merged)
+
+def segments(records):
+    """
+    Return the starts, ends and validity periods of the disjoint address
+    segments of ranges (start, end, time start, time end) that may overlap, by
+    a sweep over the range boundaries.
+    """
+    events = collections.defaultdict(list)
+    for start, end, time_start, time_end in records:
+        events[start].append((1, (time_start, time_end)))
+        events[end + 1].append((-1, (time_start, time_end)))
+    points = sorted(events)
+    active = collections.Counter()
+    starts, ends, periods = [], [], []
+    for point, point_next in zip(points, points[1:]):
+        for change, period in events[point]:
+            active[period] += change
+            if not active[period]:
+                del active[period]
+        if not active:
+            continue
+        periods_segment = merge_periods(active)
+        if ends and ends[-1] == point - 1 and periods[-1] == periods_segment:
+            ends[-1] = point_next - 1
+        else:
+            starts.append(point)
+            ends.append(point_next - 1)
+            periods.append(periods_segment)
+    return starts, ends, periods
+
+class VersionedIndex(object):
+    """
+    Whitelist of dated snapshots of named lists (e.g. AirVPN, Tor), compiled to
+    disjoint integer ranges per address family, each annotated with the periods
+    [start, end) in which it was in a list. An entry enters a list at the date
+    of the first snapshot of the list containing it and leaves at the date of
+    the next snapshot of the list not containing it. A snapshot is a full
+    list, replacing the previous snapshot of the list, unless it is marked
+    cumulative (name, date, entries, True), in which case it only adds its
+    entries to the list. Entries of the earliest snapshot of a list, and of
+    snapshots without a date, are taken to be valid from the beginning. A
+    query at a time is one bisection, whatever the number of snapshots.
+    """
+
+    def __init__(self, snapshots=()):
+        lists = collections.defaultdict(list)
+        for name, date, entries, *cumulative in snapshots:
+            lists[name].append((
+                float('-inf') if date is None else date_to_time(date),
+                list(entries),
+                bool(cumulative and cumulative[0])
+            ))
+        records = {socket.AF_INET: [], socket.AF_INET6: []}
+        for versions in lists.values():
+            versions.sort(key=lambda version: version[0])
+            entered = {}
+            for index, (time_version, entries, cumulative) in enumerate(versions):
+                current = set(entries) | set(entered) if cumulative else set(entries)
+                for entry in list(entered):
+                    if entry not in current:
+                        (_family, start, end), time_start = entered.pop(entry)
+                        records[_family].append((start, end, time_start, time_version))
+                for entry in current:
+                    if entry not in entered:
+                        entered[entry] = (
+                            entry_to_range(entry),
+                            float('-inf') if index == 0 else time_version
+                        )
+            for entry, ((_family, start, end), time_start) in entered.items():
+                records[_family].append((start, end, time_start, float('inf')))
+        starts, ends, self.periods = segments(records[socket.AF_INET])
+        self.starts = array.array('I', starts)
+        self.ends   = array.array('I', ends)
+        self.starts_IPv6, self.ends_IPv6, self.periods_IPv6 = segments(records[socket.AF_INET6])
+
+    def __len__(self):
+        return len(self.starts) + len(self.starts_IPv6)
+
+    def is_whitelisted(self, IP, at=None):
+        """
+        Return whether the IP was whitelisted at a time (UNIX time or date) or,
+        if no time is specified, at any time.
+        """
+        try:
+            if ':' in IP:
+                integer, starts, ends, periods = IPv6_to_integer(IP), self.starts_IPv6, self.ends_IPv6, self.periods_IPv6
+            else:
+                integer, starts, ends, periods = IP_to_integer(IP), self.starts, self.ends, self.periods
+        except (OSError, TypeError, ValueError):
+            return False
+        index = bisect.bisect_right(starts, integer) - 1
+        if index < 0 or integer > ends[index]:
+            return False
+        if at is None:
+            return True
+        at = date_to_time(at)
+        return any(start <= at < end for start, end in periods[index])
+
+    def __contains__(self, IP):
+        return self.is_whitelisted(IP)
+
+    def at(self, date=None):
+        """
+        Return the index of the whitelist valid at a time (UNIX time or date)
+        or, if no time is specified, at any time.
+        """
+        at    = None if date is None else date_to_time(date)
+        index = Index()
+        for starts, ends, periods, starts_index, ends_index in (
+            (self.starts,      self.ends,      self.periods,      index.starts,      index.ends),
+            (self.starts_IPv6, self.ends_IPv6, self.periods_IPv6, index.starts_IPv6, index.ends_IPv6)
+        ):
+            merge(
+                (
+                    (start, end) for start, end, periods_segment in zip(starts, ends, periods)
+                    if at is None or any(time_start <= at < time_end for time_start, time_end in periods_segment)
+                ),
+                starts_index,
+                ends_index
+            )
+        return index
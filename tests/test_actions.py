@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW tests actions                                                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# These tests check that the action pipeline engages its insecure actions on   #
+# the first classification and on transition to insecure or unknown security,  #
+# its recovery actions on transition to secure, and records the latency from   #
+# detection to the completion of each action.                                  #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+
+import os
+import time
+
+from pebcaw import actions
+from pebcaw import metrics
+from pebcaw import monitor
+
+class Action(object):
+
+    def __init__(self, status=0, fails=False):
+        self.status = status
+        self.fails  = fails
+        self.fired  = 0
+        self.rearms = 0
+
+    def fire(self, completed=None):
+        if self.fails:
+            raise OSError('unable to fire')
+        self.fired += 1
+        completed(self.status)
+
+    def rearm(self):
+        self.rearms += 1
+
+    def close(self):
+        pass
+
+def wait(condition, timeout=10):
+    time_end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < time_end
+        time.sleep(0.01)
+
+def test_transitions():
+    insecure, secure = Action(), Action()
+    pipeline = actions.Actions(insecure=[insecure], secure=[secure], report=False)
+    assert pipeline.update(secure=True, time_detection=time.monotonic()) == [secure]
+    assert pipeline.update(secure=True, time_detection=time.monotonic()) == []
+    assert pipeline.update(secure=False, time_detection=time.monotonic()) == [insecure]
+    assert pipeline.update(secure=True, time_detection=time.monotonic()) == [secure]
+    assert pipeline.update(secure=None, time_detection=time.monotonic()) == [insecure]
+    assert pipeline.update(secure=None, time_detection=time.monotonic()) == []
+    assert (insecure.fired, secure.fired) == (2, 2)
+    assert (insecure.rearms, secure.rearms) == (2, 2)
+    assert len(pipeline.latencies) == 4
+    assert all(0 <= latency < 1 for latency in pipeline.latencies)
+
+def test_latency_from_detection():
+    pipeline = actions.Actions(insecure=[Action()], report=False)
+    pipeline.update(secure=False, time_detection=time.monotonic() - 0.5)
+    assert 0.5 <= pipeline.latencies[0] < 1.5
+
+def test_errors():
+    failing, exiting, working = Action(fails=True), Action(status=3), Action()
+    errors   = metrics.action_errors.value
+    pipeline = actions.Actions(insecure=[failing, exiting, working], report=False)
+    assert pipeline.update(secure=False, time_detection=time.monotonic()) == [exiting, working]
+    assert working.fired == 1
+    assert metrics.action_errors.value == errors + 2
+
+def test_command(tmp_path):
+    filename = os.path.join(str(tmp_path), 'fired')
+    command  = actions.action('echo "$((1 + 1))" > ' + filename)
+    pipeline = actions.Actions(insecure=[command], report=False)
+    try:
+        assert pipeline.update(secure=False, time_detection=time.monotonic()) == [command]
+        wait(lambda: pipeline.latencies)
+        with open(filename) as file_fired:
+            assert file_fired.read() == '2\n'
+        assert command.process.poll() is None
+    finally:
+        pipeline.close()
+
+def test_command_status():
+    errors   = metrics.action_errors.value
+    pipeline = actions.Actions(insecure=[actions.action('exit 4')], report=False)
+    try:
+        pipeline.update(secure=False, time_detection=time.monotonic())
+        wait(lambda: pipeline.latencies)
+        assert metrics.action_errors.value == errors + 1
+    finally:
+        pipeline.close()
+
+def test_FIFO(tmp_path):
+    path = os.path.join(str(tmp_path), 'actions.fifo')
+    os.mkfifo(path)
+    reader = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    try:
+        pipeline = actions.Actions(
+            insecure = [actions.action('fifo:' + path, text='insecure')],
+            secure   = [actions.action('fifo:' + path, text='secure')],
+            report   = False
+        )
+        pipeline.update(secure=False, time_detection=time.monotonic())
+        pipeline.update(secure=True, time_detection=time.monotonic())
+        assert os.read(reader, 4096) == b'insecure\nsecure\n'
+        assert len(pipeline.latencies) == 2
+        pipeline.close()
+    finally:
+        os.close(reader)
+
+def test_sink():
+    insecure = Action()
+    pipeline = actions.Actions(insecure=[insecure], report=False)
+    sink     = monitor.ActionsSink(pipeline=pipeline)
+    sink(monitor.State(secure=False, time_detection=time.monotonic() - 0.25))
+    assert insecure.fired == 1
+    assert 0.25 <= pipeline.latencies[0] < 1.25
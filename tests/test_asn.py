@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW tests ASN                                                             #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# These tests compile tables of IPtoASN lines and check the lookups of the     #
+# memory-mapped table of IPv4 and IPv6 ranges, ASNs and organisations, and     #
+# that tables of many ASNs compile quickly.                                    #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+
+import time
+
+from pebcaw import asn
+
+lines = (
+    '1.0.0.0\t1.0.0.255\t13335\tUS\tCLOUDFLARENET\n'
+    '1.0.1.0\t1.0.3.255\t0\tNone\tNot routed\n'
+    '185.9.19.0\t185.9.19.255\t198605\tNL\tAVAST-AS-DC Żółw\n'
+    '2001:db8::\t2001:db8:ffff:ffff:ffff:ffff:ffff:ffff\t64496\tch\tEXAMPLE\n'
+    'invalid\tline\n'
+)
+
+def compile_table(tmp_path, text=lines):
+    filename = str(tmp_path / 'ip2asn.tsv')
+    table    = str(tmp_path / 'asn.table')
+    with open(filename, 'w', encoding='utf-8') as file_input:
+        file_input.write(text)
+    return asn.compile_table(filenames=[filename], filename_table=table), asn.Table(table)
+
+def test_lookup(tmp_path):
+    numbers, table = compile_table(tmp_path)
+    try:
+        assert numbers == (2, 1, 3)
+        assert table.lookup('1.0.0.1') == (13335, 'CLOUDFLARENET', 'US')
+        assert table.lookup('185.9.19.106') == (198605, 'AVAST-AS-DC Żółw', 'NL')
+        assert table.lookup('2001:db8::1') == (64496, 'EXAMPLE', 'CH')
+        assert table.lookup('1.0.2.1') is None
+        assert table.lookup('0.0.0.1') is None
+        assert table.lookup('255.255.255.255') is None
+        assert table.lookup('not an IP') is None
+        assert table.organisation(1) is None
+    finally:
+        table.close()
+
+def test_many_ASNs(tmp_path):
+    text = ''.join(
+        '{a}.{b}.{c}.0\t{a}.{b}.{c}.255\t{ASN}\tDE\tORGANISATION-{ASN}\n'.format(
+            a   = 1 + (ASN >> 16),
+            b   = ASN >> 8 & 255,
+            c   = ASN & 255,
+            ASN = ASN
+        )
+        for ASN in range(1, 80001)
+    )
+    time_start     = time.perf_counter()
+    numbers, table = compile_table(tmp_path, text=text)
+    assert time.perf_counter() - time_start < 3
+    try:
+        assert numbers == (80000, 0, 80000)
+        assert table.lookup('1.1.0.7') == (256, 'ORGANISATION-256', 'DE')
+        assert table.lookup('2.56.128.1') == (80000, 'ORGANISATION-80000', 'DE')
+        assert table.lookup('2.56.129.1') is None
+    finally:
+        table.close()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW tests audit                                                           #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# These tests check the extraction of dotted-quad addresses from chunks of     #
+# bytes against a brute-force tokenizer, and the bounded summary of offending  #
+# addresses against exact counts.                                              #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+
+import collections
+import random
+import re
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from pebcaw import audit
+
+run_digits_dots = re.compile(rb'[0-9.]+')
+dotted_quad     = re.compile(rb'([0-9]{1,3})\.([0-9]{1,3})\.([0-9]{1,3})\.([0-9]{1,3})')
+
+def extract_brute_force(chunk):
+    """
+    Return the offsets and integers of the valid dotted quads of a chunk: runs
+    of digits and dots that are four octets of one to three digits, each at
+    most 255, optionally followed by a dot that is not followed by a digit.
+    """
+    results = []
+    for match in run_digits_dots.finditer(chunk):
+        quad = dotted_quad.match(match.group())
+        rest = match.group()[quad.end():] if quad else None
+        if rest and (rest[:1] != b'.' or rest[1:2].isdigit()):
+            continue
+        if quad and all(int(octet) <= 255 for octet in quad.groups()):
+            integer = 0
+            for octet in quad.groups():
+                integer = integer << 8 | int(octet)
+            results.append((match.start(), integer))
+    return results
+
+def extract_valid(chunk):
+    integers, valid, offsets = audit.extract(chunk)
+    return sorted(zip(offsets[valid].tolist(), integers[valid].tolist()))
+
+@pytest.mark.parametrize('chunk', [
+    b'',
+    b'..',
+    b'1.2.3.4',
+    b'1.2.3.4\n',
+    b'a 10.0.0.1 b\n',
+    b'255.255.255.255\n',
+    b'256.1.1.1\n',
+    b'1.1.1.256\n',
+    b'1.2.3.4.5\n',
+    b'..1.2.3.4..\n',
+    b'.1.2.3.4\n',
+    b'1.2.3.4.',
+    b'1234.1.1.1\n',
+    b'1.1.1.1234\n',
+    b'x1.2.3.4y\n',
+    b'01.02.003.4\n',
+    b'1.2.3\n',
+    b'1..2.3.4\n',
+    b'192.168.1.1:80 10.1.1.1\n',
+    b'9.9.9.9 8.8.8.8.\n',
+    b'conn from 8.8.8.8. next\n',
+    b'1.2.3.4..5\n',
+    b'1.2.3.4.x\n',
+    b'1.2.3.4.567\n',
+    b'1.2.3.4x5.6.7.8',
+    b'12345.1.2.3 1.2.3.45678'
+])
+def test_extract_cases(chunk):
+    assert extract_valid(chunk) == extract_brute_force(chunk)
+
+def test_extract_sentence_end():
+    assert extract_valid(b'conn from 8.8.8.8.') == [(10, 0x08080808)]
+    assert extract_valid(b'conn from 8.8.8.8.4') == []
+
+def test_extract_random():
+    generator = random.Random(0)
+    for _ in range(20):
+        chunk = bytes(generator.choice(b'0123456789....  ab:\n') for _ in range(20000))
+        assert extract_valid(chunk) == extract_brute_force(chunk)
+
+def test_IPs_to_integers():
+    integers, valid = audit.IPs_to_integers([b'1.2.3.4', b'255.255.255.255', b'256.0.0.1', b'1.2.3'])
+    assert valid.tolist() == [True, True, False, False]
+    assert integers[:2].tolist() == [0x01020304, 0xffffffff]
+
+def test_offenders_heavy_hitters():
+    generator = numpy.random.default_rng(0)
+    heavy     = numpy.arange(1, 11, dtype=numpy.uint32) * 1000003
+    noise     = generator.integers(0, 1 << 32, size=200000, dtype=numpy.uint32)
+    integers  = numpy.concatenate([numpy.repeat(heavy, numpy.arange(1000, 11000, 1000)), noise])
+    generator.shuffle(integers)
+    offenders = audit.Offenders(width=1 << 16, capacity=64)
+    for part in numpy.array_split(integers, 7):
+        offenders.update(part)
+    exact = collections.Counter(integers.tolist())
+    top   = offenders.most_common(10)
+    assert sorted(integer for integer, count in top) == sorted(heavy.tolist())
+    for integer, count in top:
+        assert exact[integer] <= count <= exact[integer] + len(integers) * 3 // (1 << 16)
+    assert abs(offenders.distinct() - len(exact)) < 0.05 * len(exact)
+
+def test_offenders_merge():
+    generator = numpy.random.default_rng(1)
+    heavy     = numpy.repeat(numpy.arange(5, dtype=numpy.uint32) * 7919, [900, 800, 700, 600, 500])
+    integers  = numpy.concatenate([heavy, generator.integers(0, 5000, size=50000, dtype=numpy.uint32)])
+    generator.shuffle(integers)
+    whole     = audit.Offenders(width=1 << 14, capacity=32)
+    whole.update(integers)
+    merged    = audit.Offenders(width=1 << 14, capacity=32)
+    for part in numpy.array_split(integers, 3):
+        other = audit.Offenders(width=1 << 14, capacity=32)
+        other.update(part)
+        merged.merge(other)
+    assert numpy.array_equal(whole.sketch, merged.sketch)
+    assert numpy.array_equal(whole.registers, merged.registers)
+    assert whole.most_common(5) == merged.most_common(5)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW tests checkpoint                                                      #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# These tests check the atomic saving and the loading of checkpoints, that the #
+# checkpointer writes only when the state or the cache of IP details changes   #
+# and the restoring of a checkpoint to a monitor and a cache.                  #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+
+import json
+import os
+
+from pebcaw import checkpoint
+from pebcaw import geo
+from pebcaw import monitor
+from pebcaw import replay
+
+class Restored(object):
+
+    def __init__(self):
+        self.state = None
+
+def state_example(IP='10.0.0.1', secure=True, error=None):
+    return monitor.State(
+        time     = 1000.0,
+        data     = {'ip': IP, 'country': 'CH'},
+        secure   = secure,
+        warnings = [{'text': 'example'}],
+        error    = error,
+        duration = 0.25
+    )
+
+def test_save_load(tmp_path):
+    filename = os.path.join(str(tmp_path), 'checkpoint.json')
+    checkpoint.save(filename=filename, checkpoint={'version': checkpoint.version, 'state': {}})
+    assert checkpoint.load(filename) == {'version': checkpoint.version, 'state': {}}
+    assert os.listdir(str(tmp_path)) == ['checkpoint.json']
+
+def test_load_invalid(tmp_path):
+    filename = os.path.join(str(tmp_path), 'checkpoint.json')
+    assert checkpoint.load(filename) is None
+    for text in ('{"version": 1, "state"', '[]', json.dumps({'version': checkpoint.version + 1})):
+        with open(filename, 'w') as file_checkpoint:
+            file_checkpoint.write(text)
+        assert checkpoint.load(filename) is None
+
+def test_checkpointer_writes_on_change(tmp_path):
+    clock        = replay.VirtualClock(start=1000.0)
+    cache        = geo.Cache(clock=clock)
+    checkpointer = checkpoint.Checkpointer(
+        filename = os.path.join(str(tmp_path), 'checkpoint.json'),
+        cache    = cache
+    )
+    checkpointer.save(None)
+    assert checkpointer.writes == 0
+    checkpointer(state_example())
+    checkpointer(state_example())
+    assert checkpointer.writes == 1
+    checkpointer(state_example(IP='10.0.0.2'))
+    checkpointer(state_example(IP='10.0.0.2', secure=False))
+    assert checkpointer.writes == 3
+    cache.put('10.0.0.2', {'ip': '10.0.0.2'})
+    checkpointer(state_example(IP='10.0.0.2', secure=False))
+    checkpointer(state_example(IP='10.0.0.2', secure=False))
+    assert checkpointer.writes == 4
+
+def test_restore(tmp_path):
+    filename = os.path.join(str(tmp_path), 'checkpoint.json')
+    clock    = replay.VirtualClock(start=1000.0)
+    cache    = geo.Cache(TTL=100, clock=clock)
+    cache.put('10.0.0.1', {'ip': '10.0.0.1'})
+    clock.sleep(60)
+    cache.put('10.0.0.2', {'ip': '10.0.0.2'})
+    checkpoint.Checkpointer(filename=filename, cache=cache).save(
+        state_example(secure=False, error=monitor.ProviderError('timeout'))
+    )
+    clock.sleep(60)
+    cache_restored        = geo.Cache(TTL=100, clock=clock)
+    checkpointer_restored = checkpoint.Checkpointer(filename=filename, cache=cache_restored)
+    monitor_restored      = Restored()
+    state = checkpointer_restored.restore(
+        checkpoint       = checkpoint.load(filename),
+        monitor_restored = monitor_restored
+    )
+    assert monitor_restored.state is state
+    assert (state.time, state.IP, state.secure, state.duration) == (1000.0, '10.0.0.1', False, 0.25)
+    assert state.warnings == [{'text': 'example'}]
+    assert isinstance(state.error, monitor.ProviderError)
+    assert str(state.error) == 'timeout'
+    assert list(cache_restored.entries) == ['10.0.0.2']
+    checkpointer_restored(state)
+    assert checkpointer_restored.writes == 0
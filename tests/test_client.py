@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW tests client                                                          #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# These tests check the parsing of HTTP/1.1 responses by the built-in client   #
+# (content length, chunked and close-delimited bodies, responses without a     #
+# body and persistence of connections) and its reuse and retry of connections  #
+# against local servers.                                                       #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+
+import socket
+import threading
+
+import pytest
+
+from pebcaw import client
+from pebcaw import fake_provider
+
+def read_response(data, method='GET'):
+    """
+    Return the response and whether the connection is kept alive of the bytes
+    of a response sent by a server, and the bytes that remain unread.
+    """
+    local, remote = socket.socketpair()
+    connection    = client.Connection(host='example.org')
+    connection.socket = local
+    connection.file   = local.makefile('rb')
+    remote.sendall(data)
+    remote.shutdown(socket.SHUT_WR)
+    try:
+        response, keep_alive = connection.read_response(method=method)
+        return response, keep_alive, connection.file.read()
+    finally:
+        connection.close()
+        remote.close()
+
+def test_content_length():
+    response, keep_alive, rest = read_response(
+        b'HTTP/1.1 200 OK\r\n'
+        b'Content-Type: application/json; charset=utf-8\r\n'
+        b'Content-Length: 13\r\n'
+        b'\r\n'
+        b'{"ip": "::1"}'
+        b'HTTP/1.1 200 OK\r\n'
+    )
+    assert (response.status_code, response.reason) == (200, 'OK')
+    assert response.json() == {'ip': '::1'}
+    assert response.headers['content-type'] == 'application/json; charset=utf-8'
+    assert keep_alive
+    assert rest == b'HTTP/1.1 200 OK\r\n'
+
+def test_chunked():
+    response, keep_alive, rest = read_response(
+        b'HTTP/1.1 200 OK\r\n'
+        b'Transfer-Encoding: chunked\r\n'
+        b'\r\n'
+        b'5;extension=1\r\nhello\r\n'
+        b'7\r\n, world\r\n'
+        b'0\r\n'
+        b'Trailer: value\r\n'
+        b'\r\n'
+    )
+    assert response.content == b'hello, world'
+    assert keep_alive
+    assert rest == b''
+
+def test_close_delimited():
+    response, keep_alive, rest = read_response(
+        b'HTTP/1.0 200 OK\r\n'
+        b'\r\n'
+        b'body until close'
+    )
+    assert response.content == b'body until close'
+    assert not keep_alive
+
+@pytest.mark.parametrize('data, method, keep_alive_expected', [
+    (b'HTTP/1.1 204 No Content\r\n\r\n',                          'GET',  True),
+    (b'HTTP/1.1 304 Not Modified\r\nContent-Length: 10\r\n\r\n',   'GET',  True),
+    (b'HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\n',             'HEAD', True),
+    (b'HTTP/1.1 200 OK\r\nConnection: close\r\nContent-Length: 0\r\n\r\n', 'GET', False),
+    (b'HTTP/1.0 200 OK\r\nConnection: keep-alive\r\nContent-Length: 0\r\n\r\n', 'GET', True)
+])
+def test_bodiless_and_keep_alive(data, method, keep_alive_expected):
+    response, keep_alive, rest = read_response(data, method=method)
+    assert response.content == b''
+    assert keep_alive == keep_alive_expected
+
+def test_invalid_status_line():
+    with pytest.raises(client.HTTPError):
+        read_response(b'SSH-2.0-OpenSSH\r\n\r\n')
+
+def test_truncated_body():
+    with pytest.raises(EOFError):
+        read_response(b'HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\nshort')
+
+def test_raise_for_status():
+    response, _, _ = read_response(b'HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n\r\n')
+    with pytest.raises(client.HTTPError):
+        response.raise_for_status()
+
+def test_persistent_connection():
+    server = fake_provider.serve(script=fake_provider.Script())
+    try:
+        HTTP_client = client.Client(timeout=5)
+        for _ in range(3):
+            response = HTTP_client.get(server.URL())
+            assert response.json()['ip'] == fake_provider.step_default['ip']
+        assert response.headers['content-type'].startswith('application/json')
+        assert HTTP_client.get(server.URL('/ip')).text.strip() == fake_provider.step_default['ip']
+        assert len(HTTP_client.connections) == 1
+        assert len(server.arrivals) == 4
+    finally:
+        HTTP_client.close()
+        server.shutdown()
+
+def test_stale_connection_retried():
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(4)
+    body = b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok'
+    def serve():
+        for _ in range(2):
+            connection, _ = listener.accept()
+            connection.recv(65536)
+            connection.sendall(body)
+            connection.close()
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    URL         = 'http://127.0.0.1:{port}/'.format(port=listener.getsockname()[1])
+    HTTP_client = client.Client(timeout=5)
+    try:
+        assert HTTP_client.get(URL).content == b'ok'
+        assert HTTP_client.get(URL).content == b'ok'
+    finally:
+        HTTP_client.close()
+        listener.close()
+    thread.join(5)
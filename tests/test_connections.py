@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW tests connections                                                     #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# These tests check the parsing of the addresses of the socket tables of       #
+# /proc/net/tcp and tcp6 and the incremental classification of connections by  #
+# the egress check against tables written by hand and a fake router.           #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+
+import socket
+import struct
+
+from pebcaw import connections
+from pebcaw import whitelist
+
+header = '  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n'
+
+def hex_IPv4(IP):
+    return '{:08X}'.format(struct.unpack('=I', socket.inet_aton(IP))[0])
+
+def hex_IPv6(IP):
+    return struct.pack('=4I', *struct.unpack('!4I', socket.inet_pton(socket.AF_INET6, IP))).hex().upper()
+
+def line(number=0, local=None, remote=None, state=connections.ESTABLISHED, inode=1000):
+    return '{:4}: {} {} {} 00000000:00000000 00:00000000 00000000  1000        0 {} 1 0000000000000000 20 4 30 10 -1\n'.format(
+        number,
+        local,
+        remote,
+        state,
+        inode
+    )
+
+class Router(object):
+
+    def __init__(self, routes=None):
+        self.routes  = routes
+        self.lookups = 0
+
+    def route_integer(self, integer=None, bits=32):
+        self.lookups += 1
+        IP = whitelist.integer_to_IP(integer) if bits == 32 else whitelist.integer_to_IPv6(integer)
+        return self.routes.get(IP, 'eth0')
+
+class Changes(object):
+
+    def __init__(self):
+        self.change = False
+
+    def changed(self):
+        change, self.change = self.change, False
+        return change
+
+def test_parse_address():
+    assert connections.parse_address('0100007F:0035') == (32, whitelist.IP_to_integer('127.0.0.1'), 53)
+    assert connections.parse_address(hex_IPv6('2001:db8::1') + ':01BB') == (128, whitelist.IPv6_to_integer('2001:db8::1'), 443)
+    assert connections.parse_address(hex_IPv6('::ffff:1.2.3.4') + ':0050') == (32, whitelist.IP_to_integer('1.2.3.4'), 80)
+    assert connections.format_address(*connections.parse_address(hex_IPv6('2001:db8::1') + ':01BB')) == '[2001:db8::1]:443'
+    assert connections.format_address(*connections.parse_address(hex_IPv4('10.1.2.3') + ':1F90')) == '10.1.2.3:8080'
+
+def test_hex_to_integer_IPv6():
+    for IP in ('::1', '2001:db8::1', 'fe80::1:2:3:4', 'ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff'):
+        assert connections.hex_to_integer_IPv6(hex_IPv6(IP)) == whitelist.IPv6_to_integer(IP)
+
+def test_scan(tmp_path):
+    tcp  = tmp_path / 'tcp'
+    tcp6 = tmp_path / 'tcp6'
+    local = hex_IPv4('192.168.2.10') + ':D431'
+    tcp.write_text(header + ''.join([
+        line(0, local, hex_IPv4('8.8.8.8') + ':01BB',      inode=11),
+        line(1, local, hex_IPv4('1.1.1.1') + ':01BB',      inode=12),
+        line(2, local, hex_IPv4('192.168.2.1') + ':0035',  inode=13),
+        line(3, local, hex_IPv4('127.0.0.1') + ':0035',    inode=14),
+        line(4, local, hex_IPv4('109.202.107.10') + ':01BB', inode=15),
+        line(5, hex_IPv4('0.0.0.0') + ':0016', hex_IPv4('0.0.0.0') + ':0000', state='0A', inode=16)
+    ]))
+    tcp6.write_text(header + line(0, hex_IPv6('2001:db8::10') + ':D431', hex_IPv6('2606:4700::1111') + ':01BB', inode=21))
+    router = Router(routes={'1.1.1.1': 'wg0'})
+    changes = Changes()
+    check  = connections.EgressCheck(
+        index   = whitelist.Index(['109.202.107.10']),
+        changes = changes,
+        router  = router,
+        tables  = (('tcp', str(tcp)), ('tcp6', str(tcp6)), ('udp', str(tmp_path / 'missing')))
+    )
+    leaks = check.scan()
+    assert sorted((leak['remote'], leak['interface'], leak['inode']) for leak in leaks) == [
+        ('8.8.8.8:443',            'eth0', 11),
+        ('[2606:4700::1111]:443',  'eth0', 21)
+    ]
+    assert check.classified == 6
+    assert router.lookups == 3
+    assert len(check.scan()) == 2
+    assert check.classified == 6
+    assert router.lookups == 3
+    changes.change = True
+    router.routes  = {'1.1.1.1': 'wg0', '8.8.8.8': 'wg0', '2606:4700::1111': 'wg0'}
+    assert check.scan() == []
+    assert check.classified == 12
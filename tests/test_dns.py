@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW tests DNS                                                             #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# These tests check the DNS packets of the resolver (queries, answers with     #
+# compressed names and error responses) against packets built by hand, the     #
+# parsing of the resolver configuration and pins, a resolution against a local #
+# nameserver, the refresh of the host cache, a probe of a local nameserver and #
+# the caching of the DNS leak check.                                           #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from pebcaw import dns
+from pebcaw import replay
+
+class Changes(object):
+
+    def __init__(self):
+        self.change = False
+
+    def changed(self):
+        change, self.change = self.change, False
+        return change
+
+def test_query_packet():
+    packet = dns.query_packet(name='ipinfo.io.', identifier=0x1234, type_=28)
+    assert packet[:12] == struct.pack('!HHHHHH', 0x1234, 0x0100, 1, 0, 0, 0)
+    assert packet[12:] == b'\x06ipinfo\x02io\x00' + struct.pack('!HH', 28, 1)
+
+def test_nameservers(tmp_path):
+    path = tmp_path / 'resolv.conf'
+    path.write_text(
+        '# comment\n'
+        'search example.org\n'
+        'nameserver 10.8.0.1\n'
+        'nameserver fe80::1%wg0\n'
+        'nameserver\n'
+        'options edns0\n'
+    )
+    assert dns.nameservers(str(path)) == ['10.8.0.1', 'fe80::1']
+    assert dns.nameservers(str(tmp_path / 'missing')) == []
+
+def test_nameservers_system(tmp_path):
+    stub     = tmp_path / 'resolv.conf'
+    upstream = tmp_path / 'upstream.conf'
+    stub.write_text('nameserver 127.0.0.53\n')
+    upstream.write_text('nameserver 10.8.0.1\n')
+    assert dns.nameservers_system(path=str(stub), path_upstream=str(upstream)) == ['10.8.0.1']
+    assert dns.nameservers_system(path=str(stub), path_upstream=str(tmp_path / 'missing')) == ['127.0.0.53']
+    assert dns.nameservers_system(path=str(upstream), path_upstream=str(stub)) == ['10.8.0.1']
+
+def test_probe():
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+    def serve():
+        query, address = server.recvfrom(512)
+        server.sendto(query[:2] + b'\x81\x80' + query[4:], address)
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    try:
+        latency = dns.probe('127.0.0.1', port=server.getsockname()[1], timeout=5)
+    finally:
+        thread.join(5)
+        server.close()
+    assert 0 <= latency < 5
+
+def test_check():
+    changes = Changes()
+    check   = dns.DNSCheck(nameservers=['127.0.0.1'], changes=changes)
+    results = check.check()
+    assert results == [{'nameserver': '127.0.0.1', 'interface': 'lo', 'leak': False}]
+    assert check.leaks() == []
+    assert check.runs == 1
+    changes.change = True
+    check.check()
+    assert check.runs == 2
+
+def response_packet(query=None, records=(), rcode=0):
+    """
+    Return the response to a query packet of records (type, data, TTL) of
+    which the names are compression pointers to the name of the question.
+    """
+    identifier = struct.unpack('!H', query[:2])[0]
+    packet = struct.pack('!HHHHHH', identifier, 0x8180 | rcode, 1, len(records), 0, 0) + query[12:]
+    for type_, data, TTL in records:
+        packet += struct.pack('!HHHIH', 0xC00C, type_, 1, TTL, len(data)) + data
+    return packet
+
+def test_answers():
+    query    = dns.query_packet(name='ipinfo.io', identifier=1, type_=1)
+    response = response_packet(query=query, records=[
+        (5,  b'\x03www\xc0\x0c',                                   30),
+        (1,  socket.inet_pton(socket.AF_INET, '34.117.59.81'),     300),
+        (1,  socket.inet_pton(socket.AF_INET, '34.117.59.82'),     120),
+        (28, socket.inet_pton(socket.AF_INET6, '2600:1901::13e0'), 60)
+    ])
+    assert dns.answers(response, type_=1) == [('34.117.59.81', 300), ('34.117.59.82', 120)]
+    assert dns.answers(response, type_=28) == [('2600:1901::13e0', 60)]
+
+def test_answers_error():
+    query = dns.query_packet(name='example.invalid', identifier=1)
+    with pytest.raises(IOError):
+        dns.answers(response_packet(query=query, rcode=3))
+
+def test_skip_name():
+    packet = b'\x03www\x07example\x03com\x00' + b'\xc0\x00' + b'\x03www\xc0\x00'
+    assert dns.skip_name(packet, 0) == 17
+    assert dns.skip_name(packet, 17) == 19
+    assert dns.skip_name(packet, 19) == 25
+
+def test_parse_pins():
+    assert dns.parse_pins(None) == {}
+    assert dns.parse_pins('ipinfo.io:34.117.59.81,ipinfo.io:2600:1901:0:13e0::,example.org:10.0.0.1') == {
+        'ipinfo.io':   ['34.117.59.81', '2600:1901:0:13e0::'],
+        'example.org': ['10.0.0.1']
+    }
+
+def test_resolve():
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+    records = {
+        1:  [(1,  socket.inet_pton(socket.AF_INET, '192.0.2.1'),    600)],
+        28: [(28, socket.inet_pton(socket.AF_INET6, '2001:db8::1'), 90)]
+    }
+    def serve():
+        for _ in range(2):
+            query, address = server.recvfrom(512)
+            type_ = struct.unpack('!H', query[-4:-2])[0]
+            server.sendto(struct.pack('!H', struct.unpack('!H', query[:2])[0] ^ 1) + b'\x80' + b'\0' * 9, address)
+            server.sendto(response_packet(query=query, records=records[type_]), address)
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    try:
+        addresses, TTL = dns.resolve(name='example.org', nameservers=['127.0.0.1'], port=server.getsockname()[1])
+    finally:
+        thread.join(5)
+        server.close()
+    assert addresses == ['192.0.2.1', '2001:db8::1']
+    assert TTL == 90
+
+def test_host_cache_pins_and_literals():
+    cache = dns.HostCache(pins={'ipinfo.io': ['34.117.59.81']})
+    assert cache.addresses('ipinfo.io') == ['34.117.59.81']
+    assert cache.addresses('192.0.2.1') == ['192.0.2.1']
+    assert cache.addresses('2001:db8::1') == ['2001:db8::1']
+    assert cache.resolutions == 0
+
+def test_host_cache_refresh(monkeypatch):
+    clock   = replay.VirtualClock(start=1000.0)
+    answers = [(['192.0.2.1'], 100), (['192.0.2.2'], 100)]
+    monkeypatch.setattr(dns, 'resolve', lambda **kwargs: answers.pop(0))
+    cache = dns.HostCache(TTL_minimum=60, refresh=0.8, clock=clock)
+    assert cache.addresses('ipinfo.io') == ['192.0.2.1']
+    clock.sleep(79)
+    assert cache.addresses('ipinfo.io') == ['192.0.2.1']
+    assert cache.resolutions == 1
+    clock.sleep(1)
+    assert cache.addresses('ipinfo.io') == ['192.0.2.1']
+    deadline = time.monotonic() + 5
+    while cache.addresses('ipinfo.io') != ['192.0.2.2']:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert cache.resolutions == 2
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW tests geo                                                             #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# These tests check the expiry and least-recently-used eviction of the cache   #
+# of IP details on a virtual clock, its persistence and restoration, and that  #
+# the cached provider fetches the details of an IP only when the IP changes or #
+# its details expire.                                                          #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+
+import json
+
+from pebcaw import client
+from pebcaw import geo
+from pebcaw import monitor
+from pebcaw import replay
+
+class Client(object):
+    """
+    Client of which the current IP is set and of which the requests are kept.
+    """
+
+    def __init__(self, IP='10.0.0.1'):
+        self.IP       = IP
+        self.requests = []
+
+    def get(self, URL, timeout=None):
+        self.requests.append(URL)
+        if URL.endswith('/ip'):
+            content = self.IP.encode('ascii')
+        else:
+            content = json.dumps({'ip': 'unused', 'country': 'CH', 'URL': URL}).encode('utf-8')
+        return client.Response(status=200, reason='OK', content=content)
+
+def test_URL_details():
+    assert geo.URL_details(URL='https://ipinfo.io/json', IP='1.2.3.4') == 'https://ipinfo.io/1.2.3.4/json'
+    assert geo.URL_details(URL='https://example.org/{IP}?fields=country', IP='::1') == 'https://example.org/::1?fields=country'
+
+def test_TTL():
+    clock = replay.VirtualClock(start=1000.0)
+    cache = geo.Cache(TTL=60, clock=clock)
+    cache.put('10.0.0.1', {'country': 'CH'})
+    clock.sleep(59.5)
+    assert cache.get('10.0.0.1') == {'country': 'CH'}
+    clock.sleep(0.5)
+    assert cache.get('10.0.0.1') is None
+    assert len(cache) == 0
+
+def test_LRU():
+    cache = geo.Cache(size=3, clock=replay.VirtualClock())
+    for index in range(3):
+        cache.put('10.0.0.{}'.format(index), {'index': index})
+    assert cache.get('10.0.0.0') == {'index': 0}
+    cache.put('10.0.0.3', {'index': 3})
+    assert len(cache) == 3
+    assert cache.get('10.0.0.1') is None
+    assert [entry[0] for entry in cache.dump()] == ['10.0.0.2', '10.0.0.0', '10.0.0.3']
+    cache.put('10.0.0.2', {'index': 2})
+    cache.put('10.0.0.4', {'index': 4})
+    assert [entry[0] for entry in cache.dump()] == ['10.0.0.3', '10.0.0.2', '10.0.0.4']
+
+def test_persistence(tmp_path):
+    filename = str(tmp_path / 'geo.json')
+    clock    = replay.VirtualClock(start=1000.0)
+    cache    = geo.Cache(TTL=100, filename=filename, clock=clock)
+    cache.put('10.0.0.1', {'country': 'CH'})
+    clock.sleep(50)
+    cache.put('2001:db8::1', {'country': 'IS'})
+    clock.sleep(60)
+    loaded = geo.Cache(TTL=100, filename=filename, clock=clock)
+    assert loaded.get('10.0.0.1') is None
+    assert loaded.get('2001:db8::1') == {'country': 'IS'}
+    assert geo.Cache(filename=str(tmp_path / 'missing.json')).dump() == []
+
+def test_cached_provider():
+    clock       = replay.VirtualClock()
+    HTTP_client = Client()
+    provider    = monitor.CachedProvider(
+        URL_IP = 'https://ipinfo.io/ip',
+        URL    = 'https://ipinfo.io/json',
+        cache  = geo.Cache(TTL=300, clock=clock),
+        client = HTTP_client
+    )
+    data = provider()
+    assert (data['ip'], data['country'], data['URL']) == ('10.0.0.1', 'CH', 'https://ipinfo.io/10.0.0.1/json')
+    assert provider() == data
+    assert HTTP_client.requests == ['https://ipinfo.io/ip', 'https://ipinfo.io/10.0.0.1/json', 'https://ipinfo.io/ip']
+    HTTP_client.IP = '10.0.0.2'
+    assert provider()['ip'] == '10.0.0.2'
+    assert len(HTTP_client.requests) == 5
+    HTTP_client.IP = '10.0.0.1'
+    provider()
+    assert len(HTTP_client.requests) == 6
+    clock.sleep(300)
+    provider()
+    assert HTTP_client.requests[-1] == 'https://ipinfo.io/10.0.0.1/json'
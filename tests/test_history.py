@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW tests history                                                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# These tests check the aggregates of the history ring against a brute-force   #
+# computation over the observations it keeps, the views of its observations    #
+# and the bounded interning of IPv6 addresses.                                 #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+
+import random
+
+from pebcaw import history
+
+def aggregates_brute_force(observations=None, capacity=None, seconds=None, time_end=None):
+    """
+    Return the aggregates of a window of the observations (time, IP, secure,
+    error, duration, changed) that remain in a ring of a capacity.
+    """
+    kept = observations[-capacity:]
+    if time_end is None:
+        time_end = kept[-1][0]
+    window = [
+        observation for observation in kept
+        if observation[0] <= time_end and (seconds is None or observation[0] >= time_end - seconds)
+    ]
+    if not window:
+        return {'observations': 0}
+    insecure = sum(not observation[2] for observation in window)
+    return {
+        'observations':  len(window),
+        'time_start':    window[0][0],
+        'time_end':      window[-1][0],
+        'secure':        1 - insecure / len(window),
+        'insecure':      insecure,
+        'errors':        sum(observation[3] for observation in window),
+        'IP_changes':    sum(observation[5] for observation in window[1:]),
+        'duration_mean': sum(observation[4] for observation in window) / len(window)
+    }
+
+def test_aggregates_brute_force():
+    generator = random.Random(0)
+    for capacity in (1, 2, 7, 100):
+        ring         = history.History(capacity=capacity)
+        observations = []
+        time_current = 1000.0
+        IP_last      = None
+        for _ in range(3 * capacity + 50):
+            time_current += generator.choice((0.0, 0.5, 1.0, 3.0))
+            IP = generator.choice((None, '10.0.0.1', '10.0.0.2', '2001:db8::1', '2001:db8::2'))
+            secure   = generator.random() < 0.7
+            error    = generator.random() < 0.1
+            duration = generator.choice((0.0, 0.25, 1.5))
+            changed  = IP is not None and IP_last is not None and IP != IP_last
+            if IP is not None:
+                IP_last = IP
+            ring.append(time=time_current, IP=IP, secure=secure, error=error, duration=duration)
+            observations.append((time_current, IP, secure, error, duration, changed))
+            for seconds in (None, 0, 1, 2.5, 10, 1000):
+                for time_end in (None, time_current - 2, time_current + 5):
+                    expected = aggregates_brute_force(
+                        observations = observations,
+                        capacity     = capacity,
+                        seconds      = seconds,
+                        time_end     = time_end
+                    )
+                    result = ring.aggregates(seconds=seconds, time_end=time_end)
+                    assert result.keys() == expected.keys()
+                    for key, value in expected.items():
+                        assert result[key] == value if isinstance(value, int) else abs(result[key] - value) < 1e-9, key
+
+def test_observations():
+    ring = history.History(capacity=3)
+    ring.append(time=1.0, IP='10.0.0.1', country='CH', secure=True, whitelisted=True, duration=0.5)
+    ring.append(time=2.0, IP='2001:db8::1', country='IS', secure=False, whitelisted=False, duration=0.25)
+    ring.append(time=3.0, IP=None, error=True)
+    ring.append(time=4.0, IP='10.0.0.2', country=None, duration=1.0)
+    assert len(ring) == 3
+    assert [observation.time for observation in ring] == [2.0, 3.0, 4.0]
+    assert [observation.IP for observation in ring] == ['2001:db8::1', None, '10.0.0.2']
+    assert [observation.country for observation in ring] == ['IS', None, None]
+    assert [observation.whitelisted for observation in ring] == [False, None, None]
+    assert [observation.error for observation in ring] == [False, True, False]
+    assert ring[-1].duration == 1.0
+    assert ring[0].duration == 0.25
+
+def test_IPv6_interning_bounded():
+    ring = history.History(capacity=4)
+    for index in range(1000):
+        ring.append(time=float(index), IP='2001:db8::{:x}'.format(index % 50))
+    assert len(ring.IPv6_indices) == 4
+    assert len(ring.IPv6_addresses) <= 5
+    assert [observation.IP for observation in ring] == ['2001:db8::{:x}'.format(index % 50) for index in range(996, 1000)]
+    assert ring.aggregates()['IP_changes'] == 3
+
+def test_IPv6_interning_shared():
+    ring = history.History(capacity=3)
+    for index in range(10):
+        ring.append(time=float(index), IP='2001:db8::1' if index % 2 else '2001:db8::2')
+    assert sorted(ring.IPv6_indices) == ['2001:db8::1', '2001:db8::2']
+    assert sum(ring.IPv6_references) == 3
+    ring.append(time=10.0, IP='10.0.0.1')
+    ring.append(time=11.0, IP='10.0.0.1')
+    ring.append(time=12.0, IP='10.0.0.1')
+    assert ring.IPv6_indices == {}
+
+def test_IP_changes_capacity_one():
+    ring = history.History(capacity=1)
+    ring.append(time=1.0, IP='2001:db8::1')
+    ring.append(time=2.0, IP='2001:db8::2')
+    ring.append(time=3.0, IP='2001:db8::2')
+    assert ring.total_changes == 1
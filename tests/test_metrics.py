@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW tests metrics                                                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# These tests scrape the metrics served over a Unix socket and over TCP and    #
+# check the exposition of counters, gauges, histograms and labelled metrics.   #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+
+import os
+import time
+
+from pebcaw import metrics
+
+def registry_example():
+    registry       = metrics.Registry()
+    counter        = registry.counter('test_events_total', 'events')
+    gauge          = registry.gauge('test_level', 'level')
+    gauge_function = registry.gauge('test_function', 'function', function=lambda: 7)
+    histogram      = registry.histogram('test_duration_seconds', 'duration', buckets=(0.1, 1.0))
+    labelled       = registry.labelled('test_target_secure', 'secure per target', label='target')
+    counter.inc()
+    counter.inc(2)
+    gauge.set(0.5)
+    for value in (0.05, 0.1, 0.5, 5.0):
+        histogram.observe(value)
+    labelled.set('netns:b', 0)
+    labelled.set('say "a"', 1)
+    return registry, gauge_function
+
+def samples(text):
+    return dict(line.rsplit(' ', 1) for line in text.splitlines() if not line.startswith('#'))
+
+def check_exposition(text):
+    assert '# HELP test_events_total events\n# TYPE test_events_total counter\n' in text
+    assert '# TYPE test_duration_seconds histogram' in text
+    assert '# TYPE test_target_secure gauge' in text
+    values = samples(text)
+    assert values['test_events_total'] == '3'
+    assert values['test_level'] == '0.5'
+    assert values['test_function'] == '7'
+    assert values['test_duration_seconds_bucket{le="0.1"}'] == '2'
+    assert values['test_duration_seconds_bucket{le="1.0"}'] == '3'
+    assert values['test_duration_seconds_bucket{le="+Inf"}'] == '4'
+    assert values['test_duration_seconds_count'] == '4'
+    assert float(values['test_duration_seconds_sum']) == 5.65
+    assert values['test_target_secure{target="netns:b"}'] == '0'
+    assert values['test_target_secure{target="say \\"a\\""}'] == '1'
+
+def test_scrape_Unix_socket(tmp_path):
+    registry, _ = registry_example()
+    address     = os.path.join(str(tmp_path), 'metrics.sock')
+    server      = metrics.serve(address=address, registry=registry)
+    try:
+        check_exposition(metrics.scrape(address))
+    finally:
+        metrics.shutdown(server)
+
+def test_scrape_TCP():
+    registry, _ = registry_example()
+    server      = metrics.serve(address='127.0.0.1:0', registry=registry)
+    try:
+        text = metrics.scrape('127.0.0.1:{port}'.format(port=server.server_address[1]))
+        check_exposition(text)
+        assert text == registry.exposition()
+    finally:
+        metrics.shutdown(server)
+
+def test_shutdown(tmp_path):
+    registry, _ = registry_example()
+    for address in ('127.0.0.1:0', os.path.join(str(tmp_path), 'metrics.sock')):
+        server     = metrics.serve(address=address, registry=registry)
+        time_start = time.monotonic()
+        metrics.shutdown(server)
+        assert time.monotonic() - time_start < 1
+        assert server.socket.fileno() == -1
+
+def test_exposition_default_registry():
+    text = metrics.registry.exposition()
+    for name in (
+        'pebcaw_observations_total',
+        'pebcaw_secure',
+        'pebcaw_fetch_duration_seconds_bucket{le="+Inf"}',
+        'pebcaw_resident_memory_bytes'
+    ):
+        assert name in samples(text)
+    assert int(samples(text)['pebcaw_resident_memory_bytes']) > 0
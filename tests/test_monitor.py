@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW tests monitor                                                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# These tests check the steps of the monitor and iteration over it on a        #
+# virtual clock, the isolation of failing sinks, the monitors of egress        #
+# targets fed by the scheduler and the fail-closed combination of their        #
+# states.                                                                      #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+
+import errno
+import itertools
+import socket
+import ssl
+
+import pytest
+
+from pebcaw import metrics
+from pebcaw import monitor
+from pebcaw import replay
+from pebcaw import targets
+
+policy = monitor.CountriesPolicy(countries_whitelist=['CH'])
+
+class Provider(object):
+
+    def __init__(self, countries=None, clock=None, duration=0.5):
+        self.countries = iter(countries)
+        self.clock     = clock
+        self.duration  = duration
+
+    def __call__(self, mark=None):
+        country = next(self.countries)
+        self.clock.sleep(self.duration)
+        if country is None:
+            raise monitor.ProviderError('timeout')
+        return {'ip': '10.0.0.' + str(len(country)), 'country': country}
+
+def test_step():
+    clock  = replay.VirtualClock(start=100.0)
+    states = []
+    monitor_test = monitor.Monitor(
+        provider = Provider(countries=['CH', 'US', None], clock=clock),
+        policy   = policy,
+        sinks    = [states.append],
+        clock    = clock
+    )
+    state = monitor_test.step()
+    assert (state.secure, state.IP, state.country, state.warnings) == (True, '10.0.0.2', 'CH', [])
+    assert (state.time, state.duration, state.time_detection) == (100.5, 0.5, 100.5)
+    assert metrics.secure.value == 1
+    state = monitor_test.step()
+    assert not state.secure and 'US' in state.warnings[0]['text']
+    assert metrics.secure.value == 0
+    state = monitor_test.step()
+    assert not state.secure and state.error is not None
+    assert 'unable to identify as secure' in state.warnings[0]['text']
+    assert len(states) == 3
+    assert monitor_test.state is states[-1]
+
+def test_iteration():
+    clock        = replay.VirtualClock()
+    monitor_test = monitor.Monitor(
+        provider = Provider(countries=['CH', 'CH', 'US', 'US', 'CH', None, None], clock=clock, duration=0),
+        policy   = policy,
+        interval = 60,
+        clock    = clock
+    )
+    states = list(itertools.islice(monitor_test, 4))
+    assert [(state.secure, state.country) for state in states] == [
+        (True, 'CH'), (False, 'US'), (True, 'CH'), (False, None)
+    ]
+    assert [state.time for state in states] == [0, 120, 240, 300]
+
+def test_failing_sink():
+    clock  = replay.VirtualClock()
+    states = []
+    def sink_failing(state):
+        raise RuntimeError('broken sink')
+    errors       = metrics.sink_errors.value
+    monitor_test = monitor.Monitor(
+        provider = Provider(countries=['CH'], clock=clock),
+        policy   = policy,
+        sinks    = [sink_failing, states.append],
+        clock    = clock
+    )
+    monitor_test.step()
+    assert len(states) == 1
+    assert metrics.sink_errors.value == errors + 1
+
+def test_observation_provider():
+    clock    = replay.VirtualClock(start=10.0)
+    provider = monitor.ObservationProvider(clock=clock)
+    monitor_target = monitor.Monitor(provider=provider, policy=policy, clock=clock)
+    provider.set(data={'ip': '10.0.0.1', 'country': 'CH'}, duration=2.5)
+    state = monitor_target.step(time_start=provider.time_start)
+    assert (state.secure, state.duration) == (True, 2.5)
+    provider.set(exception=OSError('unreachable'), duration=10)
+    state = monitor_target.step(time_start=provider.time_start)
+    assert (state.secure, state.duration, str(state.error)) == (False, 10, 'unreachable')
+
+def test_combiner():
+    shared   = []
+    combiner = monitor.Combiner(targets=['a', 'b'], sinks=[shared.append])
+    states   = {
+        'secure':   monitor.State(time=1, data={'ip': '10.0.0.1'}, secure=True),
+        'insecure': monitor.State(time=2, data={'ip': '192.0.2.1'}, secure=False, whitelisted=False),
+        'error':    monitor.State(time=3, error=OSError('timeout'))
+    }
+    combiner.sink('a')(states['secure'])
+    assert shared == []
+    combiner.sink('b')(states['secure'])
+    assert shared[-1].secure and metrics.secure.value == 1
+    combiner.sink('b')(states['insecure'])
+    assert (shared[-1].secure, shared[-1].IP, shared[-1].time) == (False, '192.0.2.1', 2)
+    assert metrics.secure.value == 0
+    combiner.sink('a')(states['error'])
+    assert (shared[-1].secure, shared[-1].error) == (False, states['error'].error)
+    combiner.sink('a')(states['secure'])
+    assert (shared[-1].secure, shared[-1].IP) == (False, '192.0.2.1')
+    combiner.sink('b')(states['secure'])
+    assert shared[-1].secure and combiner.state is shared[-1]
+
+def test_target_sink(capsys):
+    sink = monitor.TargetSink(target='netns:test')
+    sink(monitor.State(data={'ip': '10.0.0.1', 'country': 'CH'}, secure=True, duration=1.25))
+    errors = metrics.target_errors.values.get('netns:test', 0)
+    sink(monitor.State(error=OSError('timeout'), duration=10))
+    assert metrics.target_secure.values['netns:test'] == 0
+    assert metrics.target_duration.values['netns:test'] == 1.25
+    assert metrics.target_errors.values['netns:test'] == errors + 1
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split() == ['netns:test', 'secure', 'IP:', '10.0.0.1', 'country:', 'CH']
+    assert lines[1].split()[:3] == ['netns:test', 'insecure', 'error']
+
+def test_scheduler_durations():
+    def observe(target, **kwargs):
+        if target.value == 'lo':
+            raise OSError('unreachable')
+        return {'ip': target.value}
+    count     = metrics.duration_fetch.count
+    scheduler = targets.Scheduler(targets=targets.parse('source:10.0.0.1,interface:lo'), URL='http://example.org/')
+    try:
+        results = {str(target): (data_IP, exception, duration) for target, data_IP, exception, duration in scheduler.observe(function=observe)}
+    finally:
+        scheduler.close()
+    assert results['source:10.0.0.1'][:2] == ({'ip': '10.0.0.1'}, None)
+    assert str(results['interface:lo'][1]) == 'unreachable'
+    assert all(result[2] >= 0 for result in results.values())
+    assert metrics.duration_fetch.count == count + 2
+
+def dual_stack(monkeypatch, IPv4=None, IPv6=None):
+    """
+    Return the IP details of a dual-stack observation of which each family
+    returns details or raises an exception.
+    """
+    def observe(family=None, **kwargs):
+        result = IPv6 if family == socket.AF_INET6 else IPv4
+        if isinstance(result, Exception):
+            raise result
+        return result
+    monkeypatch.setattr(targets, 'observe', observe)
+    return monitor.DualStackProvider(URL='http://example.org/')()
+
+def test_is_unreachable():
+    assert targets.is_unreachable(OSError(errno.ENETUNREACH, 'Network is unreachable'))
+    assert targets.is_unreachable(OSError(errno.EADDRNOTAVAIL, 'Cannot assign requested address'))
+    assert targets.is_unreachable(targets.NoAddressError('no addresses of example.org of the family'))
+    assert targets.is_unreachable(socket.gaierror(socket.EAI_NONAME, 'Name or service not known'))
+    assert not targets.is_unreachable(socket.gaierror(socket.EAI_AGAIN, 'Temporary failure in name resolution'))
+    assert not targets.is_unreachable(socket.timeout('timed out'))
+    assert not targets.is_unreachable(ssl.SSLError('certificate verify failed'))
+    assert not targets.is_unreachable(IOError('HTTP status 503'))
+    assert not targets.is_unreachable(ValueError('Expecting value'))
+
+def test_dual_stack(monkeypatch):
+    policy_dual_stack = monitor.DualStackPolicy(policy=policy)
+    IPv4 = {'ip': '10.0.0.1', 'country': 'CH'}
+    IPv6 = {'ip': '2001:db8::1', 'country': 'CH'}
+    data = dual_stack(monkeypatch, IPv4=IPv4, IPv6=IPv6)
+    assert data['IPv6'] == IPv6 and policy_dual_stack(data)[0]
+    data = dual_stack(monkeypatch, IPv4=IPv4, IPv6={'ip': '2001:db8::2', 'country': 'US'})
+    secure, _, warnings = policy_dual_stack(data)
+    assert not secure and warnings[0]['text'].endswith('(IPv6 leak)')
+    data = dual_stack(monkeypatch, IPv4=IPv4, IPv6=OSError(errno.ENETUNREACH, 'Network is unreachable'))
+    assert data['IPv6'] is None and 'IPv6_error' not in data
+    assert policy_dual_stack(data)[0]
+    for exception in (socket.timeout('timed out'), IOError('HTTP status 429'), ssl.SSLError('handshake failed')):
+        data = dual_stack(monkeypatch, IPv4=IPv4, IPv6=exception)
+        secure, _, warnings = policy_dual_stack(data)
+        assert not secure
+        assert warnings[-1]['text'] == 'WARNING: error observing IPv6, unable to identify as secure'
+        assert warnings[-1]['subtext'] == data['IPv6_error']
+    assert dual_stack(monkeypatch, IPv4=OSError(errno.ENETUNREACH, 'unreachable'), IPv6=IPv6) == IPv6
+    with pytest.raises(socket.timeout):
+        dual_stack(monkeypatch, IPv4=socket.timeout('timed out'), IPv6=IPv6)
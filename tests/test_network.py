@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW tests network                                                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# These tests check the parsers of the routing tables of /proc/net/route and   #
+# /proc/net/ipv6_route, route selection by longest prefix and metric and the   #
+# parsing of netlink route messages against tables and messages built by hand. #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+
+import socket
+import struct
+
+from pebcaw import network
+from pebcaw import whitelist
+
+route_IPv4 = (
+    'Iface\tDestination\tGateway \tFlags\tRefCnt\tUse\tMetric\tMask\t\tMTU\tWindow\tIRTT\n'
+    'eth0\t00000000\t0102A8C0\t0003\t0\t0\t100\t00000000\t0\t0\t0\n'
+    'eth0\t0002A8C0\t00000000\t0001\t0\t0\t100\t00FFFFFF\t0\t0\t0\n'
+    'wg0\t00000000\t00000000\t0001\t0\t0\t50\t00000080\t0\t0\t0\n'
+    'wg0\t00000080\t00000000\t0001\t0\t0\t50\t00000080\t0\t0\t0\n'
+    'tun1\t0000000A\t00000000\t0000\t0\t0\t0\t000000FF\t0\t0\t0\n'
+)
+
+route_IPv6 = (
+    '00000000000000000000000000000000 00 00000000000000000000000000000000 00 fe800000000000000000000000000001 00000400 00000001 00000000 00000003     eth0\n'
+    '20010db8000000000000000000000000 20 00000000000000000000000000000000 00 00000000000000000000000000000000 00000100 00000001 00000000 00000001      wg0\n'
+    '00000000000000000000000000000001 80 00000000000000000000000000000000 00 00000000000000000000000000000000 00000000 00000002 00000000 80200001       lo\n'
+)
+
+def test_hex_to_integer_IPv4():
+    assert whitelist.integer_to_IP(network.hex_to_integer_IPv4('0102A8C0')) == '192.168.2.1'
+    assert whitelist.integer_to_IP(network.hex_to_integer_IPv4('0100007F')) == '127.0.0.1'
+
+def test_routes_IPv4(tmp_path):
+    path = tmp_path / 'route'
+    path.write_text(route_IPv4)
+    routes = network.routes_IPv4(str(path))
+    assert [(whitelist.integer_to_IP(destination), length, metric, interface) for destination, length, metric, interface in routes] == [
+        ('0.0.0.0',     0,  100, 'eth0'),
+        ('192.168.2.0', 24, 100, 'eth0'),
+        ('0.0.0.0',     1,  50,  'wg0'),
+        ('128.0.0.0',   1,  50,  'wg0')
+    ]
+    assert network.route('8.8.8.8', routes=routes) == 'wg0'
+    assert network.route('192.168.2.10', routes=routes) == 'eth0'
+    assert network.route('127.0.0.1', routes=routes) == 'lo'
+    assert network.route('10.0.0.1', routes=[]) is None
+    assert network.routes_IPv4(str(tmp_path / 'missing')) == []
+
+def test_routes_IPv6(tmp_path):
+    path = tmp_path / 'ipv6_route'
+    path.write_text(route_IPv6)
+    routes = network.routes_IPv6(str(path))
+    assert routes == [
+        (0,                                          0,  0x400, 'eth0'),
+        (whitelist.IPv6_to_integer('2001:db8::'),    32, 0x100, 'wg0')
+    ]
+    assert network.route('2001:db8::1', routes=routes) == 'wg0'
+    assert network.route('2001:4860::8888', routes=routes) == 'eth0'
+    assert network.route('::1', routes=routes) == 'lo'
+
+def test_route_integer_metric():
+    routes = [(0, 0, 600, 'wlan0'), (0, 0, 100, 'eth0')]
+    assert network.route_integer(integer=whitelist.IP_to_integer('1.1.1.1'), routes=routes) == 'eth0'
+
+def message_route(type_route=network.RTN_UNICAST, attributes=()):
+    message = network.header_route.pack(socket.AF_INET, 32, 0, 0, 254, 0, 0, type_route, 0)
+    for type_attribute, data in attributes:
+        length   = network.header_attribute.size + len(data)
+        message += network.header_attribute.pack(length, type_attribute) + data + b'\0' * (-length % 4)
+    return message
+
+def test_router_parse():
+    index = socket.if_nametoindex('lo')
+    attributes = [
+        (network.RTA_DST, socket.inet_aton('127.0.0.1')),
+        (15,              b'\1\2\3'),
+        (network.RTA_OIF, struct.pack('=I', index))
+    ]
+    assert network.Router.parse(network.RTM_NEWROUTE, message_route(attributes=attributes)) == 'lo'
+    assert network.Router.parse(network.RTM_NEWROUTE, message_route(type_route=6, attributes=attributes)) is None
+    assert network.Router.parse(network.RTM_NEWROUTE, message_route(attributes=attributes[:2])) is None
+    assert network.Router.parse(2, b'\0' * 20) is None
+
+def test_is_VPN_interface():
+    assert network.is_VPN_interface('wg0')
+    assert network.is_VPN_interface('tun3')
+    assert not network.is_VPN_interface('eth0')
+    assert not network.is_VPN_interface(None)
+    assert network.is_VPN_interface('vpn0', interfaces_VPN=['vpn0'])
+    assert not network.is_VPN_interface('wg0', interfaces_VPN=['vpn0'])
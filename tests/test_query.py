@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW tests query                                                           #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# These tests exercise the line protocol of the query server over its Unix     #
+# socket: the state, secure, window and ping commands, pushes to subscribers,  #
+# pipelined requests and the survival of the server when a request fails.      #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+
+import errno
+import json
+import os
+import selectors
+import socket
+import time
+
+import pytest
+
+from pebcaw import history
+from pebcaw import query
+
+@pytest.fixture
+def server(tmp_path):
+    observations = history.History(capacity=8)
+    histories    = {'netns:a': history.History(capacity=8)}
+    _server      = query.Server(
+        path      = os.path.join(str(tmp_path), 'query.sock'),
+        history   = observations,
+        histories = histories
+    ).start()
+    yield _server
+    _server.stop()
+
+def connect(server):
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(5)
+    connection.connect(server.path)
+    return connection, connection.makefile('rb')
+
+def test_state_before_update(server):
+    assert query.query(server.path, 'state') == '{}'
+    assert query.query(server.path, 'secure') == '-'
+
+def test_commands(server):
+    server.update(IP='10.8.0.1', country='CH', whitelisted=True, secure=True, time_observation=time.time() - 2)
+    state = json.loads(query.query(server.path, 'state'))
+    assert (state['IP'], state['country'], state['whitelisted'], state['secure']) == ('10.8.0.1', 'CH', True, True)
+    assert 1.5 < state['age'] < 10
+    assert query.query(server.path, 'SECURE') == '1'
+    assert query.query(server.path, 'ping') == 'pong'
+    assert query.query(server.path, 'nonsense') == 'error: unknown command'
+    server.update(IP='192.0.2.1', secure=False)
+    assert query.query(server.path, 'secure') == '0'
+
+def test_window(server):
+    for index in range(3):
+        server.history.append(time=time.time(), IP='10.8.0.1', secure=bool(index), duration=0.5)
+    server.histories['netns:a'].append(time=time.time(), IP='10.8.0.2', secure=True, duration=0.25)
+    assert json.loads(query.query(server.path, 'window'))['observations'] == 3
+    assert json.loads(query.query(server.path, 'window 3600'))['insecure'] == 1
+    aggregates = json.loads(query.query(server.path, 'window 3600 netns:a'))
+    assert (aggregates['observations'], aggregates['duration_mean']) == (1, 0.25)
+    assert query.query(server.path, 'window 3600 netns:b') == 'error: unknown target'
+    assert query.query(server.path, 'window soon') == 'error: invalid window'
+
+def test_subscribe(server):
+    connection, lines = connect(server)
+    with connection:
+        connection.sendall(b'subscribe\n')
+        assert lines.readline() == b'{}\n'
+        server.update(IP='10.8.0.1', secure=True)
+        assert json.loads(lines.readline())['IP'] == '10.8.0.1'
+        server.update(IP='10.8.0.1', secure=True)
+        server.update(IP='192.0.2.1', secure=False)
+        assert json.loads(lines.readline())['secure'] is False
+
+def test_pipelined(server):
+    connection, lines = connect(server)
+    with connection:
+        connection.sendall(b'ping\nsecure\n' * 5000)
+        for _ in range(5000):
+            assert lines.readline() == b'pong\n'
+            assert lines.readline() == b'-\n'
+
+def test_failed_request(server, monkeypatch):
+    def aggregates(seconds=None):
+        raise RuntimeError('broken history')
+    monkeypatch.setattr(server.history, 'aggregates', aggregates)
+    connection, lines = connect(server)
+    with connection:
+        connection.sendall(b'window\n')
+        assert lines.readline() == b''
+    assert query.query(server.path, 'ping') == 'pong'
+
+def test_accept_error(server):
+    class Listener(object):
+        def accept(self):
+            raise OSError(errno.EMFILE, 'Too many open files')
+    server.accept(Listener())
+    assert query.query(server.path, 'ping') == 'pong'
+
+def test_flush_closed(tmp_path):
+    _server       = query.Server(path=os.path.join(str(tmp_path), 'query.sock'))
+    local, remote = socket.socketpair()
+    with remote:
+        local.setblocking(False)
+        _server.buffers[local] = b''
+        _server.selector.register(local, selectors.EVENT_WRITE, _server.read)
+        _server.outputs[local] = bytearray(b'pong\n')
+        _server.close(local)
+        _server.flush(local)
+    assert local.fileno() == -1
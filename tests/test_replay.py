@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW tests replay                                                          #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# These tests record traces with the recorder sink of a monitor run on a       #
+# simulated clock, as the monitor loop runs, and check that their replay       #
+# detects each insecure period at the observation at which the monitor         #
+# detected it.                                                                 #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+
+import os
+
+import pytest
+
+from pebcaw import monitor
+from pebcaw import replay
+
+policy = monitor.CountriesPolicy(countries_whitelist=['CH'])
+
+class Provider(object):
+    """
+    Provider of scripted countries of which each observation takes a duration
+    on a virtual clock. None is a failed observation.
+    """
+
+    def __init__(self, countries=None, clock=None, duration=0.25):
+        self.countries = iter(countries)
+        self.clock     = clock
+        self.duration  = duration
+
+    def __call__(self, mark=None):
+        country = next(self.countries)
+        self.clock.sleep(self.duration)
+        if country is None:
+            raise monitor.ProviderError('timeout')
+        return {'ip': '10.0.0.1', 'country': country}
+
+def record(filename=None, countries=None, interval=300, overhead=0.004):
+    """
+    Record a trace of a monitor run as by the monitor loop, of which each
+    cycle is the observation, the sinks (the overhead) and the interval, and
+    return the times at which the monitor alerted.
+    """
+    clock    = replay.VirtualClock(start=1.5e9)
+    recorder = replay.Recorder(filename=filename)
+    alerts   = []
+    def sink(state):
+        if not state.secure:
+            alerts.append(state.time)
+    monitor_recorded = monitor.Monitor(
+        provider = Provider(countries=countries, clock=clock),
+        policy   = policy,
+        sinks    = [monitor.RecorderSink(recorder=recorder), sink],
+        clock    = clock
+    )
+    for _ in countries:
+        monitor_recorded.step()
+        clock.sleep(overhead + interval)
+    recorder.close()
+    return alerts
+
+@pytest.mark.parametrize('interval', [1, 300])
+def test_replay_recorded(tmp_path, interval):
+    filename  = os.path.join(str(tmp_path), 'trace.jsonl')
+    countries = ['CH', 'CH', 'US', 'CH', None, 'CH', 'CH', 'US', 'US', 'CH', 'US']
+    alerts    = record(filename=filename, countries=countries, interval=interval)
+    trace     = replay.Trace.load(filenames=[filename])
+    timeline, periods = replay.replay(trace=trace, policy=policy, interval=interval, clock=replay.VirtualClock())
+    assert len(trace) == len(countries)
+    assert [event['time'] for event in timeline if not event['secure']] == alerts
+    assert len(periods) == 4
+    for period in periods:
+        assert period['latency'] == 0
+
+def test_replay_grid():
+    trace = replay.Trace(records=[
+        {'time': 0.0,    'data': {'country': 'CH'}},
+        {'time': 100.0,  'data': {'country': 'US'}},
+        {'time': 700.0,  'data': {'country': 'CH'}},
+        {'time': 5000.0, 'data': {'country': 'US'}}
+    ])
+    timeline, periods = replay.replay(trace=trace, policy=policy, interval=300)
+    assert [period['latency'] for period in periods] == [200.0, 0.0]
+    assert [event['time'] for event in timeline] == [300.0, 5000.0]
+
+def test_replay_empty():
+    with pytest.raises(ValueError):
+        replay.replay(trace=replay.Trace(records=[]), policy=policy)
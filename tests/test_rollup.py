@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW tests rollup                                                          #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# These tests check the consolidation of values into the rows of the archives  #
+# of a rollup file, the reset of a row when a newer slot wraps around to it,   #
+# the omission of times older than the span of an archive, the report of a     #
+# rollup file and that a missing file is not created when it is read.          #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+
+import os
+import time
+
+import pytest
+
+from pebcaw import monitor
+from pebcaw import rollup
+
+archives = (
+    (60,   3),
+    (3600, 2)
+)
+
+def test_consolidation(tmp_path):
+    filename   = os.path.join(str(tmp_path), 'rollup.rrd')
+    statistics = rollup.Rollup(filename=filename, metrics=('secure', 'latency'), archives=archives)
+    statistics.update(time_observation=60, values={'secure': 1.0, 'latency': 0.5, 'unknown': 1.0})
+    statistics.update(time_observation=90, values={'secure': 0.0, 'latency': None})
+    statistics.update(time_observation=119, values={'secure': 1.0, 'latency': 1.5})
+    assert statistics.fetch(step=60, time_end=119) == [
+        (60, {'secure': (3, 2 / 3, 0.0, 1.0), 'latency': (2, 1.0, 0.5, 1.5)})
+    ]
+    assert statistics.fetch(step=3600, time_end=119) == [
+        (0, {'secure': (3, 2 / 3, 0.0, 1.0), 'latency': (2, 1.0, 0.5, 1.5)})
+    ]
+    with pytest.raises(ValueError):
+        statistics.fetch(step=86400)
+    statistics.close()
+    assert os.path.getsize(filename) == (
+        rollup.header.size + 2 * rollup.record_metric.size + 2 * rollup.record_archive.size +
+        5 * rollup.record_row(2).size
+    )
+
+def test_wraparound(tmp_path):
+    statistics = rollup.Rollup(
+        filename = os.path.join(str(tmp_path), 'rollup.rrd'),
+        metrics  = ('secure',),
+        archives = archives
+    )
+    for slot in range(3):
+        statistics.update(time_observation=60 * slot, values={'secure': float(slot)})
+    assert [row[0] for row in statistics.fetch(step=60, time_end=179)] == [0, 60, 120]
+    # slot 3 takes the row of slot 0, which is reset rather than added to
+    statistics.update(time_observation=180, values={'secure': 3.0})
+    assert statistics.fetch(step=60, time_end=180) == [
+        (60,  {'secure': (1, 1.0, 1.0, 1.0)}),
+        (120, {'secure': (1, 2.0, 2.0, 2.0)}),
+        (180, {'secure': (1, 3.0, 3.0, 3.0)})
+    ]
+    # a time older than the span of the archive is omitted from it
+    statistics.update(time_observation=30, values={'secure': 9.0})
+    assert statistics.fetch(step=60, time_end=180)[-1] == (180, {'secure': (1, 3.0, 3.0, 3.0)})
+    assert statistics.fetch(step=60, time_start=0, time_end=180)[0][0] == 60
+    assert statistics.fetch(step=3600, time_end=180) == [(0, {'secure': (5, 3.0, 0.0, 9.0)})]
+    # rows of slots that wrapped out of the span are not returned
+    statistics.update(time_observation=7200, values={'secure': 1.0})
+    assert statistics.fetch(step=3600, time_end=7200) == [(7200, {'secure': (1, 1.0, 1.0, 1.0)})]
+    assert statistics.fetch(step=60, time_end=7200) == [(7200, {'secure': (1, 1.0, 1.0, 1.0)})]
+    statistics.close()
+
+def test_update_state_and_report(tmp_path):
+    filename   = os.path.join(str(tmp_path), 'rollup.rrd')
+    time_row   = 60 * (int(time.time()) // 60)
+    statistics = rollup.Rollup(filename=filename)
+    statistics.update_state(monitor.State(time=time_row, secure=True, duration=0.25))
+    statistics.update_state(monitor.State(
+        time     = time_row + 1,
+        warnings = [{'text': 'a'}, {'text': 'b'}],
+        error    = monitor.ProviderError('timeout'),
+        duration = 5.0
+    ))
+    row = statistics.fetch(step=60, time_end=time_row + 1)[0][1]
+    assert row['secure'] == (2, 0.5, 0.0, 1.0)
+    assert row['latency'] == (1, 0.25, 0.25, 0.25)
+    assert row['alerts'] == (2, 1.0, 0.0, 2.0)
+    assert row['errors'] == (2, 0.5, 0.0, 1.0)
+    statistics.close()
+    statistics = rollup.Rollup(filename=filename, read_only=True)
+    lines      = rollup.report(rollup=statistics).splitlines()
+    statistics.close()
+    assert lines[0] == 'per 60 s:'
+    assert [line for line in lines if line.startswith('per ')] == ['per 60 s:', 'per 3600 s:', 'per 86400 s:']
+    assert lines[2].split() == [time.strftime('%Y-%m-%dT%H:%MZ', time.gmtime(time_row)), '2', '50.0%', '0.250', '0.250', '2', '1']
+
+def test_read_only_missing(tmp_path):
+    filename = os.path.join(str(tmp_path), 'rollup.rrd')
+    with pytest.raises(FileNotFoundError):
+        rollup.Rollup(filename=filename, read_only=True)
+    assert not os.path.exists(filename)
+    open(filename, 'wb').close()
+    with pytest.raises(ValueError):
+        rollup.Rollup(filename=filename, read_only=True)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+"""
+################################################################################
+#                                                                              #
+# PEBCAW tests whitelist                                                       #
+#                                                                              #
+################################################################################
+#                                                                              #
+# LICENCE INFORMATION                                                          #
+#                                                                              #
+# These tests check the whitelist index and the versioned whitelist index,     #
+# queried at times before, between and after its snapshots, against a brute-   #
+# force evaluation of the snapshot of each list in force at the time.          #
+#                                                                              #
+# copyright (C) 2018 Will Breaden Madden, wbm@protonmail.ch                    #
+#                                                                              #
+# This software is released under the terms of the GNU General Public License  #
+# version 3 (GPLv3).                                                           #
+#                                                                              #
+# This program is free software: you can redistribute it and/or modify it      #
+# under the terms of the GNU General Public License as published by the Free   #
+# Software Foundation, either version 3 of the License, or (at your option)    #
+# any later version.                                                           #
+#                                                                              #
+# This program is distributed in the hope that it will be useful, but WITHOUT  #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or        #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for     #
+# more details.                                                                #
+#                                                                              #
+# For a copy of the GNU General Public License, see                            #
+# <http://www.gnu.org/licenses/>.                                              #
+#                                                                              #
+################################################################################
+"""
+
+
+
+import random
+import time
+
+import pytest
+
+from pebcaw import replay
+from pebcaw import whitelist
+
+def covers(entries=None, IP=None):
+    """
+    Return whether any of a list of entries covers an IP, by comparison of
+    ranges.
+    """
+    _family, integer, _ = whitelist.entry_to_range(IP)
+    for entry in entries:
+        family_entry, start, end = whitelist.entry_to_range(entry)
+        if family_entry == _family and start <= integer <= end:
+            return True
+    return False
+
+def whitelisted_brute_force(snapshots=None, IP=None, at=None):
+    """
+    Return whether an IP is whitelisted at a time (or at any time) by the
+    snapshot of each list in force at the time: the latest snapshot at or
+    before the time or, before the first snapshot, the first. The entries of
+    a cumulative snapshot are its own and those of the previous snapshot.
+    """
+    lists = {}
+    for name, date, entries, *cumulative in snapshots:
+        lists.setdefault(name, []).append((float('-inf') if date is None else date, entries, cumulative == [True]))
+    for name, versions in lists.items():
+        versions.sort(key=lambda version: version[0])
+        for index, (date, entries, cumulative) in enumerate(versions):
+            if cumulative and index:
+                versions[index] = (date, entries + versions[index - 1][1], cumulative)
+        versions = [(date, entries) for date, entries, _ in versions]
+        if at is None:
+            in_force = versions
+        else:
+            in_force = [version for version in versions if version[0] <= at][-1:] or versions[:1]
+        if any(covers(entries=entries, IP=IP) for _, entries in in_force):
+            return True
+    return False
+
+def random_entry(generator):
+    if generator.random() < 0.2:
+        return '2001:db8:{:x}::/48'.format(generator.randrange(8))
+    if generator.random() < 0.5:
+        return '10.0.{}.0/{}'.format(generator.randrange(8), generator.choice((22, 24, 25)))
+    return '10.0.{}.{}'.format(generator.randrange(8), generator.randrange(256))
+
+def random_IP(generator):
+    if generator.random() < 0.2:
+        return '2001:db8:{:x}::{:x}'.format(generator.randrange(9), generator.randrange(65536))
+    return '10.0.{}.{}'.format(generator.randrange(9), generator.randrange(256))
+
+def test_index():
+    index = whitelist.Index(['10.0.0.0/24', '10.0.1.0/24', '192.0.2.1', '2001:db8::/32'])
+    assert len(index) == 3
+    assert '10.0.1.255' in index
+    assert '10.0.2.0' not in index
+    assert '192.0.2.1' in index
+    assert '192.0.2.2' not in index
+    assert '2001:db8:ffff::1' in index
+    assert '2001:db9::1' not in index
+    assert 'invalid' not in index
+    assert None not in index
+
+def test_versioned_index_brute_force():
+    generator = random.Random(0)
+    for _ in range(20):
+        snapshots = []
+        for name in ('AirVPN', 'Tor'):
+            for date in generator.sample(range(0, 100, 10), generator.randrange(1, 5)):
+                snapshots.append((name, date, [random_entry(generator) for _ in range(generator.randrange(6))]))
+                if generator.random() < 0.3:
+                    snapshots[-1] += (True,)
+        if generator.random() < 0.3:
+            snapshots.append(('whitelist', None, [random_entry(generator)]))
+        index = whitelist.VersionedIndex(snapshots)
+        for _ in range(40):
+            IP = random_IP(generator)
+            for at in (None, -5, 0, 10, 15, 20, 45, 90, 150):
+                assert index.is_whitelisted(IP, at=at) == whitelisted_brute_force(snapshots=snapshots, IP=IP, at=at), (IP, at, snapshots)
+                assert (IP in index.at(at)) == whitelisted_brute_force(snapshots=snapshots, IP=IP, at=at)
+
+def test_versioned_index_dates():
+    index = whitelist.VersionedIndex([
+        ('AirVPN', '2018-01-01', ['10.0.0.1', '10.0.0.2']),
+        ('AirVPN', '2018-06-01', ['10.0.0.2', '10.0.0.3'])
+    ])
+    assert index.is_whitelisted('10.0.0.1', at='2017-01-01')
+    assert index.is_whitelisted('10.0.0.1', at='2018-05-31')
+    assert not index.is_whitelisted('10.0.0.1', at='2018-06-01')
+    assert not index.is_whitelisted('10.0.0.3', at='2018-05-31')
+    assert index.is_whitelisted('10.0.0.3', at='2018-06-01')
+    assert index.is_whitelisted('10.0.0.2', at=whitelist.date_to_time('2019-01-01'))
+    assert index.is_whitelisted('10.0.0.1')
+    assert not index.is_whitelisted('10.0.0.4')
+    assert not index.is_whitelisted('invalid', at='2018-01-01')
+
+def test_versioned_index_cumulative():
+    index = whitelist.VersionedIndex([
+        ('AirVPN', '2018-01-01', ['10.0.0.1', '10.0.0.2']),
+        ('AirVPN', '2018-06-01', ['10.0.0.3'], True),
+        ('AirVPN', '2019-01-01', ['10.0.0.4'])
+    ])
+    assert index.is_whitelisted('10.0.0.1', at='2018-07-01')
+    assert index.is_whitelisted('10.0.0.3', at='2018-07-01')
+    assert not index.is_whitelisted('10.0.0.3', at='2018-05-31')
+    assert not index.is_whitelisted('10.0.0.1', at='2019-01-01')
+    assert index.is_whitelisted('10.0.0.4', at='2019-01-01')
+
+def test_live_and_versioned_agree():
+    pebcaw    = pytest.importorskip('pebcaw')
+    clock     = replay.VirtualClock(start=time.time())
+    live      = pebcaw.policy()
+    versioned = pebcaw.policy(clock=clock)
+    assert pebcaw.is_whitelisted('185.9.19.106', at=clock.time())
+    for IP in pebcaw.whitelist_IPs + pebcaw.whitelist_Tor + ['8.8.8.8', '2001:db8::1']:
+        assert pebcaw.is_whitelisted(IP, at=clock.time()) == (IP in pebcaw.whitelist_index)
+        data = {'ip': IP, 'country': 'NL'}
+        assert versioned(data)[:2] == live(data)[:2], IP